@@ -0,0 +1,212 @@
+import socket, struct, time, os
+from typing import Optional
+
+ADB_SERVER_HOST = os.getenv("ADB_SERVER_HOST", "127.0.0.1")
+ADB_SERVER_PORT = int(os.getenv("ADB_SERVER_PORT", "5037"))
+
+# shell,v2 packet ids
+_STDOUT, _STDERR, _EXIT = 1, 2, 3
+
+class AdbProtocolError(Exception):
+    """The adb server answered FAIL or broke the wire protocol"""
+
+class AdbTimeout(Exception):
+    """An adb server request exceeded its deadline"""
+
+class AdbClient:
+    """Minimal client for the adb server's socket protocol (default port 5037).
+
+    Speaks the smart-socket framing directly (4-hex-digit length prefix, OKAY/FAIL
+    status), so commands reach the device without spawning the `adb` binary.
+    Each transport-bound request needs its own socket: the server hands the
+    connection over to the device service once the transport is selected.
+    """
+
+    def __init__(self, host: str = ADB_SERVER_HOST, port: int = ADB_SERVER_PORT):
+        self.host = host
+        self.port = port
+
+    # -- framing -------------------------------------------------------------
+    def _connect(self, deadline: float) -> socket.socket:
+        sock = socket.create_connection((self.host, self.port), timeout=self._remaining(deadline))
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
+    @staticmethod
+    def _remaining(deadline: float) -> float:
+        left = deadline - time.monotonic()
+        if left <= 0:
+            raise AdbTimeout()
+        return left
+
+    def _recv_exact(self, sock: socket.socket, n: int, deadline: float) -> bytes:
+        buf = bytearray(n)
+        view = memoryview(buf)
+        got = 0
+        while got < n:
+            sock.settimeout(self._remaining(deadline))
+            k = sock.recv_into(view[got:])
+            if k == 0:
+                raise AdbProtocolError("connection closed by adb server")
+            got += k
+        return bytes(buf)
+
+    def _send_request(self, sock: socket.socket, req: str, deadline: float):
+        data = req.encode("utf-8")
+        sock.settimeout(self._remaining(deadline))
+        sock.sendall(b"%04x" % len(data) + data)
+        status = self._recv_exact(sock, 4, deadline)
+        if status == b"OKAY":
+            return
+        if status == b"FAIL":
+            raise AdbProtocolError(self._read_prefixed(sock, deadline).decode("utf-8", "replace"))
+        raise AdbProtocolError(f"unexpected status {status!r}")
+
+    def _read_prefixed(self, sock: socket.socket, deadline: float) -> bytes:
+        n = int(self._recv_exact(sock, 4, deadline), 16)
+        return self._recv_exact(sock, n, deadline)
+
+    def _read_all(self, sock: socket.socket, deadline: float) -> bytes:
+        chunks = []
+        while True:
+            sock.settimeout(self._remaining(deadline))
+            chunk = sock.recv(65536)
+            if not chunk:
+                return b"".join(chunks)
+            chunks.append(chunk)
+
+    def _transport(self, serial: Optional[str], deadline: float) -> socket.socket:
+        sock = self._connect(deadline)
+        try:
+            self._send_request(sock, f"host:transport:{serial}" if serial else "host:transport-any", deadline)
+        except Exception:
+            sock.close()
+            raise
+        return sock
+
+    # -- host services -------------------------------------------------------
+    def host_request(self, req: str, timeout_sec: float = 5.0) -> str:
+        """Host request whose reply is a length-prefixed string (host:version, ...:get-state)"""
+        deadline = time.monotonic() + timeout_sec
+        with self._connect(deadline) as sock:
+            self._send_request(sock, req, deadline)
+            return self._read_prefixed(sock, deadline).decode("utf-8", "replace")
+
+    def get_state(self, serial: Optional[str] = None, timeout_sec: float = 5.0) -> str:
+        return self.host_request(f"host-serial:{serial}:get-state" if serial else "host:get-state", timeout_sec)
+
+    # -- device services -----------------------------------------------------
+    def shell(self, command: str, serial: Optional[str] = None, timeout_sec: float = 15.0,
+              stderr: bool = True) -> tuple[int, bytes]:
+        """Run `command` via shell,v2 and return (exit code, stdout+stderr, or stdout only without `stderr`)"""
+        deadline = time.monotonic() + timeout_sec
+        with self._transport(serial, deadline) as sock:
+            self._send_request(sock, f"shell,v2,raw:{command}", deadline)
+            out = bytearray()
+            while True:
+                try:
+                    header = self._recv_exact(sock, 5, deadline)
+                except AdbProtocolError:
+                    return 1, bytes(out)  # stream closed without an exit packet
+                pkt_id, n = struct.unpack("<BI", header)
+                payload = self._recv_exact(sock, n, deadline)
+                if pkt_id == _STDOUT or (pkt_id == _STDERR and stderr):
+                    out += payload
+                elif pkt_id == _EXIT:
+                    return (payload[0] if payload else 1), bytes(out)
+
+    def exec_out(self, command: str, serial: Optional[str] = None, timeout_sec: float = 15.0,
+                 into: Optional[bytearray] = None):
+        """Run `command` via exec: and return its raw (binary-safe) stdout.
+
+        The exec: service reports no exit status; use shell(stderr=False) where it matters.
+
+        With `into`, the output is received straight into that buffer (grown if
+        needed) and a memoryview over the filled part is returned instead of bytes.
+        """
+        deadline = time.monotonic() + timeout_sec
+        with self._transport(serial, deadline) as sock:
+            self._send_request(sock, f"exec:{command}", deadline)
+            if into is None:
+                return self._read_all(sock, deadline)
+            return self._read_into(sock, into, deadline)
+
+    def _read_into(self, sock: socket.socket, buf: bytearray, deadline: float) -> memoryview:
+        n = 0
+        while True:
+            if n == len(buf):
+                try:
+                    buf.extend(bytes(max(65536, len(buf))))
+                except BufferError:
+                    # A consumer still holds a view of this buffer; continue in a fresh one
+                    buf = bytearray(buf[:n]) + bytes(max(65536, n))
+            sock.settimeout(self._remaining(deadline))
+            k = sock.recv_into(memoryview(buf)[n:])
+            if k == 0:
+                return memoryview(buf)[:n]
+            n += k
+
+    def pull(self, remote_path: str, serial: Optional[str] = None, timeout_sec: float = 30.0) -> bytes:
+        """Stream a device file into memory over the sync: protocol"""
+        deadline = time.monotonic() + timeout_sec
+        with self._transport(serial, deadline) as sock:
+            self._send_request(sock, "sync:", deadline)
+            path = remote_path.encode("utf-8")
+            sock.settimeout(self._remaining(deadline))
+            sock.sendall(b"RECV" + struct.pack("<I", len(path)) + path)
+            data = bytearray()
+            while True:
+                tag, n = struct.unpack("<4sI", self._recv_exact(sock, 8, deadline))
+                if tag == b"DATA":
+                    data += self._recv_exact(sock, n, deadline)
+                elif tag == b"DONE":
+                    break
+                elif tag == b"FAIL":
+                    raise AdbProtocolError(self._recv_exact(sock, n, deadline).decode("utf-8", "replace"))
+                else:
+                    raise AdbProtocolError(f"unexpected sync tag {tag!r}")
+            sock.sendall(b"QUIT" + struct.pack("<I", 0))
+            return bytes(data)
+
+_client = AdbClient()
+
+def adb_socket(args: list[str], timeout_sec: float = 15.0, serial: Optional[str] = None) -> Optional[tuple[int, str]]:
+    """Socket-backend equivalent of running `adb <args>`.
+
+    Returns None for subcommands the native client does not implement so the
+    caller can fall back to the adb binary.
+    """
+    try:
+        if args == ["get-state"]:
+            return 0, _client.get_state(serial, timeout_sec) + "\n"
+        if args[:1] == ["shell"] and len(args) > 1:
+            code, out = _client.shell(" ".join(args[1:]), serial, timeout_sec)
+            return code, out.decode("utf-8", "replace")
+        if args[:1] == ["exec-out"] and len(args) > 1:
+            # shell,v2 carries the exit status that exec: lacks; stdout only, as with exec-out
+            code, out = _client.shell(" ".join(args[1:]), serial, timeout_sec, stderr=False)
+            return code, out.decode("utf-8", "replace")
+        return None
+    except (AdbTimeout, socket.timeout):
+        return 124, "TIMEOUT"
+    except (AdbProtocolError, OSError) as e:
+        return 1, f"ERROR: {e}"
+
+def adb_socket_bytes(args: list[str], timeout_sec: float = 15.0, serial: Optional[str] = None,
+                     into: Optional[bytearray] = None) -> Optional[tuple[int, bytes]]:
+    """Binary variant of adb_socket for exec-out and pull (returns file contents)"""
+    try:
+        if args[:1] == ["exec-out"] and len(args) > 1:
+            # Raw exec: keeps the zero-copy receive but has no exit status; no output at all
+            # (the command failed before writing, e.g. not found) is the one failure visible here
+            out = _client.exec_out(" ".join(args[1:]), serial, timeout_sec, into=into)
+            if not len(out):
+                return 1, b"ERROR: no output from exec-out"
+            return 0, out
+        if args[:1] == ["pull"] and len(args) == 2:
+            return 0, _client.pull(args[1], serial, timeout_sec)
+        return None
+    except (AdbTimeout, socket.timeout):
+        return 124, b"TIMEOUT"
+    except (AdbProtocolError, OSError) as e:
+        return 1, f"ERROR: {e}".encode()
@@ -0,0 +1,115 @@
+import subprocess, threading, queue, uuid, time, atexit
+from typing import Dict, Optional
+
+class AdbShellSession:
+    """Long-lived `adb shell` channel for one device.
+
+    Commands are written to the shell's stdin and their output is framed by a
+    unique sentinel line carrying the exit code, so many commands share one
+    adb client process instead of forking one per call.
+    """
+
+    def __init__(self, serial: Optional[str] = None):
+        self.serial = serial
+        self.spawns = 0
+        self.commands = 0
+        self._lock = threading.Lock()
+        self._proc: Optional[subprocess.Popen] = None
+        self._lines: "queue.Queue[Optional[str]]" = queue.Queue()
+
+    def _spawn(self):
+        cmd = ["adb", *(["-s", self.serial] if self.serial else []), "shell"]
+        self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                      stderr=subprocess.STDOUT, text=True, bufsize=1)
+        # Fresh queue per channel so lines from a dead shell never leak into the next one
+        self._lines = queue.Queue()
+        threading.Thread(target=self._pump, args=(self._proc, self._lines), daemon=True).start()
+        self.spawns += 1
+
+    @staticmethod
+    def _pump(proc: subprocess.Popen, lines: "queue.Queue[Optional[str]]"):
+        for line in proc.stdout:
+            lines.put(line)
+        lines.put(None)  # EOF marker: channel died
+
+    def alive(self) -> bool:
+        return self._proc is not None and self._proc.poll() is None
+
+    def close(self):
+        if self._proc is None:
+            return
+        try:
+            self._proc.kill()
+            self._proc.wait(timeout=2.0)
+        except Exception:
+            pass
+        self._proc = None
+
+    def run(self, command: str, timeout_sec: float = 15.0) -> tuple[int, str]:
+        """Run one shell command over the channel, reconnecting if it has died"""
+        with self._lock:
+            for _ in range(2):
+                if not self.alive():
+                    try:
+                        self._spawn()
+                    except Exception as e:
+                        return 1, f"ERROR: {e}"
+                sentinel = f"__qg_{uuid.uuid4().hex}__"
+                # Subshell keeps `exit`/`cd` in one command from leaking into the channel
+                framed = f"( {command}\n) </dev/null 2>&1; printf '\\n{sentinel} %d\\n' $?\n"
+                try:
+                    self._proc.stdin.write(framed)
+                    self._proc.stdin.flush()
+                except (BrokenPipeError, OSError, ValueError):
+                    # Channel died between commands; reconnect once and resend
+                    self.close()
+                    continue
+                self.commands += 1
+                return self._collect(sentinel, timeout_sec)
+            return 1, "ERROR: adb shell session unavailable"
+
+    def _collect(self, sentinel: str, timeout_sec: float) -> tuple[int, str]:
+        deadline = time.monotonic() + timeout_sec
+        out: list[str] = []
+        while True:
+            try:
+                line = self._lines.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                # The shell is stuck on the hung command; drop it and reconnect next call
+                self.close()
+                return 124, "TIMEOUT"
+            if line is None:
+                self.close()
+                return 1, "ERROR: adb shell session closed\n" + "".join(out)
+            if line.startswith(sentinel):
+                try:
+                    code = int(line.split()[1])
+                except (IndexError, ValueError):
+                    code = 1
+                text = "".join(out)
+                # Drop the newline printed ahead of the sentinel
+                return code, text[:-1] if text.endswith("\n") else text
+            out.append(line)
+
+_sessions: Dict[str, AdbShellSession] = {}
+_sessions_lock = threading.Lock()
+
+def get_session(serial: Optional[str] = None, channel: str = "") -> AdbShellSession:
+    """Return the shared shell session for a device, creating it on first use.
+    A named `channel` is a second shell to the same device, so background work
+    (the perf sampler) doesn't queue behind the episode's commands."""
+    key = f"{serial or ''}#{channel}" if channel else serial or ""
+    with _sessions_lock:
+        sess = _sessions.get(key)
+        if sess is None:
+            sess = _sessions[key] = AdbShellSession(serial)
+        return sess
+
+def close_all():
+    """Terminate every open shell channel"""
+    with _sessions_lock:
+        for sess in _sessions.values():
+            sess.close()
+        _sessions.clear()
+
+atexit.register(close_all)
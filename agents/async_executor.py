@@ -0,0 +1,87 @@
+import asyncio, functools, os, time
+from typing import Dict, Any, Optional
+from agents.adb_protocol import adb_socket, adb_socket_bytes
+from agents.executor import _labels, _record_adb, task_flow, timeouts
+from agents.flows import AdbResult, drive_async
+
+async def _run_with_timeout_async(cmd: list[str], timeout_sec: float = 15.0, binary: bool = False) -> tuple[int, Any]:
+    """Non-blocking _run_with_timeout; the child is killed on timeout or cancellation"""
+    try:
+        p = await asyncio.create_subprocess_exec(
+            *cmd, stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE if binary else asyncio.subprocess.STDOUT)
+    except Exception as e:
+        msg = f"ERROR: {e}"
+        return 1, msg.encode() if binary else msg
+    try:
+        out, err = await asyncio.wait_for(p.communicate(), timeout_sec)
+        if binary:
+            return p.returncode, (out if p.returncode == 0 else err or out) or b""
+        return p.returncode, (out or b"").decode("utf-8", "replace")
+    except asyncio.TimeoutError:
+        return 124, b"TIMEOUT" if binary else "TIMEOUT"
+    finally:
+        if p.returncode is None:
+            try:
+                p.kill()
+            except ProcessLookupError:
+                pass
+            # Reap the child even if we are being cancelled
+            await asyncio.shield(p.wait())
+
+async def _in_thread(fn, *args):
+    """asyncio.to_thread that, when cancelled, still waits for the call to return:
+    socket I/O can't be interrupted, and the device is busy until it finishes"""
+    fut = asyncio.ensure_future(asyncio.to_thread(fn, *args))
+    try:
+        return await asyncio.shield(fut)
+    except asyncio.CancelledError:
+        await asyncio.wait({fut})
+        raise
+
+def _adb_cmd(args: list[str], serial: Optional[str]) -> list[str]:
+    return ["adb", *(["-s", serial] if serial else []), *args]
+
+def _instrumented_async(fn):
+    """Coroutine counterpart of executor._instrumented"""
+    @functools.wraps(fn)
+    async def wrapper(args: list, timeout_sec: float = 15.0, serial: Optional[str] = None, **kw):
+        labels = _labels(args, serial)
+        timeout_sec = timeouts.effective(labels["command"], labels["device"], timeout_sec)
+        t0 = time.perf_counter()
+        code, out = await fn(args, timeout_sec, serial, **kw)
+        _record_adb(labels, time.perf_counter() - t0, code, timeout_sec)
+        return AdbResult(code, out, timeout_sec)
+    return wrapper
+
+@_instrumented_async
+async def _adb_async(args: list[str], timeout_sec: float = 15.0, serial: Optional[str] = None) -> tuple[int, str]:
+    """Async counterpart of executor._adb"""
+    if os.getenv("MOCK_ADB") == "1":
+        return 0, "mocked_output"
+    serial = serial or os.getenv("ANDROID_SERIAL") or None
+    if os.getenv("ADB_BACKEND") == "socket":
+        # Blocking socket I/O with its own deadline; run it off the event loop
+        res = await _in_thread(adb_socket, args, timeout_sec, serial)
+        if res is not None:
+            return res
+    return await _run_with_timeout_async(_adb_cmd(args, serial), timeout_sec)
+
+@_instrumented_async
+async def _adb_bytes_async(args: list[str], timeout_sec: float = 15.0, serial: Optional[str] = None,
+                           into: Optional[bytearray] = None) -> tuple[int, bytes]:
+    """Async counterpart of executor._adb_bytes"""
+    if os.getenv("MOCK_ADB") == "1":
+        return 0, b"mocked_output"
+    serial = serial or os.getenv("ANDROID_SERIAL") or None
+    if os.getenv("ADB_BACKEND") == "socket":
+        res = await _in_thread(adb_socket_bytes, args, timeout_sec, serial, into)
+        if res is not None:
+            return res
+    if args[:1] == ["pull"] and len(args) == 2:
+        args = ["exec-out", "cat", args[1]]
+    return await _run_with_timeout_async(_adb_cmd(args, serial), timeout_sec, binary=True)
+
+async def run_task_async(task: str, params: Dict[str, Any], serial: Optional[str] = None) -> Dict[str, Any]:
+    """Execute a task without blocking the event loop (same logic as executor.run_task)"""
+    return await drive_async(task_flow(task, params, serial), _adb_async, _adb_bytes_async, serial)
@@ -0,0 +1,135 @@
+import argparse, asyncio, time, pathlib, os, sys
+from typing import Dict, Any, List, Optional
+from agents.harness import run_episode_async, trace_steps
+from agents.executor import health, screenshots, timeouts, ui_cache, perf
+from agents.results import ResultStream
+from agents.result_store import open_store
+from agents.retry import RetryPolicy
+from agents.scheduler import parse_devices
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from observability.trace import JsonTracer
+from observability.metrics import metrics, maybe_serve
+
+class _IdlePool:
+    """borrow/release over the idle-device queue, for hedged attempts"""
+
+    def __init__(self, idle: "asyncio.Queue[Optional[str]]"):
+        self.idle = idle
+        self.waiting = 0  # episodes queued for a device take priority over hedges
+
+    def borrow(self) -> Optional[str]:
+        if self.waiting:
+            return None
+        try:
+            return self.idle.get_nowait()
+        except asyncio.QueueEmpty:
+            return None
+
+    def release(self, serial: str):
+        self.idle.put_nowait(serial)
+
+async def run_episodes_async(prompts: List[str], devices: List[Optional[str]], tracer: JsonTracer,
+                             retries: int = 1, concurrency: int = 8,
+                             stream: Optional[ResultStream] = None,
+                             policy: Optional[RetryPolicy] = None) -> List[Dict[str, Any]]:
+    """Run episodes across devices from one event loop.
+
+    Each episode borrows an idle device for its duration (one episode per device
+    at a time); at most `concurrency` episodes are in flight overall. With a
+    `stream`, records are appended to it as they finish instead of being returned.
+    """
+    idle: "asyncio.Queue[Optional[str]]" = asyncio.Queue()
+    for d in devices:
+        idle.put_nowait(d)
+    slots = asyncio.Semaphore(max(1, concurrency))
+    policy = policy or RetryPolicy(retries)
+    pool = _IdlePool(idle)
+
+    async def one(i: int, prompt: str) -> Dict[str, Any]:
+        async with slots:
+            pool.waiting += 1
+            try:
+                serial = await idle.get()
+            finally:
+                pool.waiting -= 1
+            t0 = time.time()
+            sampler = perf.start(serial, episode=i, tracer=tracer)
+            try:
+                with tracer.span("task.execute", episode=i, device=serial):
+                    rec = await run_episode_async(prompt, max_retries=retries, serial=serial,
+                                                  policy=policy, pool=pool)
+            finally:
+                sampled = await asyncio.to_thread(sampler.stop) if sampler is not None else None
+                idle.put_nowait(serial)
+        if sampled is not None:
+            rec["perf"] = sampled
+        rec["episode"] = i
+        rec["run_id"] = tracer.run_id
+        rec["trace_id"] = tracer.trace_id
+        rec["device"] = serial
+        rec["wall_time_sec"] = round(time.time() - t0, 3)
+        with tracer.span("episode.phases", episode=i, device=serial, **rec["phases"]):
+            pass
+        trace_steps(tracer, rec, device=serial)
+        print(f"[episode {i}] device={serial} success={rec['success']} latency={rec['latency_sec']}s flaky={rec['flaky']}")
+        if stream is not None:
+            stream.append(rec)
+            return None
+        return rec
+
+    return [r for r in await asyncio.gather(*(one(i, p) for i, p in enumerate(prompts))) if r is not None]
+
+def main():
+    ap = argparse.ArgumentParser(description="Drive many devices from one asyncio event loop")
+    ap.add_argument("--episodes", type=int, default=5)
+    ap.add_argument("--prompt", type=str, default="search for qualgent test")
+    ap.add_argument("--retries", type=int, default=1)
+    ap.add_argument("--devices", type=str, default=None,
+                    help="Comma-separated serials or a tunnels file (default: infra/adb_tunnels.txt, else $ANDROID_SERIAL)")
+    ap.add_argument("--concurrency", type=int, default=8, help="Max episodes in flight")
+    ap.add_argument("--hedge", action="store_true", help="Duplicate slow attempts onto an idle device, first success wins")
+    ap.add_argument("--perf", action="store_true",
+                    help="Sample device frame timing, CPU/PSS and app launch times during episodes (see agents/perf_sampler.py)")
+    args = ap.parse_args()
+
+    outdir = pathlib.Path("results"); outdir.mkdir(parents=True, exist_ok=True)
+    run_id = f"run_{int(time.time())}"
+    tracer = JsonTracer(run_id)
+    health.tracer = tracer
+    timeouts.tracer = tracer
+    perf.enabled = perf.enabled or args.perf
+    devices = parse_devices(args.devices)
+    if not devices:
+        print("[async-runner] No devices found")
+        return 1
+    stream = ResultStream(run_id, outdir, store=open_store())
+    maybe_serve()
+
+    with tracer.span("agent.setup", episodes=args.episodes, prompt=args.prompt, devices=len(devices)):
+        print(f"[async-runner] Starting {args.episodes} episodes on {len(devices)} devices (concurrency {args.concurrency})")
+
+    t0 = time.time()
+    policy = RetryPolicy(args.retries, hedge=args.hedge)
+    asyncio.run(run_episodes_async([args.prompt] * args.episodes, devices, tracer,
+                                   retries=args.retries, concurrency=args.concurrency, stream=stream, policy=policy))
+    with tracer.span("retry.policy", **policy.stats()):
+        pass
+    with tracer.span("ui.hierarchy_cache", **ui_cache.stats()):
+        pass
+    for key, st in timeouts.stats().items():
+        with tracer.span("adb.timeouts", key=key, **st):
+            pass
+    timeouts.save()
+    screenshots.flush()
+    elapsed = time.time() - t0
+
+    json_path, csv_path, report_md = stream.write_reports(tracer.trace_id, metrics=metrics)
+    tracer.close()
+    done = stream.summary.episodes
+    rate = done / elapsed if elapsed > 0 else 0.0
+    print(f"[async-runner] {done} episodes in {elapsed:.1f}s ({rate:.2f}/s); wrote {json_path}, {csv_path}, {report_md}")
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,71 @@
+import re, shlex
+from typing import Callable, Dict, Any, List, Optional
+from agents.flows import AdbCall, Flow, drive
+
+_STEP_RE = re.compile(r"^__qg_step (\d+) (\d+)$", re.M)
+
+class InputBatch:
+    """Sequence of input actions compiled into a single on-device shell script.
+
+    Delays between steps run on the device (`sleep`), so the whole sequence
+    costs one ADB round trip. Each step echoes a marker with its exit code,
+    which run() turns into per-step results. With stop_on_error the script
+    exits at the first failing step instead of running the rest.
+    """
+
+    def __init__(self, step_timeout_sec: float = 5.0, stop_on_error: bool = False):
+        self.step_timeout_sec = step_timeout_sec
+        self.stop_on_error = stop_on_error
+        self.steps: List[Dict[str, Any]] = []
+
+    def _add(self, label: str, command: str, delay: float) -> "InputBatch":
+        self.steps.append({"label": label, "command": command, "delay": max(0.0, float(delay))})
+        return self
+
+    def tap(self, x: int, y: int, delay: float = 0.0) -> "InputBatch":
+        return self._add(f"tap ({x},{y})", f"input tap {int(x)} {int(y)}", delay)
+
+    def swipe(self, x1: int, y1: int, x2: int, y2: int, duration_ms: Optional[int] = None, delay: float = 0.0) -> "InputBatch":
+        dur = f" {int(duration_ms)}" if duration_ms else ""
+        return self._add(f"swipe ({x1},{y1})->({x2},{y2})", f"input swipe {int(x1)} {int(y1)} {int(x2)} {int(y2)}{dur}", delay)
+
+    def keyevent(self, code: int, delay: float = 0.0) -> "InputBatch":
+        return self._add(f"keyevent {code}", f"input keyevent {int(code)}", delay)
+
+    def text(self, text: str, delay: float = 0.0) -> "InputBatch":
+        return self._add(f"text ({len(text)} chars)", f"input text {shlex.quote(text.replace(' ', '%s'))}", delay)
+
+    def sleep(self, seconds: float) -> "InputBatch":
+        """Pause on the device before the next step"""
+        if self.steps:
+            self.steps[-1]["delay"] += max(0.0, float(seconds))
+        return self
+
+    def script(self) -> str:
+        parts = ["f=0"]
+        on_error = "exit $r" if self.stop_on_error else "f=$r"
+        for i, st in enumerate(self.steps):
+            parts.append(f"{st['command']}; r=$?; echo __qg_step {i} $r; [ $r -eq 0 ] || {on_error}")
+            if st["delay"] > 0 and i < len(self.steps) - 1:
+                parts.append(f"sleep {st['delay']:g}")
+        parts.append("exit $f")
+        return "; ".join(parts)
+
+    def timeout_sec(self) -> float:
+        return len(self.steps) * self.step_timeout_sec + sum(st["delay"] for st in self.steps)
+
+    def flow(self, timeout_sec: Optional[float] = None) -> Flow:
+        """Flow form of run(), for use inside task flows"""
+        if not self.steps:
+            return {"ok": True, "code": 0, "steps": [], "output": ""}
+        code, out = yield AdbCall(["shell", self.script()], timeout_sec or self.timeout_sec())
+        codes = {int(i): int(c) for i, c in _STEP_RE.findall(out or "")}
+        steps = [{"step": i, "label": st["label"], "code": codes.get(i)} for i, st in enumerate(self.steps)]
+        # Unreported steps (code None) never ran or the output was lost; the script's exit status covers them
+        ok = code == 0 and all(s["code"] in (0, None) for s in steps)
+        return {"ok": ok, "code": code, "steps": steps, "output": _STEP_RE.sub("", out or "").strip()}
+
+    def run(self, adb: Callable[..., tuple[int, str]], serial: Optional[str] = None,
+            timeout_sec: Optional[float] = None) -> Dict[str, Any]:
+        """Execute the batch in one round trip and report each step's outcome"""
+        return drive(self.flow(timeout_sec), adb, serial=serial)
@@ -0,0 +1,178 @@
+import os, queue, struct, threading, time, zlib
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from agents.flows import AdbCall, Flow, Sleep
+
+try:
+    from PIL import Image  # optional: WebP encoding
+except ImportError:
+    Image = None
+
+# screencap pixel formats we can encode (android.graphics.PixelFormat)
+RGBA_8888, RGBX_8888 = 1, 2
+
+class Frame(NamedTuple):
+    width: int
+    height: int
+    fmt: int
+    pixels: memoryview  # RGBA rows, 4 bytes per pixel
+
+def parse_raw(data) -> Frame:
+    """Split raw `screencap` output into header and pixel view (no copy).
+
+    The header is width, height, format and, on Android 9+, a colour-space word;
+    its size is inferred from the payload length.
+    """
+    mv = memoryview(data)
+    if len(mv) < 12:
+        raise ValueError(f"unrecognized framebuffer ({len(mv)} bytes)")
+    w, h, fmt = struct.unpack_from("<III", mv, 0)
+    size = w * h * 4
+    for header in (16, 12):
+        if len(mv) >= header + size and (len(mv) - header - size) < 4:
+            break
+    else:
+        raise ValueError(f"framebuffer size mismatch: {w}x{h} fmt={fmt} in {len(mv)} bytes")
+    if fmt not in (RGBA_8888, RGBX_8888):
+        raise ValueError(f"unsupported pixel format {fmt}")
+    return Frame(w, h, fmt, mv[header:header + size])
+
+def transform(frame: Frame, crop: Optional[Tuple[int, int, int, int]] = None, scale: int = 1) -> Frame:
+    """Crop to (left, top, right, bottom) and/or downscale by an integer factor (nearest neighbour).
+
+    Rows and pixels are picked with strided memoryview slices, so the only copy
+    is the (smaller) output image.
+    """
+    scale = max(1, int(scale))
+    if crop is None and scale == 1:
+        return frame
+    left, top, right, bottom = crop or (0, 0, frame.width, frame.height)
+    left, top = max(0, left), max(0, top)
+    right, bottom = min(frame.width, right), min(frame.height, bottom)
+    if right <= left or bottom <= top:
+        raise ValueError(f"empty crop box {crop}")
+    px = frame.pixels.cast("I")  # one uint32 per pixel
+    out = bytearray()
+    for y in range(top, bottom, scale):
+        row = y * frame.width
+        out += px[row + left:row + right:scale].tobytes()
+    return Frame(len(range(left, right, scale)), len(range(top, bottom, scale)), frame.fmt, memoryview(out))
+
+def encode_png(frame: Frame, level: int = 3) -> bytes:
+    stride = frame.width * 4
+    raw = bytearray()
+    for y in range(frame.height):
+        raw += b"\x00"  # filter: none
+        raw += frame.pixels[y * stride:(y + 1) * stride]
+
+    def chunk(tag: bytes, body: bytes) -> bytes:
+        return struct.pack(">I", len(body)) + tag + body + struct.pack(">I", zlib.crc32(tag + body) & 0xFFFFFFFF)
+
+    ihdr = struct.pack(">IIBBBBB", frame.width, frame.height, 8, 6, 0, 0, 0)  # 8-bit RGBA
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", ihdr) + chunk(b"IDAT", zlib.compress(bytes(raw), level)) + chunk(b"IEND", b"")
+
+def encode(frame: Frame, fmt: str = "png") -> Tuple[bytes, str]:
+    """Encode a frame; returns (data, format actually used)"""
+    if fmt == "webp":
+        if Image is not None:
+            import io
+            img = Image.frombuffer("RGBA", (frame.width, frame.height), bytes(frame.pixels), "raw", "RGBA", 0, 1)
+            buf = io.BytesIO()
+            img.save(buf, "WEBP", quality=80)
+            return buf.getvalue(), "webp"
+        print("[capture] Pillow not installed, falling back to PNG")
+    return encode_png(frame), "png"
+
+class ScreenshotPipeline:
+    """Raw framebuffer capture with encoding and disk writes on a background pool.
+
+    Capture buffers are pooled: a buffer goes back to the pool once the worker
+    that encodes its frame is done, so steady-state captures allocate nothing
+    (with ADB_BACKEND=socket the framebuffer is received straight into it).
+    """
+
+    def __init__(self, workers: int = int(os.getenv("SCREENSHOT_WORKERS", "2"))):
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="screenshot")
+        self._buffers: "queue.Queue[bytearray]" = queue.Queue()
+        self._pending: List[Tuple[Future, Dict[str, Any]]] = []
+        self._lock = threading.Lock()
+        self.frames: List[Dict[str, Any]] = []
+
+    def _acquire(self) -> bytearray:
+        try:
+            return self._buffers.get_nowait()
+        except queue.Empty:
+            return bytearray(4 * 1024 * 1024)
+
+    def capture_flow(self, path: str, crop: Optional[Tuple[int, int, int, int]] = None,
+                     scale: int = 1, fmt: str = "png") -> Flow:
+        """Capture one frame (flow) and queue its encode/write; returns per-frame stats"""
+        buf = self._acquire()
+        t0 = time.monotonic()
+        code, data = yield AdbCall(["exec-out", "screencap"], 10.0, binary=True, into=buf)
+        capture_ms = round((time.monotonic() - t0) * 1000, 1)
+        stat = {"path": path, "capture_ms": capture_ms, "bytes": len(data), "ok": code == 0}
+        if code != 0:
+            self._buffers.put(buf)
+            stat["error"] = bytes(data[-200:]).decode("utf-8", "replace")
+            return stat
+        try:
+            frame = transform(parse_raw(data), crop, scale)
+        except ValueError as e:
+            self._buffers.put(buf)
+            stat.update(ok=False, error=str(e))
+            return stat
+        stat.update(width=frame.width, height=frame.height)
+        fut = self._pool.submit(self._write, frame, path, fmt, buf, stat)
+        with self._lock:
+            self._pending.append((fut, stat))
+            self.frames.append(stat)
+        return stat
+
+    def burst_flow(self, paths: List[str], interval_sec: float, **kwargs) -> Flow:
+        """Capture len(paths) frames on a fixed schedule (interval measured start to start)"""
+        start = time.monotonic()
+        stats = []
+        for i, path in enumerate(paths):
+            delay = start + i * interval_sec - time.monotonic()
+            if i and delay > 0:
+                yield Sleep(delay)
+            stats.append((yield from self.capture_flow(path, **kwargs)))
+        return stats
+
+    def _write(self, frame: Frame, path: str, fmt: str, buf: bytearray, stat: Dict[str, Any]):
+        """Encode and write one frame; a failure (disk full, permissions, Pillow) is recorded in its stat"""
+        try:
+            t0 = time.monotonic()
+            data, used = encode(frame, fmt)
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(data)
+            stat.update(encoded_bytes=len(data), encode_ms=round((time.monotonic() - t0) * 1000, 1), format=used)
+        except Exception as e:
+            stat.update(ok=False, error=f"write failed: {e}")
+        finally:
+            del frame
+            self._buffers.put(buf)
+
+    def flush(self, timeout_sec: Optional[float] = None):
+        """Wait for queued encodes/writes to finish; failed ones are logged (and counted in stats())"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        for fut, stat in pending:
+            fut.result(timeout=timeout_sec)
+            if not stat["ok"]:
+                print(f"[capture] {stat['path']}: {stat['error']}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            frames = list(self.frames)
+        lat = sorted(f["capture_ms"] for f in frames)
+        return {
+            "frames": len(frames),
+            "failed": sum(not f["ok"] for f in frames),
+            "bytes_transferred": sum(f["bytes"] for f in frames),
+            "bytes_written": sum(f.get("encoded_bytes", 0) for f in frames),
+            "avg_capture_ms": round(sum(lat) / len(lat), 1) if lat else 0.0,
+            "max_capture_ms": lat[-1] if lat else 0.0,
+        }
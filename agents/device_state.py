@@ -0,0 +1,98 @@
+import os, re, time, threading
+from typing import Callable, Dict, Any, Optional
+from agents.batch import InputBatch
+from agents.flows import AdbCall, Flow, drive
+
+# One round trip: wakefulness from power manager, keyguard from window manager
+# (field names vary across Android releases, so several are matched)
+STATE_QUERY = ("dumpsys power | grep -E 'mWakefulness=|Display Power: state='; "
+               "dumpsys window | grep -E 'mDreamingLockscreen=|mShowingLockscreen=|isStatusBarKeyguard=|mKeyguardShowing='")
+
+_AWAKE_RE = re.compile(r"mWakefulness=(\w+)")
+_DISPLAY_RE = re.compile(r"Display Power: state=(\w+)")
+_LOCKED_RE = re.compile(r"(?:mDreamingLockscreen|mShowingLockscreen|isStatusBarKeyguard|mKeyguardShowing)=(true|false)")
+
+def parse_state(out: str) -> Dict[str, Optional[bool]]:
+    """Parse STATE_QUERY output into {"awake", "locked"}; None when a field is absent"""
+    awake = None
+    m = _AWAKE_RE.search(out or "")
+    if m:
+        awake = m.group(1) == "Awake"
+    else:
+        m = _DISPLAY_RE.search(out or "")
+        if m:
+            awake = m.group(1) == "ON"
+    locks = _LOCKED_RE.findall(out or "")
+    locked = ("true" in locks) if locks else None
+    return {"awake": awake, "locked": locked}
+
+class DeviceStateTracker:
+    """Per-device cache of display/keyguard state with a TTL.
+
+    Lets the executor skip the wake sequence when the screen is already
+    interactive, and apply the stay-awake setting once per device session.
+    """
+
+    def __init__(self, adb: Callable[..., tuple[int, str]], ttl_sec: Optional[float] = None):
+        self._adb = adb
+        self.ttl_sec = ttl_sec if ttl_sec is not None else float(os.getenv("DEVICE_STATE_TTL_SEC", "30"))
+        self.hits = 0
+        self.misses = 0
+        self.wakes = 0
+        self._states: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _entry(self, serial: Optional[str]) -> Dict[str, Any]:
+        with self._lock:
+            return self._states.setdefault(serial or "", {"checked_at": 0.0, "interactive": False, "stay_on": False})
+
+    def _count(self, counter: str):
+        # Flows for different devices run on worker threads; += on an attribute isn't atomic
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def invalidate(self, serial: Optional[str] = None):
+        """Forget cached state (e.g. after a reconnect or failed healthcheck)"""
+        with self._lock:
+            self._states.pop(serial or "", None)
+
+    def ensure_awake(self, serial: Optional[str] = None) -> bool:
+        """Make sure the device is awake and unlocked; returns True on a cache hit"""
+        return drive(self.flow(serial), self._adb, serial=serial)
+
+    def flow(self, serial: Optional[str] = None) -> Flow:
+        """Flow form of ensure_awake(), for use inside task flows"""
+        st = self._entry(serial)
+        if st["interactive"] and time.monotonic() - st["checked_at"] < self.ttl_sec:
+            self._count("hits")
+            return True
+        self._count("misses")
+
+        if not st["stay_on"]:
+            code, _ = yield AdbCall(["shell", "settings", "put", "global", "stay_on_while_plugged_in", "3"], 8.0)
+            st["stay_on"] = (code == 0)
+
+        code, out = yield AdbCall(["shell", STATE_QUERY], 5.0)
+        state = parse_state(out) if code == 0 else {"awake": None, "locked": None}
+        batch = InputBatch()
+        if state["awake"] is not True:
+            batch.keyevent(224)  # KEYCODE_WAKEUP: unlike POWER (26) it never turns the screen off
+        if state["locked"] is not False:
+            batch.keyevent(82)   # Menu/unlock
+        if batch.steps:
+            self._count("wakes")
+            yield from batch.flow()
+        st["interactive"] = True
+        st["checked_at"] = time.monotonic()
+        return False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits, misses, wakes = self.hits, self.misses, self.wakes
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "wakes": wakes,
+            "hit_rate": round(hits / total, 3) if total else 0.0,
+        }
@@ -1,5 +1,67 @@
-import subprocess, time, os
-from typing import Dict, Any
+import functools, subprocess, sys, time, os
+from typing import Callable, Dict, Any, Optional
+from agents.adb_session import get_session
+from agents.adb_protocol import adb_socket, adb_socket_bytes
+from agents.device_state import DeviceStateTracker
+from agents.batch import InputBatch
+from agents.flows import AdbCall, AdbResult, Flow, drive, track_timeouts
+from agents.health import CLOSED, HealthRegistry
+from agents.capture import ScreenshotPipeline
+from agents.timeouts import AdaptiveTimeouts
+from agents.ui_hierarchy import UiHierarchyCache, describe
+from agents.text_input import TextInput
+from agents.perf_sampler import PerfSampler
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from observability.metrics import metrics
+
+# Shell programs whose first argument says what the call does ("am start", "input swipe")
+_TWO_WORD = {"am", "input", "cmd", "pm", "settings", "svc", "wm"}
+
+def command_kind(args: list) -> str:
+    """Low-cardinality metric label for an ADB call"""
+    if not args:
+        return "none"
+    if args[0] not in ("shell", "exec-out") or len(args) < 2:
+        return args[0]
+    words = " ".join(args[1:]).split()
+    if not words:
+        return args[0]
+    if words[:3] == ["am", "start", "-W"]:
+        return "am start -W"  # waits for the first frame: its latency says nothing about a plain launch
+    if words[0] in _TWO_WORD and len(words) > 1:
+        return f"{words[0]} {words[1]}"
+    return words[0] if words[0].replace("-", "").replace("_", "").isalnum() else "script"
+
+# Learned per-(device, command kind) timeouts; the budgets passed by callers are the cold-start defaults
+timeouts = AdaptiveTimeouts()
+
+def _device_label(serial: Optional[str]) -> str:
+    return serial or os.getenv("ANDROID_SERIAL") or "default"
+
+def _labels(args: list, serial: Optional[str]) -> Dict[str, str]:
+    return {"command": command_kind(args), "device": _device_label(serial)}
+
+def _record_adb(labels: Dict[str, str], seconds: float, code: int, timeout_sec: float):
+    metrics.observe("adb_command_seconds", seconds, **labels)
+    if code == 124:
+        metrics.inc("adb_timeouts_total", **labels)
+    elif code != 0:
+        metrics.inc("adb_errors_total", **labels)
+    timeouts.observe(labels["command"], labels["device"], seconds, code, timeout_sec)
+    ui_cache.observe(labels["command"], labels["device"])
+
+def _instrumented(fn):
+    """Apply the learned timeout; record latency, timeouts and errors per ADB command kind and device"""
+    @functools.wraps(fn)
+    def wrapper(args: list, timeout_sec: float = 15.0, serial: Optional[str] = None, **kw):
+        labels = _labels(args, serial)
+        timeout_sec = timeouts.effective(labels["command"], labels["device"], timeout_sec)
+        t0 = time.perf_counter()
+        code, out = fn(args, timeout_sec, serial, **kw)
+        _record_adb(labels, time.perf_counter() - t0, code, timeout_sec)
+        return AdbResult(code, out, timeout_sec)
+    return wrapper
 
 def _run_with_timeout(cmd: list[str], timeout_sec: float = 15.0) -> tuple[int, str]:
     """Run command with timeout support"""
@@ -13,140 +75,385 @@ def _run_with_timeout(cmd: list[str], timeout_sec: float = 15.0) -> tuple[int, s
     except Exception as e:
         return 1, f"ERROR: {e}"
 
-def _adb(args: list[str], timeout_sec: float = 15.0) -> tuple[int, str]:
-    """ADB command with timeout"""
+def _run_bytes_with_timeout(cmd: list[str], timeout_sec: float = 15.0) -> tuple[int, bytes]:
+    """Run command with timeout, keeping stdout binary (stderr returned on failure)"""
+    try:
+        p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        out, err = p.communicate(timeout=timeout_sec)
+        return p.returncode, (out if p.returncode == 0 else err or out) or b""
+    except subprocess.TimeoutExpired:
+        p.kill()
+        return 124, b"TIMEOUT"
+    except Exception as e:
+        return 1, f"ERROR: {e}".encode()
+
+@_instrumented
+def _adb(args: list[str], timeout_sec: float = 15.0, serial: Optional[str] = None, channel: str = "") -> tuple[int, str]:
+    """ADB command with timeout (`channel`: use a separate persistent shell, see get_session)"""
     # Support mock mode for CI testing
     if os.getenv("MOCK_ADB") == "1":
         return 0, "mocked_output"
-    return _run_with_timeout(["adb", *args], timeout_sec)
+    serial = serial or os.getenv("ANDROID_SERIAL") or None
+    # ADB_BACKEND=socket talks to the adb server directly; unsupported subcommands fall back to the binary
+    if os.getenv("ADB_BACKEND") == "socket":
+        res = adb_socket(args, timeout_sec, serial)
+        if res is not None:
+            return res
+    # Shell commands reuse one long-lived `adb shell` per device (ADB_PERSISTENT_SHELL=0 to disable).
+    # adb itself joins shell args with spaces, so the device sees the same command line either way.
+    if len(args) > 1 and args[0] == "shell" and os.getenv("ADB_PERSISTENT_SHELL", "1") == "1":
+        return get_session(serial, channel).run(" ".join(args[1:]), timeout_sec)
+    return _run_with_timeout(["adb", *(["-s", serial] if serial else []), *args], timeout_sec)
 
-def adb_healthcheck() -> bool:
-    """Check if ADB connection is healthy"""
-    code, out = _adb(["get-state"], timeout_sec=5.0)
+@_instrumented
+def _adb_bytes(args: list[str], timeout_sec: float = 15.0, serial: Optional[str] = None,
+               into: Optional[bytearray] = None) -> tuple[int, bytes]:
+    """ADB command whose stdout is binary (exec-out, pull into memory)"""
+    if os.getenv("MOCK_ADB") == "1":
+        return 0, b"mocked_output"
+    serial = serial or os.getenv("ANDROID_SERIAL") or None
+    if os.getenv("ADB_BACKEND") == "socket":
+        res = adb_socket_bytes(args, timeout_sec, serial, into)
+        if res is not None:
+            return res
+    if args[:1] == ["pull"] and len(args) == 2:
+        args = ["exec-out", "cat", args[1]]  # in-memory pull without a temp file
+    return _run_bytes_with_timeout(["adb", *(["-s", serial] if serial else []), *args], timeout_sec)
+
+def _healthy(code: int, out: str) -> bool:
     return code == 0 and "device" in (out or "").lower()
 
-def _ensure_awake():
-    """Wake device and ensure it's unlocked"""
-    _adb(["shell", "settings", "put", "global", "stay_on_while_plugged_in", "3"])
-    _adb(["shell", "input", "keyevent", "26"])  # Power button
-    _adb(["shell", "input", "keyevent", "82"])  # Menu/unlock
+def adb_healthcheck(serial: Optional[str] = None) -> bool:
+    """Check if ADB connection is healthy"""
+    return _healthy(*_adb(["get-state"], timeout_sec=5.0, serial=serial))
+
+# Background health probes + circuit breaker per device (HEALTH_MONITOR=0 to probe per task)
+health = HealthRegistry(lambda serial: adb_healthcheck(serial))
+
+# Parsed UI hierarchies for element-targeted tap/type (invalidated by screen-changing calls in _record_adb)
+ui_cache = UiHierarchyCache()
+
+# Picks keys (`input text`) or the ADB keyboard IME per string (TEXT_INPUT_MODE)
+text_input = TextInput()
+
+# Device-side perf sampling per episode (PERF_SAMPLER=1). Its calls bypass _instrumented and use
+# their own shell channel: they stay out of command metrics, learned timeouts and the UI cache
+perf = PerfSampler(lambda args, timeout_sec, serial: _adb.__wrapped__(args, timeout_sec, serial, channel="perf"))
+
+# Raw framebuffer capture; PNG/WebP encoding and file writes happen on background workers
+screenshots = ScreenshotPipeline()
 
-def run_task(task: str, params: Dict[str, Any]) -> Dict[str, Any]:
+# Cached display/keyguard state per device (TTL via DEVICE_STATE_TTL_SEC)
+wake_state = DeviceStateTracker(lambda *a, **kw: _adb(*a, **kw))
+
+def _ensure_awake(serial: Optional[str] = None):
+    """Wake device and ensure it's unlocked (no-op while the cached state is fresh)"""
+    wake_state.ensure_awake(serial)
+
+def run_task(task: str, params: Dict[str, Any], serial: Optional[str] = None) -> Dict[str, Any]:
     """Execute a task with reliability features"""
+    return drive(task_flow(task, params, serial), _adb, _adb_bytes, serial)
+
+# Single-input tasks a sequence can fold into one on-device script with their neighbours
+# (taps only with coordinates: an element tap has to look its target up first)
+BATCHABLE = {"tap", "swipe", "scroll", "nav_home", "nav_back", "nav_recents"}
+SELECTOR_KEYS = ("text", "id", "desc")
+_KEYCODES = {"nav_home": 3, "nav_back": 4, "nav_recents": 187}  # HOME, BACK, APP_SWITCH
+# Tasks that don't wake the screen first
+_NO_WAKE = {"nav_home", "nav_back", "nav_recents", "open_notifications", "wifi"}
+
+def _preflight(serial: Optional[str], phases: Dict[str, float]) -> Flow:
+    """Healthcheck before sending work; returns the reason to give up, or None"""
     start = time.time()
-    
-    # Pre-flight healthcheck
-    if not adb_healthcheck():
-        return {
-            "success": False, 
-            "latency_sec": 0.0, 
-            "task": task, 
-            "details": "adb not healthy - device disconnected or unresponsive"
-        }
-    
-    try:
-        if task == "browser_search":
-            query = params.get("query", "qualgent test")
-            _ensure_awake()
-            code, out = _adb(["shell", "am", "start",
-                               "-a", "android.intent.action.VIEW",
-                               "-d", f"https://www.google.com/search?q={query}"], timeout_sec=10.0)
-            ok, details = (code == 0), out[-500:]
-            
-        elif task == "open_settings":
-            _ensure_awake()
-            code, out = _adb(["shell", "am", "start", "-a", "android.settings.SETTINGS"], timeout_sec=8.0)
-            ok, details = (code == 0), out[-500:]
-            
-        elif task == "scroll":
-            _ensure_awake()
-            count = int(params.get("count", 2))
-            ok = True; details = ""
-            for i in range(max(1, min(10, count))):
-                c, o = _adb(["shell", "input", "swipe", "500", "1600", "500", "600"], timeout_sec=5.0)
-                ok = ok and (c == 0)
-                if i < count - 1:  # Don't sleep after last swipe
-                    time.sleep(0.3)
-            details = f"scrolled {count} times" if ok else "scroll failed"
-            
-        elif task == "screenshot":
-            _ensure_awake()
-            filename = params.get("filename", "shot_1.png")
-            # Ensure results directory exists
-            os.makedirs("results", exist_ok=True)
-            c, o = _run_with_timeout(["bash", "-c", f"adb exec-out screencap -p > results/{filename}"], timeout_sec=10.0)
-            ok = (c == 0); details = f"saved to results/{filename}" if ok else o[-200:]
-            
-        elif task == "open_app":
-            _ensure_awake()
-            pkg = params.get("package", "")
-            activity = params.get("activity", "")
-            if pkg and activity:
-                code, out = _adb(["shell", "am", "start", "-n", f"{pkg}/{activity}"], timeout_sec=8.0)
-            elif pkg:
-                code, out = _adb(["shell", "monkey", "-p", pkg, "-c", "android.intent.category.LAUNCHER", "1"], timeout_sec=10.0)
-            else:
-                code, out = (1, "missing package parameter")
-            ok, details = (code == 0), out[-500:]
-            
-        elif task == "open_url":
-            _ensure_awake()
-            url = params.get("url", "https://www.google.com")
-            code, out = _adb(["shell", "am", "start", "-a", "android.intent.action.VIEW", "-d", url], timeout_sec=10.0)
-            ok, details = (code == 0), out[-500:]
-            
-        elif task == "tap":
-            _ensure_awake()
-            x = str(params.get("x", 500)); y = str(params.get("y", 1000))
-            code, out = _adb(["shell", "input", "tap", x, y], timeout_sec=5.0)
-            ok, details = (code == 0), f"tapped ({x},{y})" if code == 0 else out[-200:]
-            
-        elif task == "swipe":
-            _ensure_awake()
-            x1 = str(params.get("x1", 500)); y1 = str(params.get("y1", 1600))
-            x2 = str(params.get("x2", 500)); y2 = str(params.get("y2", 600))
-            code, out = _adb(["shell", "input", "swipe", x1, y1, x2, y2], timeout_sec=5.0)
-            ok, details = (code == 0), f"swiped ({x1},{y1})->({x2},{y2})" if code == 0 else out[-200:]
-            
-        elif task == "type_text":
-            _ensure_awake()
-            text = params.get("text", "hello world").replace(" ", "%s")
-            code, out = _adb(["shell", "input", "text", text], timeout_sec=8.0)
-            ok, details = (code == 0), f"typed: {text}" if code == 0 else out[-200:]
-            
-        elif task == "nav_home":
-            code, out = _adb(["shell", "input", "keyevent", "3"], timeout_sec=3.0)  # KEYCODE_HOME
-            ok, details = (code == 0), "home pressed" if code == 0 else out[-100:]
-            
-        elif task == "nav_back":
-            code, out = _adb(["shell", "input", "keyevent", "4"], timeout_sec=3.0)  # KEYCODE_BACK
-            ok, details = (code == 0), "back pressed" if code == 0 else out[-100:]
-            
-        elif task == "nav_recents":
-            code, out = _adb(["shell", "input", "keyevent", "187"], timeout_sec=3.0)  # KEYCODE_APP_SWITCH
-            ok, details = (code == 0), "recents opened" if code == 0 else out[-100:]
-            
-        elif task == "open_notifications":
-            code, out = _adb(["shell", "cmd", "statusbar", "expand-notifications"], timeout_sec=5.0)
-            ok, details = (code == 0), "notifications expanded" if code == 0 else out[-100:]
-            
-        elif task == "wifi":
-            enabled = bool(params.get("enabled", True))
-            state = "enable" if enabled else "disable"
-            code, out = _adb(["shell", "svc", "wifi", state], timeout_sec=5.0)
-            ok, details = (code == 0), f"wifi {state}d" if code == 0 else out[-100:]
-            
-        else:
-            ok, details = False, f"Unknown task: {task}"
-            
-    except Exception as e:
-        ok, details = False, f"Exception: {e}"
-    
+    # Cached monitor status when fresh, inline probe otherwise
+    mon = health.get(serial)
+    if mon is not None and not mon.breaker.allow():
+        return "circuit open - device failing healthchecks, not sending work"
+    # A half-open breaker let this call through as its one trial: probe for real and record it
+    if mon is not None and mon.fresh() and mon.breaker.state == CLOSED:
+        ok = mon.healthy
+    else:
+        code, out = yield AdbCall(["get-state"], 5.0)
+        ok = _healthy(code, out)
+        if mon is not None:
+            mon.record(ok)
+    phases["healthcheck_sec"] = round(time.time() - start, 3)
+    if not ok:
+        wake_state.invalidate(serial)
+        return "adb not healthy - device disconnected or unresponsive"
+    return None
+
+def _result(task: str, ok: bool, details: str, code: Optional[int], start: float,
+            phases: Dict[str, float], timeout_sec: Optional[float]) -> Dict[str, Any]:
     latency = round(time.time() - start, 3)
+    phases["action_sec"] = round(max(0.0, latency - phases["healthcheck_sec"] - phases["wake_sec"]), 3)
     return {
         "success": ok, 
         "latency_sec": latency, 
         "task": task, 
         "details": details,
-        "timeout_used": latency > 10.0  # Flag if we likely hit a timeout
-    }
\ No newline at end of file
+        "timeout_used": code == 124,  # the last call (the action) hit its timeout
+        "timeout_sec": timeout_sec,  # ...which was this (learned or default)
+        "exit_code": code,
+        "phases": phases,
+    }
+
+def task_flow(task: str, params: Dict[str, Any], serial: Optional[str] = None) -> Flow:
+    """Task logic as a flow (see agents/flows.py); run_task and run_task_async drive it"""
+    if task == "sequence":
+        return (yield from sequence_flow(params.get("steps", []), serial, params.get("start", 0)))
+    start = time.time()
+    # Where the task's time went (healthcheck / wake / action), for trace analysis
+    phases = {"healthcheck_sec": 0.0, "wake_sec": 0.0, "action_sec": 0.0}
+
+    def wake() -> Flow:
+        t = time.time()
+        yield from wake_state.flow(serial)
+        phases["wake_sec"] = round(time.time() - t, 3)
+
+    failed = yield from _preflight(serial, phases)
+    if failed:
+        return {"success": False, "latency_sec": 0.0, "task": task, "details": failed, "phases": phases}
+
+    code = None  # last exit code, for retry classification
+    seen = {}  # timeout of the last call
+    try:
+        ok, details, code = yield from track_timeouts(_action_flow(task, params, serial, wake), seen)
+    except Exception as e:
+        ok, details = False, f"Exception: {e}"
+    return _result(task, ok, details, code, start, phases, seen.get("timeout_sec"))
+
+def _add_input(batch: InputBatch, task: str, params: Dict[str, Any], gap: float):
+    """Append a BATCHABLE step to an input script, pausing `gap` seconds on the device after it"""
+    if task == "tap":
+        batch.tap(params.get("x", 500), params.get("y", 1000), delay=gap)
+    elif task == "swipe":
+        batch.swipe(params.get("x1", 500), params.get("y1", 1600), params.get("x2", 500), params.get("y2", 600), delay=gap)
+    elif task == "scroll":
+        for _ in range(max(1, min(10, int(params.get("count", 2))))):
+            batch.swipe(500, 1600, 500, 600, delay=0.3)
+        batch.sleep(max(0.0, gap - 0.3))
+    else:
+        batch.keyevent(_KEYCODES[task], delay=gap)
+
+def sequence_flow(steps: list, serial: Optional[str] = None, start_step: int = 0) -> Flow:
+    """A multi-step plan as one pipeline: one healthcheck and wake for the whole
+    sequence, runs of consecutive BATCHABLE steps sent as a single input script
+    (SEQUENCE_INPUT_GAP_SEC device-side pause between them), everything else in
+    order. Stops at the first failed step; the result's "steps" holds per-step
+    outcomes and timing and "failed_step" where a retry should resume.
+    """
+    start = time.time()
+    phases = {"healthcheck_sec": 0.0, "wake_sec": 0.0, "action_sec": 0.0}
+    gap = float(os.getenv("SEQUENCE_INPUT_GAP_SEC", "0.3"))
+    out, seen = [], {}
+
+    failed = yield from _preflight(serial, phases)
+    if failed:
+        return {"success": False, "latency_sec": 0.0, "task": "sequence", "details": failed, "phases": phases,
+                "steps": out, "failed_step": start_step}
+    if any(st["task"] not in _NO_WAKE for st in steps[start_step:]):
+        t = time.time()
+        yield from wake_state.flow(serial)
+        phases["wake_sec"] = round(time.time() - t, 3)
+
+    def step_done(i: int, ok: bool, details: str, code: Optional[int], seconds: float, **extra):
+        task = steps[i]["task"]
+        metrics.observe("step_seconds", seconds, task=task)
+        out.append({"step": i, "task": task, "success": ok, "latency_sec": round(seconds, 3),
+                    "exit_code": code, "details": details[-200:], **extra})
+
+    def no_wake() -> Flow:
+        return
+        yield
+
+    i, code, failed_step = start_step, None, None
+    while i < len(steps) and failed_step is None:
+        j = i
+        while j < len(steps) and steps[j]["task"] in BATCHABLE and not _selector(steps[j].get("params", {})):
+            j += 1
+        t0 = time.time()
+        if j - i > 1:
+            # Stop at a failed step so a retry from it doesn't repeat the ones after
+            batch, owner = InputBatch(stop_on_error=True), []
+            for k in range(i, j):
+                n = len(batch.steps)
+                _add_input(batch, steps[k]["task"], steps[k].get("params", {}), gap)
+                owner += [k] * (len(batch.steps) - n)
+            res = yield from track_timeouts(batch.flow(), seen)
+            code, seconds = res["code"], time.time() - t0
+            for k in range(i, j):
+                codes = [s["code"] for s, o in zip(res["steps"], owner) if o == k]
+                # Unreported codes mean the step never ran (or its output was lost): the script status decides
+                ok = all(c == 0 or (c is None and res["code"] == 0) for c in codes)
+                bad = next((c for c in codes if c not in (0, None)), None if ok else res["code"])
+                labels = ", ".join(s["label"] for s, o in zip(batch.steps, owner) if o == k)
+                # A batched step's latency is its share (by input count) of the batch's round trip
+                step_done(k, ok, labels if ok else f"{labels}: exit {bad} {res['output']}", 0 if ok else bad,
+                          seconds * len(codes) / len(owner), batch=i, batch_sec=round(seconds, 3))
+                if not ok:
+                    failed_step = k
+                    break
+        else:
+            st = steps[i]
+            try:
+                ok, details, code = yield from track_timeouts(
+                    _action_flow(st["task"], st.get("params", {}), serial, no_wake), seen)
+            except Exception as e:
+                ok, details, code = False, f"Exception: {e}", None
+            step_done(i, ok, details, code, time.time() - t0)
+            if not ok:
+                failed_step = i
+        i = j if j - i > 1 else i + 1
+
+    if failed_step is None:
+        details = f"{len(steps) - start_step} steps ok" + (f" (resumed at step {start_step})" if start_step else "")
+    else:
+        details = f"step {failed_step} ({steps[failed_step]['task']}) failed: {out[-1]['details']}"
+    res = _result("sequence", failed_step is None, details, code, start, phases, seen.get("timeout_sec"))
+    res["steps"], res["failed_step"] = out, failed_step
+    return res
+
+def _selector(params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Element selector in a tap's params (or a type_text's "into"), None for coordinates"""
+    sel = {k: params[k] for k in (*SELECTOR_KEYS, "index") if k in params}
+    return sel if any(k in sel for k in SELECTOR_KEYS) else None
+
+def _action_flow(task: str, params: Dict[str, Any], serial: Optional[str], wake: Callable[[], Flow]) -> Flow:
+    """The device work of one task, after the preflight; returns (ok, details, last exit code)"""
+    code = None
+    if task == "browser_search":
+        query = params.get("query", "qualgent test")
+        yield from wake()
+        code, out = yield AdbCall(["shell", "am", "start",
+                                   "-a", "android.intent.action.VIEW",
+                                   "-d", f"https://www.google.com/search?q={query}"], 10.0)
+        ok, details = (code == 0), out[-500:]
+
+    elif task == "open_settings":
+        yield from wake()
+        code, out = yield AdbCall(["shell", "am", "start", "-a", "android.settings.SETTINGS"], 8.0)
+        ok, details = (code == 0), out[-500:]
+
+    elif task == "scroll":
+        yield from wake()
+        count = max(1, min(10, int(params.get("count", 2))))
+        # All swipes (with 0.3s device-side pauses) go to the device as one script
+        batch = InputBatch()
+        for _ in range(count):
+            batch.swipe(500, 1600, 500, 600, delay=0.3)
+        res = yield from batch.flow()
+        ok, code = res["ok"], res["code"]
+        failed = [s["step"] for s in res["steps"] if s["code"] not in (0, None)]
+        details = f"scrolled {count} times" if ok else f"scroll failed (steps {failed}, exit {res['code']})"
+
+    elif task == "screenshot":
+        yield from wake()
+        filename = params.get("filename", "shot_1.png")
+        count = max(1, min(50, int(params.get("count", 1))))
+        crop = params.get("crop")
+        if isinstance(crop, str):
+            crop = tuple(int(v) for v in crop.split(","))
+        opts = {"crop": crop, "scale": int(params.get("scale", 1)), "fmt": params.get("format", "png")}
+        stem, ext = os.path.splitext(filename)
+        names = [filename] if count == 1 else [f"{stem}_{i}{ext}" for i in range(count)]
+        # Encoding and the write to results/ finish in the background (screenshots.flush())
+        shots = yield from screenshots.burst_flow([os.path.join("results", n) for n in names],
+                                                   float(params.get("interval", 0.5)), **opts)
+        ok = all(s["ok"] for s in shots)
+        avg_ms = sum(s["capture_ms"] for s in shots) / len(shots)
+        nbytes = sum(s["bytes"] for s in shots)
+        target = f"results/{filename}" if count == 1 else f"results/{stem}_*{ext} ({count} frames)"
+        details = (f"captured for {target} (written in the background); capture {avg_ms:.0f} ms/frame, {nbytes} bytes" if ok
+                   else next(s.get("error", "capture failed") for s in shots if not s["ok"]))
+
+    elif task == "open_app":
+        yield from wake()
+        pkg = params.get("package", "")
+        activity = params.get("activity", "")
+        # With the perf sampler on, launches wait for the first frame (-W) to report TotalTime;
+        # monkey can't, so a package-only launch resolves its launcher activity through am start
+        wait = ["-W"] if perf.enabled else []
+        if pkg and activity:
+            code, out = yield AdbCall(["shell", "am", "start", *wait, "-n", f"{pkg}/{activity}"], 8.0 + 7.0 * perf.enabled)
+        elif pkg and perf.enabled:
+            code, out = yield AdbCall(["shell", "am", "start", "-W", "-a", "android.intent.action.MAIN",
+                                       "-c", "android.intent.category.LAUNCHER", "-p", pkg], 15.0)
+        elif pkg:
+            code, out = yield AdbCall(["shell", "monkey", "-p", pkg, "-c", "android.intent.category.LAUNCHER", "1"], 10.0)
+        else:
+            code, out = (1, "missing package parameter")
+        if wait and code == 0:
+            perf.record_launch(_device_label(serial), out)
+        ok, details = (code == 0), out[-500:]
+
+    elif task == "open_url":
+        yield from wake()
+        url = params.get("url", "https://www.google.com")
+        wait = ["-W"] if perf.enabled else []
+        code, out = yield AdbCall(["shell", "am", "start", *wait, "-a", "android.intent.action.VIEW", "-d", url],
+                                  10.0 + 5.0 * perf.enabled)
+        if wait and code == 0:
+            perf.record_launch(_device_label(serial), out)
+        ok, details = (code == 0), out[-500:]
+
+    elif task == "tap":
+        yield from wake()
+        sel = _selector(params)
+        node = (yield from ui_cache.find_flow(_device_label(serial), sel)) if sel else None
+        if sel and node is None:
+            code, out = 1, f"element not found: {describe(sel)}"
+            x = y = None
+        else:
+            x, y = map(str, node.center) if node else (str(params.get("x", 500)), str(params.get("y", 1000)))
+            code, out = yield AdbCall(["shell", "input", "tap", x, y], 5.0)
+        target = f" {describe(sel)}" if sel else ""
+        ok, details = (code == 0), f"tapped{target} ({x},{y})" if code == 0 else out[-200:]
+
+    elif task == "swipe":
+        yield from wake()
+        x1 = str(params.get("x1", 500)); y1 = str(params.get("y1", 1600))
+        x2 = str(params.get("x2", 500)); y2 = str(params.get("y2", 600))
+        code, out = yield AdbCall(["shell", "input", "swipe", x1, y1, x2, y2], 5.0)
+        ok, details = (code == 0), f"swiped ({x1},{y1})->({x2},{y2})" if code == 0 else out[-200:]
+
+    elif task == "type_text":
+        yield from wake()
+        text = str(params.get("text", "hello world"))
+        # Optional target field: {"into": {"id": "search_src_text"}} taps it first
+        sel = _selector(params.get("into") or {})
+        node = (yield from ui_cache.find_flow(_device_label(serial), sel)) if sel else None
+        if sel and node is None:
+            code, out = 1, f"element not found: {describe(sel)}"
+        else:
+            code, out = (yield AdbCall(["shell", "input", "tap", *map(str, node.center)], 5.0)) if node else (0, "")
+            if code == 0:
+                typed = yield from text_input.flow(text, _device_label(serial))
+                code, out = typed["code"], typed["details"]
+        ok, details = (code == 0), out[-200:]
+
+    elif task == "nav_home":
+        code, out = yield AdbCall(["shell", "input", "keyevent", "3"], 3.0)  # KEYCODE_HOME
+        ok, details = (code == 0), "home pressed" if code == 0 else out[-100:]
+
+    elif task == "nav_back":
+        code, out = yield AdbCall(["shell", "input", "keyevent", "4"], 3.0)  # KEYCODE_BACK
+        ok, details = (code == 0), "back pressed" if code == 0 else out[-100:]
+
+    elif task == "nav_recents":
+        code, out = yield AdbCall(["shell", "input", "keyevent", "187"], 3.0)  # KEYCODE_APP_SWITCH
+        ok, details = (code == 0), "recents opened" if code == 0 else out[-100:]
+
+    elif task == "open_notifications":
+        code, out = yield AdbCall(["shell", "cmd", "statusbar", "expand-notifications"], 5.0)
+        ok, details = (code == 0), "notifications expanded" if code == 0 else out[-100:]
+
+    elif task == "wifi":
+        enabled = bool(params.get("enabled", True))
+        state = "enable" if enabled else "disable"
+        code, out = yield AdbCall(["shell", "svc", "wifi", state], 5.0)
+        ok, details = (code == 0), f"wifi {state}d" if code == 0 else out[-100:]
+
+    else:
+        ok, details = False, f"Unknown task: {task}"
+    return ok, details, code
@@ -0,0 +1,79 @@
+import asyncio, time
+from typing import Any, Callable, Generator, NamedTuple, Optional, Union
+
+class AdbCall(NamedTuple):
+    """One ADB request yielded by a flow; the driver sends back its (code, output)"""
+    args: list
+    timeout_sec: float = 15.0
+    binary: bool = False  # output as bytes (exec-out, pull)
+    into: Optional[bytearray] = None  # reusable buffer for binary output (socket backend)
+
+class AdbResult(tuple):
+    """(code, output) of one ADB call, carrying the timeout it actually ran with
+    (the learned one, or the caller's budget); unpacks like a plain pair"""
+
+    def __new__(cls, code: int, out: Any, timeout_sec: Optional[float] = None):
+        res = super().__new__(cls, (code, out))
+        res.timeout_sec = timeout_sec
+        return res
+
+class Sleep(NamedTuple):
+    """Host-side pause yielded by a flow (time.sleep or asyncio.sleep depending on the driver)"""
+    seconds: float
+
+# Task logic is written once as a generator that yields AdbCalls and receives
+# their results, so the same code runs under the blocking and asyncio drivers.
+Flow = Generator[Union[AdbCall, Sleep], Any, Any]
+
+def track_timeouts(flow: Flow, seen: dict) -> Flow:
+    """Run `flow` as part of another, keeping in seen["timeout_sec"] the timeout
+    its latest ADB call ran with (None if the driver didn't report one)"""
+    send, result = flow.send, None
+    while True:
+        try:
+            call = send(result)
+        except StopIteration as stop:
+            return stop.value
+        try:
+            result, send = (yield call), flow.send
+        except Exception as e:
+            result, send = e, flow.throw
+        if isinstance(call, AdbCall):
+            seen["timeout_sec"] = getattr(result, "timeout_sec", None)
+
+def drive(flow: Flow, adb: Callable, adb_bytes: Optional[Callable] = None, serial: Optional[str] = None) -> Any:
+    """Run a flow to completion with blocking ADB functions"""
+    send, result = flow.send, None
+    while True:
+        try:
+            call = send(result)
+        except StopIteration as stop:
+            return stop.value
+        try:
+            if isinstance(call, Sleep):
+                result, send = time.sleep(max(0.0, call.seconds)), flow.send
+            elif call.binary:
+                result, send = adb_bytes(call.args, timeout_sec=call.timeout_sec, serial=serial, into=call.into), flow.send
+            else:
+                result, send = adb(call.args, timeout_sec=call.timeout_sec, serial=serial), flow.send
+        except Exception as e:
+            # Surface the failure inside the flow so its own error handling applies
+            result, send = e, flow.throw
+
+async def drive_async(flow: Flow, adb: Callable, adb_bytes: Optional[Callable] = None, serial: Optional[str] = None) -> Any:
+    """Run a flow to completion with coroutine ADB functions"""
+    send, result = flow.send, None
+    while True:
+        try:
+            call = send(result)
+        except StopIteration as stop:
+            return stop.value
+        try:
+            if isinstance(call, Sleep):
+                result, send = await asyncio.sleep(max(0.0, call.seconds)), flow.send
+            elif call.binary:
+                result, send = await adb_bytes(call.args, timeout_sec=call.timeout_sec, serial=serial, into=call.into), flow.send
+            else:
+                result, send = await adb(call.args, timeout_sec=call.timeout_sec, serial=serial), flow.send
+        except Exception as e:
+            result, send = e, flow.throw
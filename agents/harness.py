@@ -1,29 +1,51 @@
-import time
-from typing import Dict, Any
+import os, time, asyncio
+from typing import Dict, Any, Optional, Tuple
 from agents.prompt_to_task import plan_from_prompt
 from agents.executor import run_task
+from agents.async_executor import run_task_async
+from agents.retry import RetryPolicy, classify
+from observability.metrics import metrics
 
-def run_episode(prompt: str, max_retries: int = 1) -> Dict[str, Any]:
-    task, params = plan_from_prompt(prompt)
-    attempt = 0
-    first_ok = False
-    details = ""
-    total_latency = 0.0
-    res = {}
+def _observe_attempt(task: str, serial: Optional[str], res: Dict[str, Any], log: list) -> str:
+    """Record one attempt's latency and outcome (metrics and the episode's attempt log); returns its failure class"""
+    kind = classify(res)
+    device = serial or os.getenv("ANDROID_SERIAL") or "default"
+    metrics.observe("task_seconds", res["latency_sec"], task=task, device=device)
+    metrics.inc("task_attempts_total", task=task, outcome=kind)
+    log.append({"latency_sec": res["latency_sec"], "success": res["success"],
+                "failure_kind": None if res["success"] else kind, "exit_code": res.get("exit_code"),
+                "device": device})
+    return kind
 
-    while attempt <= max_retries:
-        res = run_task(task, params)
-        total_latency += res["latency_sec"]
-        details = res.get("details", "")
-        if res["success"]:
-            first_ok = (attempt == 0)
-            break
-        attempt += 1
-        time.sleep(0.5)
+def _sequence_attempt(params: Dict[str, Any], res: Dict[str, Any], steps: Dict[int, Dict[str, Any]],
+                      log: list) -> Dict[str, Any]:
+    """Fold a sequence attempt's per-step results into the episode's (latest outcome
+    per step) and return the params for a retry, which resumes at the failed step"""
+    log[-1]["start_step"] = params.get("start", 0)
+    for st in res.get("steps", ()):
+        prev = steps.get(st["step"])
+        steps[st["step"]] = {**st, "attempts": prev["attempts"] + 1 if prev else 1}
+    if res.get("failed_step") is None:
+        return params
+    return {**params, "start": res["failed_step"]}
 
+def _add_phases(total: Dict[str, float], res: Dict[str, Any]):
+    for k, v in res.get("phases", {}).items():
+        total[k] = round(total.get(k, 0.0) + v, 3)
+
+def _episode_record(task: str, params: Dict[str, Any], res: Dict[str, Any], attempt: int,
+                    first_ok: bool, total_latency: float, details: str,
+                    phases: Dict[str, float], log: list,
+                    steps: Optional[Dict[int, Dict[str, Any]]] = None) -> Dict[str, Any]:
     success = res.get("success", False)
     flaky = int(success and not first_ok)
-    return {
+    metrics.observe("episode_seconds", total_latency, task=task)
+    metrics.inc("episodes_total", task=task, success=str(success).lower())
+    if attempt:
+        metrics.inc("retries_total", attempt, task=task)
+    if flaky:
+        metrics.inc("flaky_episodes_total", task=task)
+    rec = {
         "task": task,
         "params": params,
         "success": success,
@@ -31,4 +53,141 @@ def run_episode(prompt: str, max_retries: int = 1) -> Dict[str, Any]:
         "attempts": attempt + 1,
         "flaky": flaky,
         "details": details[-400:],
+        "phases": phases,
+        "failure_kind": None if success else classify(res),
+        "attempt_log": log,
     }
+    if task == "sequence":
+        rec["steps"] = [steps[i] for i in sorted(steps or {})]
+        rec["failed_step"] = res.get("failed_step")
+    return rec
+
+def trace_steps(tracer, rec: Dict[str, Any], **attrs):
+    """One "episode.step" span per step of a multi-step episode (outcome, timing, attempts, batch)"""
+    for st in rec.get("steps", ()):
+        with tracer.span("episode.step", episode=rec.get("episode"), **attrs,
+                         **{k: v for k, v in st.items() if k != "details"}):
+            pass
+
+def run_episode(prompt: str, max_retries: int = 1, serial: Optional[str] = None,
+                plan: Optional[Tuple[str, Dict[str, Any]]] = None,
+                policy: Optional[RetryPolicy] = None) -> Dict[str, Any]:
+    """Run one episode, retrying failed attempts as the retry policy allows.
+
+    Pass one RetryPolicy per run so retry budgets are shared across episodes.
+    A multi-step plan ("sequence") retries from its failed step, not from the start.
+    """
+    # A pre-validated plan (batch mode) skips planning
+    task, params = plan or plan_from_prompt(prompt)
+    policy = policy or RetryPolicy(max_retries)
+    policy.start(task)
+    attempt = 0
+    first_ok = False
+    total_latency = 0.0
+    phases = {"retry_sleep_sec": 0.0}
+    log = []
+    steps, run_params = {}, params
+
+    while True:
+        res = run_task(task, run_params, serial)
+        total_latency += res["latency_sec"]
+        _add_phases(phases, res)
+        kind = _observe_attempt(task, serial, res, log)
+        if task == "sequence":
+            run_params = _sequence_attempt(run_params, res, steps, log)
+        if res["success"]:
+            policy.observe(task, res["latency_sec"])
+            first_ok = (attempt == 0)
+            break
+        if not policy.should_retry(task, attempt, kind):
+            break
+        delay = policy.backoff(attempt)
+        time.sleep(delay)
+        phases["retry_sleep_sec"] = round(phases["retry_sleep_sec"] + delay, 3)
+        attempt += 1
+
+    return _episode_record(task, params, res, attempt, first_ok, total_latency, res.get("details", ""), phases, log,
+                           steps)
+
+async def _run_hedged(task: str, params: Dict[str, Any], serial: Optional[str],
+                      policy: RetryPolicy, pool) -> Tuple[Dict[str, Any], Optional[str]]:
+    """One attempt; if still running after policy.hedge_delay() and `pool` lends an
+    idle device, race a duplicate there. Returns (result, serial it ran on)."""
+    primary = asyncio.ensure_future(run_task_async(task, params, serial))
+    done, _ = await asyncio.wait({primary}, timeout=policy.hedge_delay(task))
+    backup = None if done else pool.borrow()
+    if backup is None:
+        return await primary, serial
+    secondary = asyncio.ensure_future(run_task_async(task, params, backup))
+    pending = {primary, secondary}
+    try:
+        while True:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            winner = next((t for t in done if t.result()["success"]), None)
+            if winner is None and pending:
+                continue
+            winner = winner or primary
+            won = winner is secondary and winner.result()["success"]
+            policy.record_hedge(won)
+            metrics.inc("hedged_attempts_total", task=task, won=str(won).lower())
+            return winner.result(), backup if won else serial
+    finally:
+        # The loser is cancelled and awaited before the device goes back: its adb child
+        # is killed, or its in-flight socket command allowed to return
+        for t in pending:
+            t.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        pool.release(backup)
+
+async def run_episode_async(prompt: str, max_retries: int = 1, serial: Optional[str] = None,
+                            plan: Optional[Tuple[str, Dict[str, Any]]] = None,
+                            policy: Optional[RetryPolicy] = None, pool=None) -> Dict[str, Any]:
+    """run_episode for the asyncio engine: retry delays don't block the loop.
+
+    With policy.hedge and a `pool` (borrow() -> idle serial or None, release(serial)),
+    slow attempts are hedged onto a second device.
+    """
+    # A pre-validated plan (batch mode) skips planning
+    task, params = plan or plan_from_prompt(prompt)
+    policy = policy or RetryPolicy(max_retries)
+    policy.start(task)
+    attempt = 0
+    first_ok = False
+    total_latency = 0.0
+    phases = {"retry_sleep_sec": 0.0}
+    log = []
+    hedge_wins, hedge_device = 0, None
+    steps, run_params = {}, params
+
+    while True:
+        # A sequence resuming mid-way depends on this device's screen state, so it isn't hedged
+        if policy.hedge and pool is not None and not run_params.get("start"):
+            res, ran_on = await _run_hedged(task, run_params, serial, policy, pool)
+            hedge_wins += ran_on != serial
+        else:
+            res, ran_on = await run_task_async(task, run_params, serial), serial
+        hedge_device = ran_on if ran_on != serial else None
+        total_latency += res["latency_sec"]
+        _add_phases(phases, res)
+        kind = _observe_attempt(task, ran_on, res, log)
+        if task == "sequence":
+            run_params = _sequence_attempt(run_params, res, steps, log)
+        if res["success"]:
+            policy.observe(task, res["latency_sec"])
+            first_ok = (attempt == 0)
+            break
+        if not policy.should_retry(task, attempt, kind):
+            break
+        delay = policy.backoff(attempt)
+        await asyncio.sleep(delay)
+        phases["retry_sleep_sec"] = round(phases["retry_sleep_sec"] + delay, 3)
+        attempt += 1
+
+    rec = _episode_record(task, params, res, attempt, first_ok, total_latency, res.get("details", ""), phases, log,
+                          steps)
+    if hedge_wins:
+        rec["hedge_wins"] = hedge_wins
+    if hedge_device is not None:
+        # The final result came from the borrowed device, not the episode's own
+        rec["hedge_device"] = hedge_device
+    return rec
@@ -0,0 +1,149 @@
+import os, time, threading
+from typing import Callable, Dict, Any, Optional
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+class CircuitBreaker:
+    """Closed -> open after `failure_threshold` consecutive failures; open -> half-open
+    once `reset_timeout_sec` has passed, letting exactly one trial through; half-open ->
+    closed on success, open on failure. Whoever is allowed the trial must record() its outcome."""
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout_sec: float = 30.0,
+                 on_transition: Optional[Callable[[str, str], None]] = None):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_sec = reset_timeout_sec
+        self.on_transition = on_transition
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def _to(self, state: str):
+        prev, self.state = self.state, state
+        if state == OPEN:
+            self.opened_at = time.monotonic()
+        if self.on_transition and prev != state:
+            self.on_transition(prev, state)
+
+    def allow(self) -> bool:
+        """May work be sent to the device right now?"""
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout_sec:
+                    return False
+                self._to(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self._trial_in_flight:
+                    return False
+                self._trial_in_flight = True
+            return True
+
+    def record(self, ok: bool):
+        with self._lock:
+            self._trial_in_flight = False
+            if ok:
+                self.failures = 0
+                if self.state != CLOSED:
+                    self._to(CLOSED)
+                return
+            self.failures += 1
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+                self._to(OPEN)
+
+class DeviceHealthMonitor:
+    """Background prober keeping the last-known health of one device"""
+
+    def __init__(self, serial: Optional[str], probe: Callable[[Optional[str]], bool],
+                 interval_sec: float, breaker: CircuitBreaker):
+        self.serial = serial
+        self.probe = probe
+        self.interval_sec = interval_sec
+        self.breaker = breaker
+        self.healthy: Optional[bool] = None
+        self.checked_at = 0.0
+        self.probes = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name=f"health-{self.serial}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def record(self, ok: bool):
+        self.healthy = ok
+        self.checked_at = time.monotonic()
+        self.breaker.record(ok)
+
+    def fresh(self) -> bool:
+        """Is the cached status recent enough to trust instead of probing inline?"""
+        return self.healthy is not None and time.monotonic() - self.checked_at < 3 * self.interval_sec
+
+    def _loop(self):
+        while True:
+            # While open, only probe once per reset window: that probe is the half-open trial
+            wait = self.breaker.reset_timeout_sec if self.breaker.state == OPEN else self.interval_sec
+            if self._stop.wait(wait):
+                return
+            if not self.breaker.allow():
+                continue
+            self.probes += 1
+            try:
+                ok = self.probe(self.serial)
+            except Exception:
+                ok = False
+            self.record(ok)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "healthy": self.healthy,
+            "age_sec": round(time.monotonic() - self.checked_at, 3) if self.checked_at else None,
+            "breaker": self.breaker.state,
+            "probes": self.probes,
+        }
+
+class HealthRegistry:
+    """One monitor per device, started on first use (HEALTH_MONITOR=0 disables)"""
+
+    def __init__(self, probe: Callable[[Optional[str]], bool]):
+        self.probe = probe
+        self.tracer = None  # set by the runner so breaker transitions land in the trace
+        self._monitors: Dict[str, DeviceHealthMonitor] = {}
+        self._lock = threading.Lock()
+
+    def enabled(self) -> bool:
+        return os.getenv("HEALTH_MONITOR", "1") == "1"
+
+    def get(self, serial: Optional[str]) -> Optional[DeviceHealthMonitor]:
+        if not self.enabled():
+            return None
+        key = serial or ""
+        with self._lock:
+            mon = self._monitors.get(key)
+            if mon is None:
+                breaker = CircuitBreaker(int(os.getenv("BREAKER_FAILURES", "3")),
+                                         float(os.getenv("BREAKER_RESET_SEC", "30")),
+                                         on_transition=lambda prev, new, s=serial: self._emit(s, prev, new))
+                mon = self._monitors[key] = DeviceHealthMonitor(
+                    serial, self.probe, float(os.getenv("HEALTH_PROBE_INTERVAL_SEC", "5")), breaker)
+                mon.start()
+            return mon
+
+    def _emit(self, serial: Optional[str], prev: str, new: str):
+        print(f"[health] {serial or 'default'}: breaker {prev} -> {new}")
+        if self.tracer is not None:
+            with self.tracer.span("device.breaker", device=serial, from_state=prev, to_state=new):
+                pass
+
+    def stop_all(self):
+        with self._lock:
+            for mon in self._monitors.values():
+                mon.stop()
+            self._monitors.clear()
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {k or "default": m.status() for k, m in self._monitors.items()}
@@ -0,0 +1,237 @@
+import os, re, threading, time
+from typing import Any, Callable, Dict, List, Optional
+from observability.metrics import metrics
+
+# Sections of one sample's output are separated by this marker
+_SEP = "__qg_perf"
+FOCUS_QUERY = "dumpsys window | grep -E 'mCurrentFocus='"
+_FOCUS_RE = re.compile(r"mCurrentFocus=Window\{\S+ \S+ ([\w.]+)/")
+_FRAMES_RE = re.compile(r"Total frames rendered: (\d+)")
+_JANKY_RE = re.compile(r"Janky frames: (\d+)")
+_P90_RE = re.compile(r"90th percentile: (\d+)ms")
+_PSS_RE = re.compile(r"TOTAL(?: PSS:)?\s+(\d+)")
+_LAUNCH_RE = re.compile(r"^(Status|LaunchState|Activity|TotalTime|WaitTime): (\S+)", re.M)
+
+def sample_query(package: Optional[str]) -> str:
+    """One round trip: the focused window, then `package`'s frame stats since the
+    last sample (gfxinfo is reset after reading), its PSS and its CPU"""
+    if not package:
+        return FOCUS_QUERY
+    return f"; echo {_SEP}; ".join([
+        FOCUS_QUERY,
+        f"dumpsys gfxinfo {package} reset | grep -E 'Total frames rendered|Janky frames|90th percentile'",
+        f"dumpsys meminfo {package} | grep -E 'TOTAL'",
+        f"top -b -n 1 -q -o PID,%CPU,ARGS | grep -F {package}",
+    ])
+
+def _int(rx: re.Pattern, text: str) -> Optional[int]:
+    m = rx.search(text)
+    return int(m.group(1)) if m else None
+
+def parse_sample(out: str, package: Optional[str]) -> Dict[str, Any]:
+    """sample_query output -> {"focus", "frames", "janky", "p90_ms", "pss_kb", "cpu_pct"} (None where absent)"""
+    focus, gfx, mem, top = (out.split(_SEP) + ["", "", ""])[:4]
+    m = _FOCUS_RE.search(focus)
+    cpu = None
+    for line in top.splitlines():
+        cols = line.split()
+        # PID %CPU ARGS; the app's other processes are "<package>:<name>"
+        if len(cols) >= 3 and package and (cols[2] == package or cols[2].startswith(package + ":")):
+            try:
+                cpu = (cpu or 0.0) + float(cols[1])
+            except ValueError:
+                pass
+    return {"focus": m.group(1) if m else None, "frames": _int(_FRAMES_RE, gfx), "janky": _int(_JANKY_RE, gfx),
+            "p90_ms": _int(_P90_RE, gfx), "pss_kb": _int(_PSS_RE, mem),
+            "cpu_pct": round(cpu, 1) if cpu is not None else None}
+
+def parse_launch(out: str) -> Optional[Dict[str, Any]]:
+    """`am start -W` output -> {"package", "activity", "state", "total_ms", "wait_ms"}, None without TotalTime"""
+    f = dict(_LAUNCH_RE.findall(out or ""))
+    if not f.get("TotalTime", "").isdigit():
+        return None
+    activity = f.get("Activity", "")
+    return {"package": activity.split("/")[0] or None, "activity": activity or None,
+            "state": f.get("LaunchState"), "total_ms": int(f["TotalTime"]),
+            "wait_ms": int(f["WaitTime"]) if f.get("WaitTime", "").isdigit() else None}
+
+class PerfSession:
+    """Device metrics for one episode, sampled on a background thread every
+    PerfSampler.interval_sec until stop()"""
+
+    def __init__(self, sampler: "PerfSampler", serial: Optional[str], device: str,
+                 episode: Optional[int], tracer=None):
+        self.sampler = sampler
+        self.serial = serial
+        self.device = device
+        self.episode = episode
+        self.tracer = tracer
+        self.package = sampler.focus(device)
+        self.samples = 0
+        self.failed = 0
+        self.sample_sec = 0.0
+        self.packages: Dict[str, Dict[str, Any]] = {}
+        self.launches: List[Dict[str, Any]] = []
+        self._seen = set()   # packages whose gfxinfo has been reset in this session
+        self._cold = set()   # cold-launched in this session: frame counters start inside it
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._kick = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name=f"perf-{device}", daemon=True)
+
+    def start(self) -> "PerfSession":
+        self._thread.start()
+        return self
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self.sample()
+            self._kick.wait(self.sampler.interval_sec)
+            self._kick.clear()
+
+    def sample(self):
+        """One round trip; frame counts are deltas since the previous sample of the same package"""
+        package = self.package
+        t = time.perf_counter()
+        try:
+            code, out = self.sampler.adb(["shell", sample_query(package)], 10.0, self.serial)
+        except Exception as e:
+            code, out = 1, f"ERROR: {e}"
+        seconds = time.perf_counter() - t
+        metrics.observe("perf_sample_seconds", seconds, device=self.device)
+        s = parse_sample(out or "", package)
+        # grep exits 1 when the app has no process (no meminfo/top line): still a sample
+        if code not in (0, 1) or (s["focus"] is None and _SEP not in (out or "")):
+            self.failed += 1
+            return
+        with self._lock:
+            self.samples += 1
+            self.sample_sec += seconds
+            if package:
+                # The first read of a package is only the reset point, unless it was
+                # cold-launched in this episode (its counters started with the process)
+                baseline = package not in self._seen and package not in self._cold
+                self._seen.add(package)
+                p = self.packages.setdefault(package, {"frames": 0, "janky_frames": 0, "frame_p90_ms": None,
+                                                       "peak_pss_kb": None, "peak_cpu_pct": None})
+                if not baseline and s["frames"] is not None:
+                    p["frames"] += s["frames"]
+                    p["janky_frames"] += s["janky"] or 0
+                    if s["frames"] and s["p90_ms"] is not None:
+                        p["frame_p90_ms"] = max(p["frame_p90_ms"] or 0, s["p90_ms"])
+                for key, val in (("peak_pss_kb", s["pss_kb"]), ("peak_cpu_pct", s["cpu_pct"])):
+                    if val is not None:
+                        p[key] = max(p[key] or 0, val)
+            if s["focus"]:
+                self.package = s["focus"]
+                self.sampler.set_focus(self.device, s["focus"])
+        if self.tracer is not None:
+            attrs = {k: v for k, v in s.items() if k != "focus" and v is not None}
+            with self.tracer.span("perf.sample", episode=self.episode, device=self.device, package=package,
+                                  focus=s["focus"], sample_ms=round(seconds * 1000, 1), **attrs):
+                pass
+
+    def add_launch(self, launch: Dict[str, Any]):
+        """An `am start -W` on this device finished: attribute it, and sample the new app right away"""
+        with self._lock:
+            self.launches.append(launch)
+            if launch["package"]:
+                self.package = launch["package"]
+                if launch["state"] == "COLD":
+                    self._cold.add(launch["package"])
+        if self.tracer is not None:
+            with self.tracer.span("perf.launch", episode=self.episode, device=self.device, **launch):
+                pass
+        self._kick.set()
+
+    def stop(self) -> Dict[str, Any]:
+        """Stop sampling (after one last sample) and return the episode's summary"""
+        self._stop.set()
+        self._kick.set()
+        self._thread.join()
+        self.sample()
+        self.sampler.finish(self)
+        summary = self.summary()
+        if self.tracer is not None:
+            with self.tracer.span("perf.episode", episode=self.episode, device=self.device,
+                                  **{k: v for k, v in summary.items() if k not in ("packages", "launches")}):
+                pass
+        return summary
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            frames = sum(p["frames"] for p in self.packages.values())
+            janky = sum(p["janky_frames"] for p in self.packages.values())
+            packages = {k: {**p, "jank_pct": round(100 * p["janky_frames"] / p["frames"], 2) if p["frames"] else None}
+                        for k, p in self.packages.items()}
+            pss = [p["peak_pss_kb"] for p in packages.values() if p["peak_pss_kb"] is not None]
+            cpu = [p["peak_cpu_pct"] for p in packages.values() if p["peak_cpu_pct"] is not None]
+            return {
+                "samples": self.samples,
+                "failed_samples": self.failed,
+                "sample_ms": round(1000 * self.sample_sec / self.samples, 1) if self.samples else None,
+                "frames": frames,
+                "janky_frames": janky,
+                "jank_pct": round(100 * janky / frames, 2) if frames else None,
+                "peak_pss_kb": max(pss) if pss else None,
+                "peak_cpu_pct": max(cpu) if cpu else None,
+                "launch_total_ms": max((l["total_ms"] for l in self.launches), default=None),
+                "launches": list(self.launches),
+                "packages": packages,
+            }
+
+class PerfSampler:
+    """Optional device-side performance sampling alongside episodes.
+
+    While an episode runs, a PerfSession samples the device every
+    PERF_SAMPLE_INTERVAL_SEC in one round trip (focused app, `dumpsys gfxinfo`
+    frame/jank counts since the previous sample, `dumpsys meminfo` PSS, `top`
+    CPU) over its own shell channel, so the episode's commands never wait
+    behind it. With the sampler on, open_app/open_url launch with `am start -W`
+    and report TotalTime. Samples and launches go to the trace as spans; the
+    episode record gets a summary under "perf". Off unless PERF_SAMPLER=1
+    (or the runners' --perf).
+    """
+
+    def __init__(self, adb: Callable, enabled: Optional[bool] = None, interval_sec: Optional[float] = None):
+        self.adb = adb
+        self.enabled = enabled if enabled is not None else os.getenv("PERF_SAMPLER", "0") == "1"
+        self.interval_sec = interval_sec if interval_sec is not None else float(os.getenv("PERF_SAMPLE_INTERVAL_SEC", "2"))
+        self._active: Dict[str, PerfSession] = {}
+        self._focus: Dict[str, str] = {}  # last focused package per device, carried across episodes
+        self._lock = threading.Lock()
+
+    def start(self, serial: Optional[str], episode: Optional[int] = None, tracer=None) -> Optional[PerfSession]:
+        """Begin sampling for an episode on `serial` (None while the sampler is off)"""
+        if not self.enabled:
+            return None
+        device = serial or os.getenv("ANDROID_SERIAL") or "default"
+        session = PerfSession(self, serial, device, episode, tracer)
+        with self._lock:
+            self._active[device] = session
+        return session.start()
+
+    def finish(self, session: PerfSession):
+        with self._lock:
+            if self._active.get(session.device) is session:
+                del self._active[session.device]
+
+    def focus(self, device: str) -> Optional[str]:
+        with self._lock:
+            return self._focus.get(device)
+
+    def set_focus(self, device: str, package: str):
+        with self._lock:
+            self._focus[device] = package
+
+    def record_launch(self, device: str, out: str) -> Optional[Dict[str, Any]]:
+        """Parse an `am start -W` result; record its TotalTime and attribute it to the device's episode"""
+        launch = parse_launch(out)
+        if launch is None:
+            return None
+        metrics.observe("app_launch_seconds", launch["total_ms"] / 1000, package=launch["package"] or "unknown")
+        with self._lock:
+            session = self._active.get(device)
+        if session is not None:
+            session.add_launch(launch)
+        return launch
@@ -1,69 +1,281 @@
-from typing import Dict, Any, Tuple
-import re
+from functools import lru_cache
+from typing import Dict, Any, Iterator, Optional, Tuple
+import copy, json, os, re
 
 DEFAULT_TASK = ("browser_search", {"query": "qualgent test"})
 
-def plan_from_prompt(prompt: str) -> Tuple[str, Dict[str, Any]]:
-    p = (prompt or "").lower()
-    if "search" in p or "browse" in p or "google" in p:
-        parts = p.split("search for ")
-        query = parts[1].strip() if len(parts) > 1 else "qualgent test"
-        return ("browser_search", {"query": query[:100]})
-    if "open settings" in p:
-        return ("open_settings", {})
-    if "scroll" in p:
-        # e.g., "scroll down 3 times"
-        count = 2
-        for tok in p.split():
-            if tok.isdigit():
-                count = max(1, min(10, int(tok)))
-                break
-        return ("scroll", {"direction": "down", "count": count})
-    if "screenshot" in p:
-        return ("screenshot", {"filename": "shot_1.png"})
-
-    # Open a specific app/activity: "open app com.foo/.MainActivity"
-    if p.startswith("open app "):
-        rest = prompt.split(" ", 2)[2].strip()
-        pkg = rest
-        activity = ""
-        if "/" in rest:
-            pkg, activity = rest.split("/", 1)
-        return ("open_app", {"package": pkg.strip(), "activity": activity.strip()})
-
-    # Open a URL directly: "open url https://example.com"
-    if p.startswith("open url "):
-        url = prompt.split(" ", 2)[2].strip()
-        return ("open_url", {"url": url[:2048]})
-
-    # Tap coordinates: "tap 500 600"
-    m = re.match(r".*tap\s+(\d{2,4})\s+(\d{2,4}).*", p)
-    if m:
-        return ("tap", {"x": int(m.group(1)), "y": int(m.group(2))})
-
-    # Swipe: "swipe 500 1600 500 600"
-    m = re.match(r".*swipe\s+(\d{2,4})\s+(\d{2,4})\s+(\d{2,4})\s+(\d{2,4}).*", p)
-    if m:
-        return ("swipe", {"x1": int(m.group(1)), "y1": int(m.group(2)), "x2": int(m.group(3)), "y2": int(m.group(4))})
-
-    # Type text: "type hello world"
-    if p.startswith("type "):
-        text = prompt.split(" ", 1)[1]
-        return ("type_text", {"text": text[:200]})
+# Everything executor.task_flow knows how to run
+TASKS = ("browser_search", "open_settings", "scroll", "screenshot", "open_app", "open_url", "tap", "swipe",
+         "type_text", "nav_home", "nav_back", "nav_recents", "open_notifications", "wifi", "sequence")
 
-    # Navigation: home/back/recents/notifications
-    if "go home" in p or p.strip() == "home":
-        return ("nav_home", {})
-    if "back" in p:
-        return ("nav_back", {})
-    if "recents" in p:
-        return ("nav_recents", {})
-    if "notifications" in p:
-        return ("open_notifications", {})
+MAX_STEPS = int(os.getenv("PLAN_MAX_STEPS", "20"))
+MAX_TEXT = int(os.getenv("PLAN_MAX_TEXT_CHARS", "10000"))  # type_text length limit
+
+_FIRST_NUMBER = re.compile(r"(?<!\S)\d+(?!\S)")  # first all-digit token
+
+def _first_number(p: str) -> Optional[int]:
+    m = _FIRST_NUMBER.search(p)
+    return int(m.group()) if m else None
+
+def _search(p: str, prompt: str, m) -> Tuple[str, Dict[str, Any]]:
+    parts = p.split("search for ")
+    query = parts[1].strip() if len(parts) > 1 else "qualgent test"
+    return ("browser_search", {"query": query[:100]})
+
+def _scroll(p: str, prompt: str, m) -> Tuple[str, Dict[str, Any]]:
+    # e.g., "scroll down 3 times"
+    n = _first_number(p)
+    return ("scroll", {"direction": "down", "count": 2 if n is None else max(1, min(10, n))})
+
+# A burst count only next to an explicit word: "5 screenshots", "screenshot x3"
+# (not "screenshot of page 2")
+_SHOT_COUNT = re.compile(r"(?<!\S)(\d+)\s+(?:screenshots?|shots?|frames?)\b|(?<!\S)x\s*(\d+)(?!\S)")
+
+def _screenshot(p: str, prompt: str, m) -> Tuple[str, Dict[str, Any]]:
+    # e.g., "take 5 screenshots" -> burst of 5 frames
+    params = {"filename": "shot_1.png"}
+    n = _SHOT_COUNT.search(p)
+    if n:
+        params["count"] = max(1, min(50, int(n.group(1) or n.group(2))))
+    return ("screenshot", params)
+
+def _open_app(p: str, prompt: str, m) -> Tuple[str, Dict[str, Any]]:
+    # "open app com.foo/.MainActivity"
+    rest = prompt.split(" ", 2)[2].strip()
+    pkg, _, activity = rest.partition("/")
+    return ("open_app", {"package": pkg.strip(), "activity": activity.strip()})
+
+def _open_url(p: str, prompt: str, m) -> Tuple[str, Dict[str, Any]]:
+    # "open url https://example.com"
+    return ("open_url", {"url": prompt.split(" ", 2)[2].strip()[:2048]})
+
+def _tap(p: str, prompt: str, m) -> Tuple[str, Dict[str, Any]]:
+    # "tap 500 600"
+    return ("tap", {"x": int(m.group(1)), "y": int(m.group(2))})
+
+# "tap back", "press the home button": the navigation keys, not an element labelled "Back"
+_KEY_TAP = re.compile(r"^(?:tap|press)\s+(?:on\s+)?(?:the\s+)?(back|home|recents)(?:\s+(?:button|key))?\s*$")
+_KEY_TASKS = {"back": "nav_back", "home": "nav_home", "recents": "nav_recents"}
+
+def _key(p: str, prompt: str, m) -> Tuple[str, Dict[str, Any]]:
+    return (_KEY_TASKS[m.group(1)], {})
+
+# "tap Wi-Fi", 'tap on "Network & internet"', "tap id search", "tap desc Navigate up"
+_ELEMENT = r"(?:(id|desc|text)[:\s]\s*)?[\"']?(.+?)[\"']?\s*$"
+_TAP_XY = re.compile(r"tap\s+\d")
+_TAP_ELEMENT = re.compile(r"^tap\s+(?:on\s+)?(?:the\s+)?" + _ELEMENT, re.I)
+_TYPE_INTO = re.compile(r"^type\s+\"(.*)\"\s+into\s+(?:the\s+)?" + _ELEMENT, re.I)
+
+def _tap_element(p: str, prompt: str, m) -> Tuple[str, Dict[str, Any]]:
+    m = _TAP_ELEMENT.match(prompt.strip())
+    return ("tap", {(m.group(1) or "text").lower(): m.group(2)[:200]})
+
+def _swipe(p: str, prompt: str, m) -> Tuple[str, Dict[str, Any]]:
+    # "swipe 500 1600 500 600"
+    x1, y1, x2, y2 = map(int, m.groups())
+    return ("swipe", {"x1": x1, "y1": y1, "x2": x2, "y2": y2})
+
+def _type_text(p: str, prompt: str, m) -> Tuple[str, Dict[str, Any]]:
+    # "type hello world", 'type "hello" into Search' (taps the field first)
+    into = _TYPE_INTO.match(prompt.strip())
+    if into:
+        return ("type_text", {"text": into.group(1)[:MAX_TEXT], "into": {(into.group(2) or "text").lower(): into.group(3)[:200]}})
+    return ("type_text", {"text": prompt.split(" ", 1)[1][:MAX_TEXT]})
+
+def _const(task: str, **params):
+    return lambda p, prompt, m: (task, dict(params))
+
+def _has(word: str):
+    return lambda p: word in p
 
+def _find(keyword: str, pattern: str):
+    """Regex search, skipped (cheaply) unless the keyword is present"""
+    rx = re.compile(pattern)
+    return lambda p: keyword in p and rx.search(p)
+
+# Keyword dispatch table, built once: plain substring tests where a keyword is
+# enough, precompiled regexes where arguments are parsed. The first matching
+# rule wins, so order is priority (anything mentioning "search" is a search,
+# unless it is an element tap or typing into a field, which name their target;
+# a tap on a key name is that key, before it can be read as an element).
+_RULES = [
+    (lambda p: _KEY_TAP.match(p.strip()), _key),
+    (lambda p: p.startswith("tap ") and not _TAP_XY.match(p) and _TAP_ELEMENT.match(p), _tap_element),
+    (lambda p: p.startswith('type "') and _TYPE_INTO.match(p), _type_text),
+    (lambda p: "search" in p or "browse" in p or "google" in p, _search),
+    (_has("open settings"), _const("open_settings")),
+    (_has("scroll"), _scroll),
+    (_has("screenshot"), _screenshot),
+    (lambda p: p.startswith("open app "), _open_app),
+    (lambda p: p.startswith("open url "), _open_url),
+    (_find("tap", r"tap\s+(\d{2,4})\s+(\d{2,4})"), _tap),
+    (_find("swipe", r"swipe\s+(\d{2,4})\s+(\d{2,4})\s+(\d{2,4})\s+(\d{2,4})"), _swipe),
+    (lambda p: p.startswith("type "), _type_text),
+    # Navigation: home/back/recents/notifications
+    (lambda p: "go home" in p or p.strip() == "home", _const("nav_home")),
+    (_has("back"), _const("nav_back")),
+    (_has("recents"), _const("nav_recents")),
+    (_has("notifications"), _const("open_notifications")),
     # Wifi on/off
-    if "wifi on" in p or "enable wifi" in p:
-        return ("wifi", {"enabled": True})
-    if "wifi off" in p or "disable wifi" in p:
-        return ("wifi", {"enabled": False})
-    return DEFAULT_TASK
+    (lambda p: "wifi on" in p or "enable wifi" in p, _const("wifi", enabled=True)),
+    (lambda p: "wifi off" in p or "disable wifi" in p, _const("wifi", enabled=False)),
+]
+
+# Step separators in multi-step prompts: "open settings; scroll 3 times, then screenshot".
+# Only explicit ones: a bare comma is as likely part of a URL, a query or typed text
+_STEP_SEP = re.compile(r"\s*(?:;|,?\s+and then\s+|,?\s+then\s+)\s*", re.I)
+
+def _plan_one(prompt: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+    p = prompt.lower()
+    for match, build in _RULES:
+        m = match(p)
+        if m:
+            return build(p, prompt, m)
+    return None
+
+@lru_cache(maxsize=int(os.getenv("PLANNER_CACHE_SIZE", "4096")))
+def _plan(prompt: str) -> Tuple[str, Dict[str, Any]]:
+    # Split into steps only if every part plans on its own, so a separator inside a
+    # search query or typed text ("type this; that") keeps the prompt whole
+    parts = [s for s in _STEP_SEP.split(prompt.strip()) if s]
+    if 1 < len(parts) <= MAX_STEPS:
+        steps = [_plan_one(s) for s in parts]
+        if all(steps):
+            return ("sequence", {"steps": [{"task": t, "params": p} for t, p in steps]})
+    return _plan_one(prompt.strip()) or DEFAULT_TASK
+
+def plan_from_prompt(prompt: str) -> Tuple[str, Dict[str, Any]]:
+    """Map a prompt to (task, params); memoized, callers get their own params dict.
+
+    A prompt naming several actions, separated by ";", "then" or "and then"
+    ("open settings; scroll 3 times, then screenshot"), plans to ("sequence", {"steps": [{"task", "params"}, ...]}),
+    which the harness runs as one pipeline.
+    """
+    task, params = _plan(prompt or "")
+    # Deep: selectors, "into" and sequence steps are nested dicts shared with the cache
+    return task, copy.deepcopy(params)
+
+def planner_cache_info():
+    return _plan.cache_info()
+
+_PACKAGE = re.compile(r"[A-Za-z][\w]*(\.[A-Za-z_][\w]*)+")
+
+def validate_plan(task: str, params: Dict[str, Any]) -> Optional[str]:
+    """Why a plan can't run (None if it can), checked before any device time is spent"""
+    if task not in TASKS:
+        return f"unknown task {task!r}"
+    if not isinstance(params, dict):
+        return "params must be an object"
+
+    def ints(*keys, lo=0, hi=10000):
+        for k in keys:
+            v = params.get(k)
+            if v is not None and (isinstance(v, bool) or not isinstance(v, int) or not lo <= v <= hi):
+                return f"{task}: {k} must be an integer in [{lo}, {hi}], got {v!r}"
+        return None
+
+    if task == "sequence":
+        steps = params.get("steps")
+        if not isinstance(steps, list) or not steps:
+            return "sequence: steps must be a non-empty list"
+        if len(steps) > MAX_STEPS:
+            return f"sequence: {len(steps)} steps exceed PLAN_MAX_STEPS ({MAX_STEPS})"
+        for i, st in enumerate(steps):
+            if not isinstance(st, dict) or st.get("task") == "sequence":
+                return f"sequence: step {i} must be a single {{task, params}} object"
+            err = validate_plan(st.get("task"), st.setdefault("params", {}))
+            if err:
+                return f"sequence: step {i}: {err}"
+        return None
+
+    def selector(sel, where):
+        keys = [k for k in ("text", "id", "desc") if k in sel]
+        if len(keys) > 1:
+            return f"{where}: give one of text, id or desc, not {keys}"
+        if keys and (not isinstance(sel[keys[0]], str) or not sel[keys[0]].strip()):
+            return f"{where}: {keys[0]} must be a non-empty string"
+        return None
+
+    if task == "tap":
+        return selector(params, "tap") or ints("x", "y") or ints("index", hi=100)
+    if task == "swipe":
+        return ints("x1", "y1", "x2", "y2")
+    if task == "scroll":
+        return ints("count", lo=1, hi=10)
+    if task == "screenshot":
+        name = str(params.get("filename", "shot_1.png"))
+        if not name or "/" in name or name.startswith("."):
+            return f"screenshot: bad filename {name!r}"
+        if params.get("format", "png") not in ("png", "webp"):
+            return "screenshot: format must be png or webp"
+        return ints("count", lo=1, hi=50) or ints("scale", lo=1, hi=16)
+    if task == "open_app":
+        pkg = params.get("package", "")
+        if not isinstance(pkg, str) or not _PACKAGE.fullmatch(pkg):
+            return f"open_app: bad package name {pkg!r}"
+    if task == "open_url":
+        url = params.get("url", "")
+        if not isinstance(url, str) or not re.match(r"[a-z][a-z0-9+.-]*://\S+$", url, re.I):
+            return f"open_url: bad url {url!r}"
+    if task == "type_text":
+        text = params.get("text", "")
+        if not isinstance(text, str) or not text.strip():
+            return "type_text: text must be a non-empty string"
+        if len(text) > MAX_TEXT:
+            return f"type_text: {len(text)} chars exceed PLAN_MAX_TEXT_CHARS ({MAX_TEXT})"
+        into = params.get("into")
+        if into is not None and (not isinstance(into, dict) or not any(k in into for k in ("text", "id", "desc"))):
+            return "type_text: into must be an element selector ({text|id|desc: ...})"
+        return selector(into or {}, "type_text.into")
+    if task == "browser_search" and not str(params.get("query", "")).strip():
+        return "browser_search: empty query"
+    return None
+
+def _step(item: Any) -> Any:
+    """One entry of a request's "steps": a prompt fragment or a {task, params} object"""
+    if isinstance(item, str):
+        task, params = plan_from_prompt(item)
+        return {"task": task, "params": params}
+    return item
+
+def plan_request(req: Any) -> Tuple[str, Optional[Tuple[str, Dict[str, Any]]], Optional[str]]:
+    """(prompt, plan, error) for one request: {"prompt": ...}, a bare string, {"task": ..., "params": {...}},
+    or {"steps": [...]} with each step a prompt or a {task, params} object"""
+    if isinstance(req, str):
+        req = {"prompt": req}
+    if not isinstance(req, dict) or not ("prompt" in req or "task" in req or "steps" in req):
+        return "", None, "expected an object with 'prompt', 'task' or 'steps'"
+    prompt = str(req.get("prompt", ""))
+    if "steps" in req:
+        steps = req["steps"]
+        plan = ("sequence", {"steps": [_step(s) for s in steps] if isinstance(steps, list) else steps})
+    elif "task" in req:
+        plan = (req["task"], req.get("params", {}))
+    else:
+        plan = plan_from_prompt(prompt)
+    err = validate_plan(*plan)
+    if err:
+        return prompt, None, err
+    return prompt or plan[0], plan, None
+
+def iter_prompt_file(path: str) -> Iterator[Tuple[int, str, Optional[Tuple[str, Dict[str, Any]]], Optional[str]]]:
+    """Stream a JSONL request file as (episode, prompt, plan, error).
+
+    Each line is {"prompt": "..."}, a bare JSON string, an explicit
+    {"task": ..., "params": {...}}, or a multi-step {"steps": [...]}. The episode number is the line's position
+    (blank lines skipped), so it is stable across --resume. Lines that can't be
+    parsed or planned come back with plan=None and the reason in error.
+    """
+    with open(path, encoding="utf-8") as f:
+        episode = -1
+        for lineno, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            episode += 1
+            try:
+                req = json.loads(line)
+            except ValueError as e:
+                yield episode, "", None, f"line {lineno}: invalid JSON ({e})"
+                continue
+            prompt, plan, err = plan_request(req)
+            yield episode, prompt, plan, (f"line {lineno}: {err}" if err else None)
@@ -0,0 +1,390 @@
+"""
+Cross-run result store: every episode of every run in one SQLite database
+(WAL mode, indexed by task, device and time), so questions like "p95 of
+browser_search on device X over the last week" are one indexed query instead
+of loading thousands of results/*.json files.
+
+Runners write to it through ResultStream (batched inserts, RESULTS_DB; empty
+disables). The per-run JSONL/JSON/CSV/HTML files are still written as exports.
+
+    python -m agents.result_store import                          # backfill results/*.json(l), load_test_*.json
+    python -m agents.result_store stats --task browser_search --device localhost:40001 --since 7d
+    python -m agents.result_store stats --by device --since 24h
+    python -m agents.result_store trend --task open_settings --bucket day --since 30d
+    python -m agents.result_store runs --since 7d
+"""
+
+import argparse, glob, itertools, json, math, os, pathlib, re, sqlite3, sys, time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+DEFAULT_DB = "results/results.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id      TEXT PRIMARY KEY,
+    kind        TEXT NOT NULL DEFAULT 'eval',
+    trace_id    TEXT,
+    started_at  REAL,
+    finished_at REAL,
+    episodes    INTEGER NOT NULL DEFAULT 0,
+    successes   INTEGER NOT NULL DEFAULT 0,
+    meta        TEXT
+);
+CREATE TABLE IF NOT EXISTS devices (
+    serial     TEXT PRIMARY KEY,
+    first_seen REAL NOT NULL,
+    last_seen  REAL NOT NULL,
+    episodes   INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS episodes (
+    id            INTEGER PRIMARY KEY,
+    run_id        TEXT NOT NULL,
+    episode       INTEGER NOT NULL,
+    ts            REAL NOT NULL,
+    task          TEXT,
+    device        TEXT,
+    success       INTEGER NOT NULL,
+    latency_sec   REAL,
+    attempts      INTEGER,
+    flaky         INTEGER NOT NULL DEFAULT 0,
+    failure_kind  TEXT,
+    wall_time_sec REAL,
+    record        TEXT,
+    UNIQUE (run_id, episode)
+);
+CREATE INDEX IF NOT EXISTS episodes_task_ts ON episodes (task, ts);
+CREATE INDEX IF NOT EXISTS episodes_device_ts ON episodes (device, ts);
+CREATE INDEX IF NOT EXISTS episodes_ts ON episodes (ts);
+CREATE TABLE IF NOT EXISTS attempts (
+    episode_id   INTEGER NOT NULL REFERENCES episodes (id),
+    n            INTEGER NOT NULL,
+    latency_sec  REAL,
+    success      INTEGER NOT NULL,
+    failure_kind TEXT,
+    exit_code    INTEGER,
+    PRIMARY KEY (episode_id, n)
+) WITHOUT ROWID;
+"""
+
+# Grouping expressions for stats(); time buckets are UTC
+GROUPS = {
+    "task": "task",
+    "device": "device",
+    "run": "run_id",
+    "failure": "COALESCE(failure_kind, 'ok')",
+    "hour": "strftime('%Y-%m-%d %H:00', ts, 'unixepoch')",
+    "day": "strftime('%Y-%m-%d', ts, 'unixepoch')",
+    "week": "strftime('%Y-W%W', ts, 'unixepoch')",
+}
+
+_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 7 * 86400}
+
+def parse_time(spec: Optional[str], now: Optional[float] = None) -> Optional[float]:
+    """Epoch seconds from a relative age (30m, 24h, 7d, 2w), a date/time (2026-10-01[T12:00]) or an epoch"""
+    if not spec:
+        return None
+    m = re.fullmatch(r"(\d+(?:\.\d+)?)([smhdw])", spec)
+    if m:
+        return (now if now is not None else time.time()) - float(m.group(1)) * _UNITS[m.group(2)]
+    try:
+        return float(spec)
+    except ValueError:
+        pass
+    for fmt in ("%Y-%m-%dT%H:%M:%S", "%Y-%m-%dT%H:%M", "%Y-%m-%d"):
+        try:
+            return time.mktime(time.strptime(spec, fmt))
+        except ValueError:
+            continue
+    raise ValueError(f"unrecognized time {spec!r} (use 7d, 24h, 2026-10-01 or an epoch)")
+
+def _percentile(sorted_vals: List[float], q: float) -> float:
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_vals:
+        return 0.0
+    return sorted_vals[max(0, math.ceil(q * len(sorted_vals)) - 1)]
+
+def _device(rec: Dict[str, Any]) -> str:
+    return rec.get("device") or os.getenv("ANDROID_SERIAL") or "default"
+
+class ResultStore:
+    """SQLite-backed episode store; add() buffers, flush() writes a batch in one transaction"""
+
+    def __init__(self, path: str = DEFAULT_DB, batch_size: Optional[int] = None, flush_sec: Optional[float] = None):
+        self.path = path
+        if path != ":memory:":
+            pathlib.Path(path).parent.mkdir(parents=True, exist_ok=True)
+        # Several runners (stress.py workers, service replicas on one volume) may write at once
+        self.db = sqlite3.connect(path, timeout=30.0, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        self.batch_size = batch_size or int(os.getenv("RESULTS_DB_BATCH", "100"))
+        self.flush_sec = flush_sec if flush_sec is not None else float(os.getenv("RESULTS_DB_FLUSH_SEC", "2"))
+        self._pending: List[Tuple[str, Dict[str, Any], float]] = []
+        self._flushed_at = time.monotonic()
+
+    # --- writing ----------------------------------------------------------
+
+    def begin_run(self, run_id: str, kind: str = "eval", trace_id: Optional[str] = None,
+                  started_at: Optional[float] = None, meta: Optional[Dict[str, Any]] = None):
+        self.db.execute("INSERT INTO runs (run_id, kind, trace_id, started_at, meta) VALUES (?, ?, ?, ?, ?) "
+                        "ON CONFLICT (run_id) DO UPDATE SET trace_id = COALESCE(excluded.trace_id, trace_id)",
+                        (run_id, kind, trace_id, started_at or time.time(), json.dumps(meta) if meta else None))
+
+    def add(self, run_id: str, rec: Dict[str, Any], ts: Optional[float] = None):
+        """Queue one episode record; written with the next batch"""
+        self._pending.append((run_id, rec, ts or time.time()))
+        if len(self._pending) >= self.batch_size or time.monotonic() - self._flushed_at >= self.flush_sec:
+            self.flush()
+
+    def flush(self) -> int:
+        """Write queued records in one transaction; returns how many were new"""
+        self._flushed_at = time.monotonic()
+        if not self._pending:
+            return 0
+        batch, self._pending = self._pending, []
+        added, seen = 0, {}
+        cur = self.db.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+        try:
+            for n, (run_id, rec, ts) in enumerate(batch):
+                device = _device(rec)
+                cur.execute(
+                    "INSERT OR IGNORE INTO episodes (run_id, episode, ts, task, device, success, latency_sec, "
+                    "attempts, flaky, failure_kind, wall_time_sec, record) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (run_id, rec.get("episode", n), ts, rec.get("task"), device, int(bool(rec.get("success"))),
+                     rec.get("latency_sec"), rec.get("attempts"), int(rec.get("flaky") or 0),
+                     rec.get("failure_kind"), rec.get("wall_time_sec"), json.dumps(rec)))
+                if not cur.rowcount:
+                    continue  # already stored (resumed run, re-import)
+                added += 1
+                cur.executemany(
+                    "INSERT INTO attempts (episode_id, n, latency_sec, success, failure_kind, exit_code) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [(cur.lastrowid, i, a.get("latency_sec"), int(bool(a.get("success"))), a.get("failure_kind"),
+                      a.get("exit_code")) for i, a in enumerate(rec.get("attempt_log") or ())])
+                first, last, count = seen.get(device, (ts, ts, 0))
+                seen[device] = (min(first, ts), max(last, ts), count + 1)
+            cur.executemany(
+                "INSERT INTO devices (serial, first_seen, last_seen, episodes) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (serial) DO UPDATE SET first_seen = MIN(first_seen, excluded.first_seen), "
+                "last_seen = MAX(last_seen, excluded.last_seen), episodes = episodes + excluded.episodes",
+                [(d, first, last, count) for d, (first, last, count) in seen.items()])
+            cur.execute("COMMIT")
+        except BaseException:
+            cur.execute("ROLLBACK")
+            raise
+        return added
+
+    def finish_run(self, run_id: str, finished_at: Optional[float] = None, trace_id: Optional[str] = None):
+        """Flush and store the run's totals"""
+        self.flush()
+        self.db.execute(
+            "UPDATE runs SET finished_at = ?, trace_id = COALESCE(trace_id, ?), "
+            "episodes = (SELECT COUNT(*) FROM episodes WHERE run_id = ?), "
+            "successes = (SELECT COALESCE(SUM(success), 0) FROM episodes WHERE run_id = ?) WHERE run_id = ?",
+            (finished_at or time.time(), trace_id, run_id, run_id, run_id))
+
+    def close(self):
+        self.flush()
+        self.db.close()
+
+    # --- queries ----------------------------------------------------------
+
+    def _where(self, task: Optional[str] = None, device: Optional[str] = None, run_id: Optional[str] = None,
+               since: Optional[float] = None, until: Optional[float] = None) -> Tuple[str, List[Any]]:
+        clauses, params = [], []
+        for col, val in (("task", task), ("device", device), ("run_id", run_id)):
+            if val is not None:
+                clauses.append(f"{col} = ?")
+                params.append(val)
+        if since is not None:
+            clauses.append("ts >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("ts < ?")
+            params.append(until)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def stats(self, by: str = "task", quantiles: Iterable[float] = (0.5, 0.95, 0.99), **filters) -> List[Dict[str, Any]]:
+        """Latency percentiles, success and flakiness per group (task, device, run, failure, hour, day, week).
+
+        Filters: task, device, run_id, since, until (epoch seconds).
+        """
+        if by not in GROUPS:
+            raise ValueError(f"unknown grouping {by!r}; one of {', '.join(GROUPS)}")
+        where, params = self._where(**filters)
+        rows = self.db.execute(
+            f"SELECT {GROUPS[by]} AS g, latency_sec, success, flaky, attempts FROM episodes{where} "
+            f"ORDER BY g, latency_sec", params)
+        out = []
+        for g, group in itertools.groupby(rows, key=lambda r: r[0]):
+            lats, successes, flaky, attempts = [], 0, 0, 0
+            for _, lat, ok, fl, att in group:
+                lats.append(lat or 0.0)
+                successes += ok
+                flaky += fl
+                attempts += att or 1
+            n = len(lats)
+            out.append({
+                by: g,
+                "episodes": n,
+                "success_rate": round(successes / n, 4),
+                "flaky_rate": round(flaky / n, 4),
+                "mean_attempts": round(attempts / n, 3),
+                **{f"p{round(q * 100):g}": round(_percentile(lats, q), 3) for q in quantiles},
+                "max": round(lats[-1], 3),
+            })
+        return out
+
+    def trend(self, bucket: str = "day", **filters) -> List[Dict[str, Any]]:
+        """stats() per time bucket (hour, day or week), oldest first"""
+        if bucket not in ("hour", "day", "week"):
+            raise ValueError(f"bucket must be hour, day or week, not {bucket!r}")
+        return self.stats(by=bucket, **filters)
+
+    def runs(self, since: Optional[float] = None, kind: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        clauses, params = [], []
+        if since is not None:
+            clauses.append("started_at >= ?")
+            params.append(since)
+        if kind is not None:
+            clauses.append("kind = ?")
+            params.append(kind)
+        where = (" WHERE " + " AND ".join(clauses)) if clauses else ""
+        cols = ("run_id", "kind", "trace_id", "started_at", "finished_at", "episodes", "successes")
+        rows = self.db.execute(f"SELECT {', '.join(cols)} FROM runs{where} ORDER BY started_at DESC LIMIT ?",
+                               [*params, limit])
+        return [dict(zip(cols, r)) for r in rows]
+
+    # --- import -----------------------------------------------------------
+
+    def import_file(self, path: str) -> int:
+        """Backfill one results file (<run_id>.jsonl, <run_id>.json or load_test_<ts>.json); returns new episodes"""
+        p = pathlib.Path(path)
+        ts = _run_time(p)
+        if p.name.startswith("load_test_"):
+            report = json.loads(p.read_text(encoding="utf-8"))
+            ts = report.get("timestamp", ts)
+            self.begin_run(p.stem, kind="load_test", started_at=ts,
+                           meta={"test_config": report.get("test_config"), "summary": report.get("summary")})
+            added = 0
+            for w in report.get("worker_results", []):
+                run_id = w.get("run_id") or f"{p.stem}_w{w.get('worker')}"
+                self.begin_run(run_id, started_at=ts, meta={"load_test": p.stem})
+                for rec in w.get("episode_results") or []:
+                    self.add(run_id, {"device": w.get("serial"), **rec}, ts)
+                added += self.flush()
+                self.finish_run(run_id, ts)
+            self.finish_run(p.stem, ts)
+            return added
+        run_id = p.name[:-len(".jsonl")] if p.name.endswith(".jsonl") else p.stem
+        if p.suffix == ".jsonl":
+            records: Iterable[Dict[str, Any]] = _read_jsonl(p)
+        else:
+            records = json.loads(p.read_text(encoding="utf-8"))
+            if not isinstance(records, list):
+                return 0  # not an episode array (metrics snapshot, baseline, ...)
+        records = [r for r in records if isinstance(r, dict) and "task" in r]
+        if not records:
+            return 0
+        self.begin_run(run_id, trace_id=records[0].get("trace_id"), started_at=ts)
+        for rec in records:
+            self.add(rec.get("run_id") or run_id, rec, ts)
+        added = self.flush()
+        self.finish_run(run_id, ts)
+        return added
+
+def _read_jsonl(p: pathlib.Path) -> Iterator[Dict[str, Any]]:
+    with p.open(encoding="utf-8") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue  # torn last line of an interrupted run
+
+def _run_time(p: pathlib.Path) -> float:
+    """When a results file's run happened: the timestamp in its name, else its mtime"""
+    m = re.search(r"_(\d{10})(?:\D|$)", p.stem)
+    return float(m.group(1)) if m else p.stat().st_mtime
+
+def open_store() -> Optional[ResultStore]:
+    """The store runners write to ($RESULTS_DB, default results/results.db; empty disables it)"""
+    path = os.getenv("RESULTS_DB", DEFAULT_DB)
+    return ResultStore(path) if path else None
+
+def _table(rows: List[Dict[str, Any]]) -> str:
+    if not rows:
+        return "(no episodes match)"
+    cols = list(rows[0])
+    cells = [[("" if r[c] is None else f"{r[c]:g}" if isinstance(r[c], float) else str(r[c])) for c in cols] for r in rows]
+    widths = [max(len(c), *(len(row[i]) for row in cells)) for i, c in enumerate(cols)]
+    lines = ["  ".join(c.ljust(w) for c, w in zip(cols, widths))]
+    lines += ["  ".join(v.ljust(w) for v, w in zip(row, widths)) for row in cells]
+    return "\n".join(lines)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Query and backfill the cross-run SQLite result store")
+    ap.add_argument("--db", default=os.getenv("RESULTS_DB") or DEFAULT_DB)
+    ap.add_argument("--json", action="store_true", help="Print JSON instead of a table")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    imp = sub.add_parser("import", help="Backfill existing results files (default: results/*.json, results/*.jsonl)")
+    imp.add_argument("paths", nargs="*")
+
+    for name, helptext in (("stats", "Latency percentiles, success and flakiness per group"),
+                           ("trend", "stats per time bucket")):
+        q = sub.add_parser(name, help=helptext)
+        q.add_argument("--task")
+        q.add_argument("--device")
+        q.add_argument("--run-id")
+        q.add_argument("--since", help="7d, 24h, 2026-10-01, epoch")
+        q.add_argument("--until")
+        if name == "stats":
+            q.add_argument("--by", choices=list(GROUPS), default="task")
+        else:
+            q.add_argument("--bucket", choices=("hour", "day", "week"), default="day")
+
+    r = sub.add_parser("runs", help="Recent runs")
+    r.add_argument("--since")
+    r.add_argument("--kind", choices=("eval", "load_test"))
+    r.add_argument("--limit", type=int, default=50)
+    args = ap.parse_args(argv)
+
+    store = ResultStore(args.db)
+    try:
+        if args.cmd == "import":
+            paths = args.paths or sorted(glob.glob("results/*.jsonl") + glob.glob("results/*.json"))
+            total = 0
+            for path in paths:
+                try:
+                    n = store.import_file(path)
+                except (OSError, ValueError) as e:
+                    print(f"[store] skipped {path}: {e}")
+                    continue
+                total += n
+                if n:
+                    print(f"[store] {path}: {n} episodes")
+            print(f"[store] imported {total} new episodes into {args.db}")
+            return 0
+        try:
+            if args.cmd == "runs":
+                rows = store.runs(since=parse_time(args.since), kind=args.kind, limit=args.limit)
+            else:
+                filters = dict(task=args.task, device=args.device, run_id=args.run_id,
+                               since=parse_time(args.since), until=parse_time(args.until))
+                rows = store.stats(by=args.by, **filters) if args.cmd == "stats" else store.trend(args.bucket, **filters)
+        except ValueError as e:
+            print(f"[store] {e}")
+            return 2
+        if args.cmd == "runs" and not args.json:
+            for row in rows:
+                for k in ("started_at", "finished_at"):
+                    row[k] = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(row[k])) if row[k] else None
+        print(json.dumps(rows, indent=2) if args.json else _table(rows))
+        return 0
+    finally:
+        store.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
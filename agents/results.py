@@ -0,0 +1,369 @@
+import csv, html, json, os, pathlib, textwrap, time
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+CSV_FIELDS = ["run_id", "episode", "task", "success", "latency_sec", "attempts", "flaky", "trace_id"]
+
+class RunSummary:
+    """Running aggregates over episode records (no records kept)"""
+
+    def __init__(self):
+        self.episodes = 0
+        self.successes = 0
+        self.flaky = 0
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        self.perf: Dict[str, Dict[str, Any]] = {}  # per package, from the episodes' perf sampler summaries
+
+    def add(self, rec: Dict[str, Any]):
+        lat = rec.get("latency_sec", 0.0)
+        self.episodes += 1
+        self.successes += bool(rec.get("success"))
+        self.flaky += rec.get("flaky", 0)
+        self.latency_sum += lat
+        self.latency_max = max(self.latency_max, lat)
+        if rec.get("perf"):
+            self._add_perf(rec["perf"])
+
+    def _add_perf(self, perf: Dict[str, Any]):
+        def agg(pkg: str) -> Dict[str, Any]:
+            return self.perf.setdefault(pkg, {"frames": 0, "janky_frames": 0, "frame_p90_ms": None, "peak_pss_kb": None,
+                                              "peak_cpu_pct": None, "launches": 0, "launch_ms_sum": 0, "launch_ms_max": None})
+        for pkg, p in perf.get("packages", {}).items():
+            a = agg(pkg)
+            a["frames"] += p.get("frames", 0)
+            a["janky_frames"] += p.get("janky_frames", 0)
+            for key in ("frame_p90_ms", "peak_pss_kb", "peak_cpu_pct"):
+                if p.get(key) is not None:
+                    a[key] = max(a[key] or 0, p[key])
+        for launch in perf.get("launches", ()):
+            a = agg(launch.get("package") or "unknown")
+            a["launches"] += 1
+            a["launch_ms_sum"] += launch["total_ms"]
+            a["launch_ms_max"] = max(a["launch_ms_max"] or 0, launch["total_ms"])
+
+    @property
+    def success_rate(self) -> float:
+        return self.successes / self.episodes if self.episodes else 0.0
+
+    @property
+    def avg_latency(self) -> float:
+        return self.latency_sum / self.episodes if self.episodes else 0.0
+
+    @property
+    def flakiness(self) -> float:
+        return self.flaky / self.episodes if self.episodes else 0.0
+
+def _csv_row(rec: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: rec.get(k) for k in CSV_FIELDS}
+
+def read_run_config(jsonl_path: pathlib.Path) -> Optional[Dict[str, Any]]:
+    """The run config a ResultStream wrote as its JSONL's first line (None if absent or unreadable)"""
+    try:
+        with jsonl_path.open(encoding="utf-8") as f:
+            first = json.loads(f.readline() or "null")
+    except (OSError, ValueError):
+        return None
+    return first.get("run_config") if isinstance(first, dict) else None
+
+class ResultStream:
+    """Append-only episode results: results/<run_id>.jsonl plus CSV rows as episodes finish.
+
+    Every record is flushed to the OS when appended and fsync'd every
+    RESULTS_FSYNC_EVERY records or RESULTS_FSYNC_SEC seconds, so a crash loses
+    at most the tail of an in-flight write. Opening with resume=True replays the
+    JSONL (one line at a time) to recover the completed episodes, summary and
+    trace id, drops a torn last line, and rebuilds the CSV from it.
+
+    With a `store` (agents/result_store.py), records are also batched into the
+    cross-run SQLite database and the run's totals recorded on close().
+
+    A new run's `config` (what its episodes are, see runner.run_config) is
+    written as the JSONL's first line, {"run_config": {...}}, so --resume can
+    check it is continuing the same run; records() skips that line.
+    """
+
+    def __init__(self, run_id: str, outdir: pathlib.Path, resume: bool = False, store=None,
+                 config: Optional[Dict[str, Any]] = None):
+        self.run_id = run_id
+        self.outdir = outdir
+        self.jsonl_path = outdir / f"{run_id}.jsonl"
+        self.csv_path = outdir / f"{run_id}.csv"
+        self.metrics_path = outdir / f"{run_id}.metrics.json"
+        self.summary = RunSummary()
+        self.completed: Set[int] = set()
+        self.trace_id: Optional[str] = None
+        self.fsync_every = int(os.getenv("RESULTS_FSYNC_EVERY", "10"))
+        self.fsync_sec = float(os.getenv("RESULTS_FSYNC_SEC", "5"))
+        self._unsynced = 0
+        self._synced_at = time.monotonic()
+        self.store = store
+
+        if resume:
+            if not self.jsonl_path.is_file():
+                raise FileNotFoundError(f"nothing to resume: {self.jsonl_path} not found")
+            self._repair_tail()
+            for rec in self.records():
+                self._track(rec)
+        self._jsonl = self.jsonl_path.open("a" if resume else "w", encoding="utf-8")
+        if config is not None and not resume:
+            self._jsonl.write(json.dumps({"run_config": config}) + "\n")
+            self._jsonl.flush()
+        self._csv_file = self.csv_path.open("w", newline="", encoding="utf-8")
+        self._csv = csv.DictWriter(self._csv_file, fieldnames=CSV_FIELDS)
+        self._csv.writeheader()
+        for rec in self.records() if resume else ():
+            self._csv.writerow(_csv_row(rec))
+        self._csv_file.flush()
+        if store is not None:
+            store.begin_run(run_id, trace_id=self.trace_id)
+
+    def _repair_tail(self):
+        """Cut a partially written last line (crash mid-write) so appends start clean"""
+        with self.jsonl_path.open("rb+") as f:
+            size = f.seek(0, os.SEEK_END)
+            if not size:
+                return
+            f.seek(size - 1)
+            if f.read(1) == b"\n":
+                return
+            pos = size
+            while pos > 0:
+                step = min(4096, pos)
+                f.seek(pos - step)
+                chunk = f.read(step)
+                nl = chunk.rfind(b"\n")
+                if nl >= 0:
+                    f.truncate(pos - step + nl + 1)
+                    return
+                pos -= step
+            f.truncate(0)
+
+    def _track(self, rec: Dict[str, Any]):
+        self.summary.add(rec)
+        self.trace_id = self.trace_id or rec.get("trace_id")
+        if rec.get("episode") is not None:
+            self.completed.add(rec["episode"])
+
+    def append(self, rec: Dict[str, Any]):
+        self._jsonl.write(json.dumps(rec) + "\n")
+        self._jsonl.flush()
+        self._csv.writerow(_csv_row(rec))
+        self._csv_file.flush()
+        self._track(rec)
+        if self.store is not None:
+            self.store.add(self.run_id, rec)
+        self._unsynced += 1
+        if self._unsynced >= self.fsync_every or time.monotonic() - self._synced_at >= self.fsync_sec:
+            self.sync()
+
+    def sync(self):
+        for f in (self._jsonl, self._csv_file):
+            f.flush()
+            os.fsync(f.fileno())
+        if self.store is not None:
+            self.store.flush()
+        self._unsynced = 0
+        self._synced_at = time.monotonic()
+
+    def close(self):
+        if self._jsonl.closed:
+            return
+        self.sync()
+        self._jsonl.close()
+        self._csv_file.close()
+        if self.store is not None:
+            self.store.finish_run(self.run_id, trace_id=self.trace_id)
+
+    def records(self) -> Iterator[Dict[str, Any]]:
+        """Stream the records written so far"""
+        with self.jsonl_path.open(encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    rec = json.loads(line)
+                    if "run_config" not in rec:
+                        yield rec
+
+    def load_metrics(self, registry):
+        """On resume: fold the previous attempt's metrics snapshot back into the registry"""
+        if self.metrics_path.is_file():
+            snap = json.loads(self.metrics_path.read_text(encoding="utf-8"))
+            snap.pop("gauges", None)  # levels of the interrupted process, not totals to carry over
+            registry.merge_snapshot(snap)
+
+    def write_reports(self, trace_id: str, metrics=None):
+        """Render <run_id>.json, report.md and <run_id>.html from the JSONL; returns (json, csv, md) paths.
+
+        With a metrics registry, also writes <run_id>.metrics.json and adds
+        latency percentile tables (per task, ADB command and device).
+        """
+        self.close()
+        s = self.summary
+        sections = _latency_sections(metrics) if metrics else []
+        if metrics:
+            self.metrics_path.write_text(json.dumps(metrics.snapshot()), encoding="utf-8")
+
+        # JSON array, same layout as json.dumps(records, indent=2), written record by record
+        json_path = self.outdir / f"{self.run_id}.json"
+        with json_path.open("w", encoding="utf-8") as f:
+            f.write("[")
+            for i, rec in enumerate(self.records()):
+                f.write(("," if i else "") + "\n" + textwrap.indent(json.dumps(rec, indent=2), "  "))
+            f.write("\n]" if s.episodes else "]")
+
+        # Report (Markdown)
+        report_md = self.outdir / "report.md"
+        report_md.write_text("\n".join([
+            "# Evaluation Report",
+            f"- Run ID: {self.run_id}",
+            f"- Trace ID: {trace_id}",
+            f"- Episodes: {s.episodes}",
+            f"- Success rate: {s.success_rate:.2%}",
+            f"- Avg latency: {s.avg_latency:.2f}s",
+            f"- Flakiness: {s.flakiness:.2%}",
+            *_perf_md(s.perf),
+            *_latency_md(sections),
+            "",
+            "## Correlation",
+            f"- Results file: results/{json_path.name}",
+            f"- Trace file: observability/trace_{self.run_id}.jsonl",
+            "- Use run_id + trace_id to correlate spans to each episode."
+        ]))
+
+        # Report (HTML), table rows streamed from the JSONL
+        with (self.outdir / f"{self.run_id}.html").open("w", encoding="utf-8") as f:
+            f.write(_HTML_HEAD.format(run_id=self.run_id, trace_id=trace_id, episodes=s.episodes,
+                                      success_rate=s.success_rate, avg_time=s.avg_latency, flakiness=s.flakiness))
+            for r in self.records():
+                ok_cell = "<span class=ok>✓</span>" if r.get("success") else "<span class=bad>✗</span>"
+                f.write(f"<tr><td>{r.get('episode')}</td><td>{_task_cell(r)}</td>"
+                        f"<td>{r.get('attempts')}</td><td>{r.get('latency_sec', 0.0):.2f}</td><td>{ok_cell}</td></tr>")
+            f.write(_HTML_TAIL.format(run_id=self.run_id, latency=_perf_html(s.perf) + _latency_html(sections)))
+        return json_path, self.csv_path, report_md
+
+def _task_cell(r: Dict[str, Any]) -> str:
+    """Task name; for a multi-step episode, each step with its outcome"""
+    task = html.escape(str(r.get("task")))
+    if not r.get("steps"):
+        return task
+    marks = [f"{html.escape(str(st['task']))} <span class={'ok' if st['success'] else 'bad'}>"
+             f"{'✓' if st['success'] else '✗'}</span> {st['latency_sec']:.2f}s" for st in r["steps"]]
+    return f"{task}: " + " → ".join(marks)
+
+_PCT = ("count", "p50", "p95", "p99", "max")
+_PERF_COLS = ("frames", "jank %", "frame p90 ms", "peak PSS MB", "peak CPU %", "launches", "launch avg ms", "launch max ms")
+
+def _perf_rows(perf: Dict[str, Dict[str, Any]]) -> Iterator[Tuple[str, List[str]]]:
+    """(package, cells) of the device performance table"""
+    def cell(v, fmt="{}"):
+        return "-" if v is None else fmt.format(v)
+    for pkg, a in sorted(perf.items()):
+        yield pkg, [str(a["frames"]),
+                    cell(100 * a["janky_frames"] / a["frames"] if a["frames"] else None, "{:.2f}"),
+                    cell(a["frame_p90_ms"]),
+                    cell(a["peak_pss_kb"] / 1024 if a["peak_pss_kb"] is not None else None, "{:.1f}"),
+                    cell(a["peak_cpu_pct"]),
+                    str(a["launches"]),
+                    cell(a["launch_ms_sum"] / a["launches"] if a["launches"] else None, "{:.0f}"),
+                    cell(a["launch_ms_max"])]
+
+def _perf_md(perf: Dict[str, Dict[str, Any]]) -> List[str]:
+    if not perf:
+        return []
+    lines = ["", "## Device performance (perf sampler)", "| package | " + " | ".join(_PERF_COLS) + " |",
+             "|---" * (len(_PERF_COLS) + 1) + "|"]
+    return lines + [f"| {pkg} | " + " | ".join(cells) + " |" for pkg, cells in _perf_rows(perf)]
+
+def _perf_html(perf: Dict[str, Dict[str, Any]]) -> str:
+    if not perf:
+        return ""
+    rows = "".join(f"<tr><td>{html.escape(pkg)}</td>" + "".join(f"<td>{c}</td>" for c in cells) + "</tr>"
+                   for pkg, cells in _perf_rows(perf))
+    return ("<h2>Device performance (perf sampler)</h2><table><thead><tr><th>package</th>"
+            + "".join(f"<th>{c}</th>" for c in _PERF_COLS) + f"</tr></thead><tbody>{rows}</tbody></table>\n  ")
+
+def _latency_sections(m) -> List[Tuple[str, str, Dict[str, Dict[str, float]]]]:
+    """(title, label, summaries) for each non-empty latency table"""
+    out = [
+        ("Episode latency by task", "task", m.summaries("episode_seconds", "task")),
+        ("Attempt latency by task", "task", m.summaries("task_seconds", "task")),
+        ("Sequence step latency by task", "task", m.summaries("step_seconds", "task")),
+        ("ADB command latency", "command", m.summaries("adb_command_seconds", "command")),
+        ("ADB latency by device", "device", m.summaries("adb_command_seconds", "device")),
+        ("UI hierarchy dump latency", "device", m.summaries("ui_dump_seconds", "device")),
+        ("Text input latency by mode", "mode", m.summaries("type_text_seconds", "mode")),
+        ("App launch TotalTime (am start -W)", "package", m.summaries("app_launch_seconds", "package")),
+        ("Perf sampler round trip", "device", m.summaries("perf_sample_seconds", "device")),
+    ]
+    counters = {
+        name: {"count": m.counter_total(name)}
+        for name in ("retries_total", "flaky_episodes_total", "adb_timeouts_total", "adb_errors_total",
+                     "hedged_attempts_total")
+    }
+    out.append(("Counters", "counter", counters))
+    lookups = {f"ui_cache_{o}": {"count": m.counter_total("ui_cache_lookups_total", outcome=o)}
+               for o in ("hit", "revalidated", "miss")}
+    if any(v["count"] for v in lookups.values()):
+        out.append(("UI hierarchy cache lookups", "counter", lookups))
+    return [sec for sec in out if sec[2]]
+
+def _latency_md(sections) -> List[str]:
+    lines = []
+    for title, label, rows in sections:
+        cols = ("count",) if label == "counter" else _PCT
+        lines += ["", f"## {title}", f"| {label} | " + " | ".join(cols) + " |", "|---" * (len(cols) + 1) + "|"]
+        for key, summ in rows.items():
+            cells = [str(summ[c]) if c == "count" else f"{summ[c]:.3f}s" for c in cols]
+            lines.append(f"| {key} | " + " | ".join(cells) + " |")
+    return lines
+
+def _latency_html(sections) -> str:
+    parts = []
+    for title, label, rows in sections:
+        cols = ("count",) if label == "counter" else _PCT
+        parts.append(f"<h2>{html.escape(title)}</h2><table><thead><tr><th>{label}</th>"
+                     + "".join(f"<th>{c}</th>" for c in cols) + "</tr></thead><tbody>")
+        for key, summ in rows.items():
+            cells = "".join(f"<td>{summ[c]}</td>" if c == "count" else f"<td>{summ[c]:.3f}</td>" for c in cols)
+            parts.append(f"<tr><td>{html.escape(key)}</td>{cells}</tr>")
+        parts.append("</tbody></table>")
+    return "\n  ".join(parts)
+
+_HTML_HEAD = """<!doctype html>
+<html lang="en">
+<head>
+  <meta charset="utf-8" />
+  <meta name="viewport" content="width=device-width, initial-scale=1" />
+  <title>Evaluation Report - {run_id}</title>
+  <style>
+    body {{ font-family: -apple-system, Segoe UI, Roboto, sans-serif; margin: 24px; color: #111; }}
+    h1 {{ margin-bottom: 0; }}
+    .sub {{ color: #555; margin-top: 4px; }}
+    .kpi {{ display: flex; gap: 16px; margin: 16px 0; }}
+    .card {{ border: 1px solid #eee; border-radius: 8px; padding: 12px 16px; }}
+    table {{ border-collapse: collapse; width: 100%; margin-top: 12px; }}
+    th, td {{ border-bottom: 1px solid #eee; text-align: left; padding: 8px; font-size: 14px; }}
+    th {{ background: #fafafa; }}
+    .ok {{ color: #16803c; font-weight: 600; }}
+    .bad {{ color: #9f1239; font-weight: 600; }}
+  </style>
+</head>
+<body>
+  <h1>Evaluation Report</h1>
+  <div class="sub">Run ID: {run_id} • Trace ID: {trace_id} • Episodes: {episodes}</div>
+  <div class="kpi">
+    <div class="card"><div>Success rate</div><div><strong>{success_rate:.2%}</strong></div></div>
+    <div class="card"><div>Avg latency</div><div><strong>{avg_time:.2f}s</strong></div></div>
+    <div class="card"><div>Flakiness</div><div><strong>{flakiness:.2%}</strong></div></div>
+  </div>
+  <table>
+    <thead>
+      <tr><th>#</th><th>Task</th><th>Attempts</th><th>Latency (s)</th><th>Success</th></tr>
+    </thead>
+    <tbody>"""
+
+_HTML_TAIL = """</tbody>
+  </table>
+  {latency}
+  <p><small>Trace file: observability/trace_{run_id}.jsonl</small></p>
+</body>
+</html>"""
@@ -0,0 +1,136 @@
+import os, random, threading
+from collections import deque
+from typing import Any, Dict
+
+# Failure classes (see classify)
+OK, TIMEOUT, DEVICE, TRANSIENT, PERMANENT = "ok", "timeout", "device", "transient", "permanent"
+
+# Output that won't change on a retry: bad plan, missing app/activity, no handler
+PERMANENT_MARKERS = (
+    "Unknown task", "missing package parameter", "does not exist", "unable to resolve Intent",
+    "No activities found", "empty crop box", "unsupported pixel format", "bad filename", "text needs an IME",
+)
+
+def classify(res: Dict[str, Any]) -> str:
+    """Failure class of a task result, from its exit code and output"""
+    if res.get("success"):
+        return OK
+    code, details = res.get("exit_code"), str(res.get("details", ""))
+    if code == 124 or "TIMEOUT" in details:
+        return TIMEOUT
+    if details.startswith(("adb not healthy", "circuit open")):
+        return DEVICE
+    if code == 127 or any(m in details for m in PERMANENT_MARKERS):
+        return PERMANENT
+    return TRANSIENT
+
+class RetryBudget:
+    """Retries allowed = min_retries + ratio x episodes started (per run or per task type)"""
+
+    def __init__(self, ratio: float, min_retries: int):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.started = 0
+        self.used = 0
+
+    def available(self) -> bool:
+        return self.used + 1 <= self.min_retries + self.ratio * self.started
+
+def _task_map(spec: str) -> Dict[str, int]:
+    """Parse "tap=3,screenshot=0" into {"tap": 3, "screenshot": 0}"""
+    out = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        task, _, n = part.partition("=")
+        out[task.strip()] = int(n)
+    return out
+
+class RetryPolicy:
+    """When and how long to wait before retrying a failed task.
+
+    - exponential backoff with equal jitter: base x multiplier^attempt, capped,
+      half fixed and half random so retries from many episodes spread out
+    - per-task max retries (RETRY_TASK_MAX="tap=3,screenshot=0"), default --retries
+    - retry budgets per run and per task type, so a failing device or task
+      can't multiply the load (RETRY_BUDGET_RATIO, RETRY_BUDGET_MIN)
+    - permanent failures (see classify) are never retried
+    - hedging (async multi-device modes): an attempt still running after
+      hedge_delay() gets a duplicate on an idle device; first success wins.
+      The delay is the task's observed p95, or HEDGE_AFTER_SEC until there are
+      enough samples.
+    """
+
+    def __init__(self, max_retries: int = 1, hedge: bool = False):
+        self.max_retries = max_retries
+        self.task_max = _task_map(os.getenv("RETRY_TASK_MAX", ""))
+        self.base_sec = float(os.getenv("RETRY_BASE_SEC", "0.5"))
+        self.max_sec = float(os.getenv("RETRY_MAX_SEC", "8"))
+        self.multiplier = float(os.getenv("RETRY_MULTIPLIER", "2"))
+        self.ratio = float(os.getenv("RETRY_BUDGET_RATIO", "0.2"))
+        self.min_retries = int(os.getenv("RETRY_BUDGET_MIN", "10"))
+        self.hedge = hedge
+        self.hedge_after_sec = float(os.getenv("HEDGE_AFTER_SEC", "5"))
+        self.run_budget = RetryBudget(self.ratio, self.min_retries)
+        self.task_budgets: Dict[str, RetryBudget] = {}
+        self._latency: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+        self.counts: Dict[str, int] = {"retries": 0, "denied_budget": 0, "denied_permanent": 0,
+                                       "hedged": 0, "hedge_wins": 0}
+        self.failures: Dict[str, int] = {}
+
+    def _task_budget(self, task: str) -> RetryBudget:
+        b = self.task_budgets.get(task)
+        if b is None:
+            b = self.task_budgets[task] = RetryBudget(self.ratio, self.min_retries)
+        return b
+
+    def start(self, task: str):
+        """An episode begins: grows the retry budgets"""
+        with self._lock:
+            self.run_budget.started += 1
+            self._task_budget(task).started += 1
+
+    def should_retry(self, task: str, attempt: int, kind: str) -> bool:
+        """May a task that failed with `kind` on 0-based `attempt` run again?"""
+        with self._lock:
+            self.failures[kind] = self.failures.get(kind, 0) + 1
+            if kind == PERMANENT:
+                self.counts["denied_permanent"] += 1
+                return False
+            if attempt >= self.task_max.get(task, self.max_retries):
+                return False
+            tb = self._task_budget(task)
+            if not (self.run_budget.available() and tb.available()):
+                self.counts["denied_budget"] += 1
+                return False
+            self.run_budget.used += 1
+            tb.used += 1
+            self.counts["retries"] += 1
+            return True
+
+    def backoff(self, attempt: int) -> float:
+        d = min(self.max_sec, self.base_sec * self.multiplier ** attempt)
+        return d / 2 + random.uniform(0, d / 2)
+
+    def observe(self, task: str, latency_sec: float):
+        with self._lock:
+            q = self._latency.get(task)
+            if q is None:
+                q = self._latency[task] = deque(maxlen=200)
+            q.append(latency_sec)
+
+    def hedge_delay(self, task: str) -> float:
+        with self._lock:
+            lat = sorted(self._latency.get(task, ()))
+        if len(lat) < 20:
+            return self.hedge_after_sec
+        return lat[int(0.95 * (len(lat) - 1))]
+
+    def record_hedge(self, won: bool):
+        with self._lock:
+            self.counts["hedged"] += 1
+            self.counts["hedge_wins"] += int(won)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.counts, **{f"fail_{k}": v for k, v in self.failures.items()},
+                    "budget_used": self.run_budget.used, "episodes": self.run_budget.started}
@@ -1,148 +1,225 @@
-import argparse, json, time, pathlib, csv, os, sys
-from agents.harness import run_episode
+import argparse, asyncio, hashlib, time, pathlib, os, sys
+from agents.harness import run_episode, trace_steps
+from agents.prompt_to_task import iter_prompt_file
+from agents.results import ResultStream, read_run_config
+from agents.result_store import open_store
+from agents.retry import RetryPolicy
+from agents.scheduler import EpisodeScheduler, parse_devices
+from agents.service import RunnerService
+from agents.executor import wake_state, health, screenshots, timeouts, ui_cache, perf
 
 # Add observability path to import tracer
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 from observability.trace import JsonTracer
+from observability.metrics import metrics, maybe_serve
+
+def iter_episodes(args, completed: set):
+    """(episode, prompt, plan) still to run: --prompt repeated --episodes times, or each valid --prompts-file line"""
+    if args.prompts_file:
+        for i, prompt, plan, err in iter_prompt_file(args.prompts_file):
+            if err is None and i not in completed:
+                yield i, prompt, plan
+        return
+    for i in range(args.episodes):
+        if i not in completed:
+            yield i, args.prompt, None
+
+def check_prompts_file(path: str) -> tuple:
+    """Plan and validate every request up front; returns (valid, rejected) counts"""
+    valid = rejected = 0
+    for i, _, _, err in iter_prompt_file(path):
+        if err:
+            rejected += 1
+            print(f"[runner] rejected episode {i}: {err}")
+        else:
+            valid += 1
+    return valid, rejected
+
+DEFAULT_PROMPT = "search for qualgent test"
+DEFAULT_EPISODES = 5
+# Run config keys that decide which episode is which: a resumed run must match them
+RUN_CONFIG_KEYS = ("prompt", "prompts_sha256", "episodes")
+
+def run_config(args) -> dict:
+    """What this run's episodes are, recorded with its results"""
+    if args.prompts_file:
+        digest = hashlib.sha256(pathlib.Path(args.prompts_file).read_bytes()).hexdigest()
+        return {"prompts_file": args.prompts_file, "prompts_sha256": digest, "episodes": args.episodes}
+    return {"prompt": args.prompt, "episodes": args.episodes}
+
+def restore_run_config(args, saved: dict):
+    """--resume: take --prompt/--prompts-file/--episodes from the saved config where not given"""
+    if args.prompts_file is None and args.prompt is None:
+        args.prompts_file = saved.get("prompts_file")
+        args.prompt = saved.get("prompt")
+    if args.episodes is None and not args.prompts_file:
+        args.episodes = saved.get("episodes")
+
+def run_on_devices(args, tracer: JsonTracer, episodes, stream: ResultStream, policy: RetryPolicy):
+    """--devices mode: one shared queue of episodes drained by every device in the pool"""
+    devices = parse_devices(args.devices)
+    sched = EpisodeScheduler(devices, tracer=tracer, retries=args.retries, on_record=stream.append, policy=policy)
+    for i, prompt, plan in episodes:
+        sched.submit(i, prompt, plan)
+    asyncio.run(sched.run())
+    for dev, st in sched.utilization().items():
+        with tracer.span("scheduler.device", device=dev, **st):
+            pass
+        print(f"[scheduler] {dev}: episodes={st['episodes']} stolen={st['stolen']} "
+              f"utilization={st['utilization']:.0%}{' QUARANTINED' if st['quarantined'] else ''}")
+
+def serve(args, tracer: JsonTracer, stream: ResultStream, policy: RetryPolicy):
+    """--serve mode: keep the device pool warm and run jobs posted to the service API until SIGTERM"""
+    svc = RunnerService(parse_devices(args.devices), tracer=tracer, stream=stream, policy=policy,
+                        retries=args.retries, max_queue=args.queue_depth)
+    asyncio.run(svc.serve(args.serve))
+    for dev, st in svc.sched.utilization().items():
+        with tracer.span("scheduler.device", device=dev, **st):
+            pass
 
 def main():
     ap = argparse.ArgumentParser()
-    ap.add_argument("--episodes", type=int, default=5)
-    ap.add_argument("--prompt", type=str, default="search for qualgent test")
+    ap.add_argument("--episodes", type=int, default=None, help=f"Default {DEFAULT_EPISODES} (with --resume: the run's own)")
+    ap.add_argument("--prompt", type=str, default=None, help=f"Default {DEFAULT_PROMPT!r} (with --resume: the run's own)")
     ap.add_argument("--retries", type=int, default=1)
+    ap.add_argument("--devices", type=str, default=None,
+                    help="Run across a device pool with work stealing: comma-separated serials or a tunnels file")
+    ap.add_argument("--resume", metavar="RUN_ID", default=None,
+                    help="Continue an interrupted run with its saved prompt(s) and episode count; "
+                         "episodes already in results/<RUN_ID>.jsonl are skipped")
+    ap.add_argument("--prompts-file", metavar="JSONL", default=None,
+                    help="Run one episode per line ({\"prompt\": ...} or {\"task\": ..., \"params\": ...}) instead of --prompt/--episodes")
+    ap.add_argument("--strict", action="store_true", help="With --prompts-file: abort if any request is rejected")
+    ap.add_argument("--hedge", action="store_true",
+                    help="With --devices: duplicate slow attempts onto an idle device, first success wins")
+    ap.add_argument("--serve", metavar="ADDR", default=None,
+                    help="Run as a long-lived service taking jobs over HTTP on HOST:PORT or unix:/path (see agents/service.py)")
+    ap.add_argument("--queue-depth", type=int, default=None,
+                    help="With --serve: max queued episodes before jobs are rejected with 429 (default $SERVICE_QUEUE_DEPTH or 100)")
+    ap.add_argument("--perf", action="store_true",
+                    help="Sample device frame timing, CPU/PSS and app launch times during episodes (see agents/perf_sampler.py)")
+    ap.add_argument("--run-id", default=None,
+                    help="Name for a new run (default run_<timestamp>); results go to results/<RUN_ID>.json")
     args = ap.parse_args()
 
     outdir = pathlib.Path("results"); outdir.mkdir(parents=True, exist_ok=True)
-    ts = int(time.time())
-    run_id = f"run_{ts}"
-    tracer = JsonTracer(run_id)
+    saved = read_run_config(outdir / f"{args.resume}.jsonl") if args.resume else None
+    if saved is not None:
+        restore_run_config(args, saved)
+    if args.prompt is None:
+        args.prompt = DEFAULT_PROMPT
+    if args.episodes is None:
+        args.episodes = DEFAULT_EPISODES
 
-    records = []
+    if args.prompts_file:
+        try:
+            args.episodes, rejected = check_prompts_file(args.prompts_file)
+        except OSError as e:
+            print(f"[runner] {e}")
+            return 1
+        if rejected:
+            print(f"[runner] {rejected} malformed requests in {args.prompts_file}")
+            if args.strict:
+                return 2
 
-    with tracer.span("agent.setup", episodes=args.episodes, prompt=args.prompt):
-        # Setup phase - check ADB connectivity
-        android_serial = os.getenv("ANDROID_SERIAL", "unknown")
-        print(f"[runner] Starting {args.episodes} episodes with device {android_serial}")
+    config = None if args.serve else run_config(args)
+    if saved is not None and config is not None:
+        changed = [k for k in RUN_CONFIG_KEYS if saved.get(k) != config.get(k)]
+        if changed:
+            print(f"[runner] refusing to resume {args.resume}: "
+                  + ", ".join("prompts file content changed" if k == "prompts_sha256" else
+                              f"{k} was {saved.get(k)!r}, now {config.get(k)!r}" for k in changed))
+            return 2
+    elif args.resume and not args.serve:
+        print(f"[runner] {args.resume} has no saved run config; resuming with the given prompts unchecked")
 
-    for i in range(args.episodes):
-        with tracer.span("agent.plan", episode=i, prompt=args.prompt):
-            # Planning phase - happens inside run_episode
-            pass
+    ts = int(time.time())
+    run_id = args.resume or args.run_id or f"run_{ts}"
+    try:
+        stream = ResultStream(run_id, outdir, resume=bool(args.resume), store=open_store(), config=config)
+    except FileNotFoundError as e:
+        print(f"[runner] {e}")
+        return 1
+    if args.resume:
+        stream.load_metrics(metrics)
+    maybe_serve()
+    tracer = JsonTracer(run_id, trace_id=stream.trace_id)
+    health.tracer = tracer
+    timeouts.tracer = tracer
+    policy = RetryPolicy(args.retries, hedge=args.hedge)
+    perf.enabled = perf.enabled or args.perf
+    todo = args.episodes - len(stream.completed)
+
+    if not args.serve:
+        with tracer.span("agent.setup", episodes=args.episodes, prompt=args.prompts_file or args.prompt):
+            # Setup phase - check ADB connectivity
+            android_serial = os.getenv("ANDROID_SERIAL", "unknown")
+            print(f"[runner] Starting {args.episodes} episodes with device {android_serial}")
+            if args.resume:
+                print(f"[runner] Resuming {run_id}: {len(stream.completed)} episodes done, {todo} to go")
+
+    if args.serve:
+        serve(args, tracer, stream, policy)
+    elif args.devices:
+        run_on_devices(args, tracer, iter_episodes(args, stream.completed), stream, policy)
+    else:
+        metrics.set("devices_total", 1)
+        for n, (i, prompt, plan) in enumerate(iter_episodes(args, stream.completed)):
+            metrics.set("queue_depth", todo - n - 1)
+            with tracer.span("agent.plan", episode=i, prompt=prompt):
+                # Planning phase - happens inside run_episode
+                pass
         
-        t0 = time.time()
-        with tracer.span("runner.attach_emulator", episode=i):
-            # ADB already connected via evaluate.sh
-            pass
+            t0 = time.time()
+            with tracer.span("runner.attach_emulator", episode=i):
+                # ADB already connected via evaluate.sh
+                pass
         
-        with tracer.span("task.execute", episode=i):
-            rec = run_episode(args.prompt, max_retries=args.retries)
+            with tracer.span("task.execute", episode=i):
+                metrics.set("inflight_episodes", 1); metrics.set("devices_busy", 1)
+                sampler = perf.start(None, episode=i, tracer=tracer)
+                try:
+                    rec = run_episode(prompt, max_retries=args.retries, plan=plan, policy=policy)
+                finally:
+                    sampled = sampler.stop() if sampler is not None else None
+                if sampled is not None:
+                    rec["perf"] = sampled
+                metrics.set("inflight_episodes", 0); metrics.set("devices_busy", 0)
         
-        rec["episode"] = i
-        rec["run_id"] = run_id
-        rec["trace_id"] = tracer.trace_id
-        rec["wall_time_sec"] = round(time.time() - t0, 3)
-        records.append(rec)
-        print(f"[episode {i}] success={rec['success']} latency={rec['latency_sec']}s flaky={rec['flaky']}")
-
-    # Write JSON results
-    json_path = outdir / f"{run_id}.json"
-    json_path.write_text(json.dumps(records, indent=2))
-
-    # CSV
-    csv_path = outdir / f"{run_id}.csv"
-    with csv_path.open("w", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=[
-            "run_id","episode","task","success","latency_sec","attempts","flaky","trace_id"
-        ])
-        writer.writeheader()
-        for r in records:
-            writer.writerow({
-                "run_id": r.get("run_id"),
-                "episode": r.get("episode"),
-                "task": r.get("task"),
-                "success": r.get("success"),
-                "latency_sec": r.get("latency_sec"),
-                "attempts": r.get("attempts"),
-                "flaky": r.get("flaky"),
-                "trace_id": r.get("trace_id"),
-            })
-
-    # Metrics
-    successes = [r["success"] for r in records]
-    latencies = [r["latency_sec"] for r in records]
-    flaky = [r["flaky"] for r in records]
-    success_rate = sum(successes) / len(records) if records else 0.0
-    avg_time = (sum(latencies) / len(latencies)) if latencies else 0.0
-    flakiness = (sum(flaky) / len(records)) if records else 0.0
-
-    # Report (Markdown)
-    report_md = outdir / "report.md"
-    report_md.write_text("\n".join([
-        "# Evaluation Report",
-        f"- Run ID: {run_id}",
-        f"- Trace ID: {tracer.trace_id}",
-        f"- Episodes: {len(records)}",
-        f"- Success rate: {success_rate:.2%}",
-        f"- Avg latency: {avg_time:.2f}s",
-        f"- Flakiness: {flakiness:.2%}",
-        "",
-        "## Correlation",
-        f"- Results file: results/{json_path.name}",
-        f"- Trace file: observability/trace_{run_id}.jsonl",
-        "- Use run_id + trace_id to correlate spans to each episode."
-    ]))
-
-    # Report (HTML)
-    rows = []
-    for r in records:
-        epi = r.get("episode")
-        task = r.get("task")
-        attempts = r.get("attempts")
-        lat = r.get("latency_sec", 0.0)
-        ok = r.get("success")
-        ok_cell = "<span class=ok>✓</span>" if ok else "<span class=bad>✗</span>"
-        rows.append(f"<tr><td>{epi}</td><td>{task}</td><td>{attempts}</td><td>{lat:.2f}</td><td>{ok_cell}</td></tr>")
-    rows_html = "".join(rows)
-
-    html = f"""<!doctype html>
-<html lang="en">
-<head>
-  <meta charset="utf-8" />
-  <meta name="viewport" content="width=device-width, initial-scale=1" />
-  <title>Evaluation Report - {run_id}</title>
-  <style>
-    body {{ font-family: -apple-system, Segoe UI, Roboto, sans-serif; margin: 24px; color: #111; }}
-    h1 {{ margin-bottom: 0; }}
-    .sub {{ color: #555; margin-top: 4px; }}
-    .kpi {{ display: flex; gap: 16px; margin: 16px 0; }}
-    .card {{ border: 1px solid #eee; border-radius: 8px; padding: 12px 16px; }}
-    table {{ border-collapse: collapse; width: 100%; margin-top: 12px; }}
-    th, td {{ border-bottom: 1px solid #eee; text-align: left; padding: 8px; font-size: 14px; }}
-    th {{ background: #fafafa; }}
-    .ok {{ color: #16803c; font-weight: 600; }}
-    .bad {{ color: #9f1239; font-weight: 600; }}
-  </style>
-</head>
-<body>
-  <h1>Evaluation Report</h1>
-  <div class="sub">Run ID: {run_id} • Trace ID: {tracer.trace_id} • Episodes: {len(records)}</div>
-  <div class="kpi">
-    <div class="card"><div>Success rate</div><div><strong>{success_rate:.2%}</strong></div></div>
-    <div class="card"><div>Avg latency</div><div><strong>{avg_time:.2f}s</strong></div></div>
-    <div class="card"><div>Flakiness</div><div><strong>{flakiness:.2%}</strong></div></div>
-  </div>
-  <table>
-    <thead>
-      <tr><th>#</th><th>Task</th><th>Attempts</th><th>Latency (s)</th><th>Success</th></tr>
-    </thead>
-    <tbody>{rows_html}</tbody>
-  </table>
-  <p><small>Trace file: observability/trace_{run_id}.jsonl</small></p>
-</body>
-</html>"""
-    (outdir / f"{run_id}.html").write_text(html)
+            rec["episode"] = i
+            rec["run_id"] = run_id
+            rec["trace_id"] = tracer.trace_id
+            rec["wall_time_sec"] = round(time.time() - t0, 3)
+            with tracer.span("episode.phases", episode=i, **rec["phases"]):
+                pass
+            trace_steps(tracer, rec)
+            stream.append(rec)
+            print(f"[episode {i}] success={rec['success']} latency={rec['latency_sec']}s flaky={rec['flaky']}")
+
+    with tracer.span("device.state_cache", **wake_state.stats()):
+        pass
+    with tracer.span("ui.hierarchy_cache", **ui_cache.stats()):
+        pass
+    with tracer.span("retry.policy", **policy.stats()):
+        pass
+    for dev, st in health.snapshot().items():
+        with tracer.span("device.health", device=dev, **st):
+            pass
+    for key, st in timeouts.stats().items():
+        with tracer.span("adb.timeouts", key=key, **st):
+            pass
+    timeouts.save()
+    health.stop_all()
+    screenshots.flush()
+    if screenshots.frames:
+        with tracer.span("screenshot.pipeline", **screenshots.stats()):
+            pass
+
+    json_path, csv_path, report_md = stream.write_reports(tracer.trace_id, metrics=metrics)
+    tracer.close()
 
     print(f"[runner] wrote {json_path}, {csv_path}, {report_md}, and HTML report (trace in observability/trace_{run_id}.jsonl)")
+    return 0
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,254 @@
+import asyncio, contextlib, os, pathlib, time
+from collections import deque
+from typing import Callable, Dict, Any, List, Optional
+from agents.async_executor import _adb_async
+from agents.executor import _healthy, perf
+from agents.harness import run_episode_async, trace_steps
+from agents.retry import RetryPolicy
+from observability.metrics import metrics
+
+def parse_devices(spec: Optional[str] = None) -> List[Optional[str]]:
+    """Device serials from a comma-separated list or an adb_tunnels.txt-style file.
+
+    Without a spec: infra/adb_tunnels.txt if present, else $ANDROID_SERIAL.
+    """
+    if not spec:
+        tunnels = pathlib.Path("infra/adb_tunnels.txt")
+        if tunnels.is_file() and tunnels.stat().st_size:
+            return parse_devices(str(tunnels))
+        return [os.getenv("ANDROID_SERIAL") or None]
+    path = pathlib.Path(spec)
+    if path.is_file():
+        devices = []
+        for line in path.read_text().splitlines():
+            parts = line.strip().split()
+            if len(parts) >= 2:
+                devices.append(parts[1].strip().strip('",'))
+        return devices
+    return [d.strip() for d in spec.split(",") if d.strip()]
+
+class EpisodeScheduler:
+    """Work-stealing episode scheduler over a pool of devices in one event loop.
+
+    Episodes are dealt round-robin into per-device deques. Each device worker
+    pops from the front of its own deque and, once empty, steals from the back
+    of the longest other deque, so a slow device never holds back work the
+    others could run. A device whose healthcheck fails `quarantine_after` times
+    in a row is quarantined and its queued (and just-failed) episodes are
+    handed to the remaining devices. With policy.hedge, devices left idle at
+    the tail of the run are lent out (borrow/release) for hedged attempts.
+
+    With persistent=True (service mode) workers stay up for episodes submitted
+    while running, and run() returns once close() is called and the queue drains.
+    """
+
+    def __init__(self, devices: List[Optional[str]], tracer=None, retries: int = 1,
+                 quarantine_after: int = 2, max_requeues: int = 1,
+                 on_record: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 policy: Optional[RetryPolicy] = None, persistent: bool = False):
+        self.devices = list(devices)
+        self.tracer = tracer
+        self.on_record = on_record  # streams each finished record instead of collecting them
+        self.retries = retries
+        self.policy = policy or RetryPolicy(retries)
+        self.quarantine_after = quarantine_after
+        self.max_requeues = max_requeues
+        self.queues: Dict[Optional[str], deque] = {d: deque() for d in self.devices}
+        self.stats: Dict[Optional[str], Dict[str, Any]] = {
+            d: {"episodes": 0, "busy_sec": 0.0, "stolen": 0, "health_failures": 0, "quarantined": False, "lent": 0}
+            for d in self.devices
+        }
+        self.records: List[Dict[str, Any]] = []
+        self._submitted = 0
+        self._pending = 0
+        self._changed: Optional[asyncio.Condition] = None
+        self._busy: set = set()
+        self._lent: set = set()
+        self._started = 0.0
+        self._finished = 0.0
+        self._open = persistent
+
+    def submit(self, episode: int, prompt: str, plan: Optional[tuple] = None, **tags):
+        """Queue an episode (before run(), or while it runs with persistent=True); tags are copied onto its record"""
+        active = self.active() or self.devices
+        dev = active[self._submitted % len(active)]
+        self.queues[dev].append({"episode": episode, "prompt": prompt, "plan": plan, "requeues": 0,
+                                 "queued_at": time.monotonic(), "tags": tags})
+        self._submitted += 1
+        self._pending += 1
+        self._publish()
+        if self._changed is not None:
+            asyncio.ensure_future(self._notify())
+
+    def close(self):
+        """Persistent mode: stop waiting for new work; run() returns once everything queued has finished"""
+        self._open = False
+        if self._changed is not None:
+            asyncio.ensure_future(self._notify())
+
+    def backlog(self) -> int:
+        """Episodes queued and not yet picked up by a device"""
+        return sum(len(q) for q in self.queues.values())
+
+    def busy(self) -> int:
+        return len(self._busy)
+
+    def idle(self) -> List[Optional[str]]:
+        """Active devices neither running an episode nor lent out"""
+        return [d for d in self.active() if d not in self._busy and d not in self._lent]
+
+    def _publish(self):
+        """Backlog and device-usage gauges (the autoscaling signal, see infra/autoscaler.py)"""
+        metrics.set("queue_depth", self.backlog())
+        metrics.set("inflight_episodes", len(self._busy))
+        metrics.set("devices_total", len(self.active()))
+        metrics.set("devices_busy", len(self._busy))
+
+    def active(self) -> List[Optional[str]]:
+        """Devices not quarantined"""
+        return [d for d in self.devices if not self.stats[d]["quarantined"]]
+
+    def _next(self, dev: Optional[str]) -> Optional[Dict[str, Any]]:
+        if self.queues[dev]:
+            return self.queues[dev].popleft()
+        victim = max(self.devices, key=lambda d: len(self.queues[d]))
+        if self.queues[victim]:
+            self.stats[dev]["stolen"] += 1
+            return self.queues[victim].pop()
+        return None
+
+    def _redistribute(self, items: List[Dict[str, Any]], exclude: Optional[str] = None):
+        for item in items:
+            active = [d for d in self.active() if d != exclude] or self.active()
+            if not active:
+                self._finish(item, {"task": "unknown", "params": {}, "success": False, "latency_sec": 0.0,
+                                    "attempts": 0, "flaky": 0, "details": "no healthy devices left"}, None, 0.0)
+                continue
+            target = min(active, key=lambda d: len(self.queues[d]))
+            self.queues[target].append(item)
+
+    def _finish(self, item: Dict[str, Any], rec: Dict[str, Any], dev: Optional[str], wall: float):
+        rec.update(item.get("tags", {}))
+        rec["episode"] = item["episode"]
+        rec["device"] = dev
+        rec["requeues"] = item["requeues"]
+        rec["wall_time_sec"] = round(wall, 3)
+        if self.tracer is not None:
+            rec["run_id"] = self.tracer.run_id
+            rec["trace_id"] = self.tracer.trace_id
+            with self.tracer.span("episode.phases", episode=rec["episode"], device=dev, **rec.get("phases", {})):
+                pass
+            trace_steps(self.tracer, rec, device=dev)
+        if self.on_record is not None:
+            self.on_record(rec)
+        else:
+            self.records.append(rec)
+        self._pending -= 1
+        print(f"[episode {rec['episode']}] device={dev} success={rec['success']} latency={rec['latency_sec']}s flaky={rec['flaky']}")
+
+    def borrow(self) -> Optional[str]:
+        """Lend an idle device for a hedged attempt (None if every device is busy)"""
+        for d in self.active():
+            if d is not None and d not in self._busy and d not in self._lent:
+                self._lent.add(d)
+                self.stats[d]["lent"] += 1
+                return d
+        return None
+
+    def release(self, dev: str):
+        self._lent.discard(dev)
+        asyncio.ensure_future(self._notify())
+
+    async def _notify(self):
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def _device_healthy(self, dev: Optional[str]) -> bool:
+        return _healthy(*await _adb_async(["get-state"], timeout_sec=5.0, serial=dev))
+
+    async def _worker(self, dev: Optional[str]):
+        st = self.stats[dev]
+        while not st["quarantined"]:
+            item = None if dev in self._lent else self._next(dev)
+            if item is None:
+                if self._pending == 0 and not self._open:
+                    break
+                # Work may still come back from a device that gets quarantined
+                async with self._changed:
+                    await self._changed.wait()
+                continue
+
+            t0 = time.monotonic()
+            metrics.observe("queue_wait_seconds", t0 - item["queued_at"])
+            span = self.tracer.span("task.execute", episode=item["episode"], device=dev) if self.tracer else contextlib.nullcontext()
+            self._busy.add(dev)
+            self._publish()
+            sampler = perf.start(dev, episode=item["episode"], tracer=self.tracer)
+            try:
+                try:
+                    with span:
+                        rec = await run_episode_async(item["prompt"], max_retries=self.retries, serial=dev,
+                                                      plan=item["plan"], policy=self.policy, pool=self)
+                finally:
+                    sampled = await asyncio.to_thread(sampler.stop) if sampler is not None else None
+                wall = time.monotonic() - t0
+                # Still busy: borrow() must not lend the device until its health is known
+                healthy = rec["success"] or await self._device_healthy(dev)
+            finally:
+                self._busy.discard(dev)
+                self._publish()
+            if sampled is not None:
+                rec["perf"] = sampled
+            st["busy_sec"] += wall
+
+            # The requeue decision below has no await, so nothing can borrow the device before it is made
+            if not healthy:
+                st["health_failures"] += 1
+                orphans = []
+                if st["health_failures"] >= self.quarantine_after:
+                    st["quarantined"] = True
+                    print(f"[scheduler] quarantining {dev} after {st['health_failures']} failed healthchecks")
+                    orphans = list(self.queues[dev]); self.queues[dev].clear()
+                if item["requeues"] < self.max_requeues:
+                    # Device failure, not a task failure: hand the episode to another device
+                    item["requeues"] += 1
+                    orphans.insert(0, item)
+                else:
+                    self._finish(item, rec, dev, wall)
+                    st["episodes"] += 1
+                self._redistribute(orphans, exclude=dev)
+                self._publish()
+                async with self._changed:
+                    self._changed.notify_all()
+                continue
+            st["health_failures"] = 0
+            self._finish(item, rec, dev, wall)
+            st["episodes"] += 1
+
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def run(self) -> List[Dict[str, Any]]:
+        """Run all submitted episodes; returns records ordered by episode (none when streamed to on_record)"""
+        self._changed = asyncio.Condition()
+        self._started = time.monotonic()
+        self._publish()
+        await asyncio.gather(*(self._worker(d) for d in self.devices))
+        # Anything still queued had no healthy device to run on
+        leftovers = [item for d in self.devices for item in self.queues[d]]
+        for d in self.devices:
+            self.queues[d].clear()
+        self._publish()
+        for item in leftovers:
+            self._finish(item, {"task": "unknown", "params": {}, "success": False, "latency_sec": 0.0,
+                                "attempts": 0, "flaky": 0, "details": "no healthy devices left"}, None, 0.0)
+        self._finished = time.monotonic()
+        return sorted(self.records, key=lambda r: r["episode"])
+
+    def utilization(self) -> Dict[str, Dict[str, Any]]:
+        """Per-device busy time as a fraction of the makespan"""
+        makespan = max(self._finished - self._started, 1e-9)
+        return {
+            str(d): {**st, "busy_sec": round(st["busy_sec"], 3), "utilization": round(st["busy_sec"] / makespan, 3)}
+            for d, st in self.stats.items()
+        }
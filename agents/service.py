@@ -0,0 +1,322 @@
+"""
+Long-lived runner service (runner.py --serve): devices stay attached and warm
+between jobs, and episode jobs arrive over a small HTTP API on TCP or a Unix
+socket instead of one process per run.
+
+    POST /jobs[?stream=1]   {"prompt": ...} | "prompt" | {"task": ..., "params": {...}} | [request, ...]
+                            | {"requests": [...]} | {"prompt": ..., "episodes": N}
+                            202 {"job_id", "episodes"}; 400 invalid; 413 larger than the queue;
+                            429 + Retry-After when the queue is full; 503 while draining.
+                            With stream=1 the response is the NDJSON record stream instead.
+    GET  /jobs/<id>         status and the records finished so far
+    GET  /jobs/<id>/stream  NDJSON, one record per line as episodes finish
+    GET  /healthz           200 ready, 503 draining or no healthy devices
+
+Episodes from every job share one persistent EpisodeScheduler (work stealing,
+quarantine, hedging) and are appended to one ResultStream. A job is admitted
+whole or rejected whole, so queue depth never exceeds SERVICE_QUEUE_DEPTH.
+SIGTERM/SIGINT stop admission, let queued and in-flight episodes finish (up to
+SERVICE_DRAIN_SEC) and return to the runner, which writes the reports.
+"""
+
+import asyncio, itertools, json, math, os, signal, time, uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from agents.executor import health, timeouts, wake_state
+from agents.prompt_to_task import plan_request
+from agents.scheduler import EpisodeScheduler
+from observability.metrics import metrics
+
+_REASONS = {200: "OK", 202: "Accepted", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            413: "Payload Too Large", 429: "Too Many Requests", 503: "Service Unavailable"}
+
+class Rejected(Exception):
+    """A job the service will not queue; `status` is the HTTP status to answer with"""
+
+    def __init__(self, status: int, message: str, retry_after: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+class Job:
+    """Episodes submitted together; records arrive as they finish"""
+
+    def __init__(self, job_id: str, total: int):
+        self.id = job_id
+        self.total = total
+        self.records: List[Dict[str, Any]] = []
+        self.created = time.time()
+        self._changed = asyncio.Event()
+
+    def add(self, rec: Dict[str, Any]):
+        self.records.append(rec)
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    @property
+    def done(self) -> bool:
+        return len(self.records) >= self.total
+
+    async def follow(self):
+        """Yield every record of the job, waiting for the ones still running"""
+        i = 0
+        while i < self.total:
+            if i < len(self.records):
+                yield self.records[i]
+                i += 1
+            else:
+                await self._changed.wait()
+
+    def status(self, records: bool = True) -> Dict[str, Any]:
+        out = {
+            "job_id": self.id,
+            "state": "done" if self.done else ("running" if self.records else "queued"),
+            "episodes": self.total,
+            "finished": len(self.records),
+            "succeeded": sum(1 for r in self.records if r.get("success")),
+        }
+        if records:
+            out["records"] = self.records
+        return out
+
+def parse_address(addr: str) -> Tuple[str, Any]:
+    """("unix", path) for unix:/path, else ("tcp", (host, port)) for HOST:PORT, :PORT or PORT"""
+    if addr.startswith("unix:"):
+        return "unix", addr[5:]
+    host, _, port = addr.rpartition(":")
+    return "tcp", (host or "127.0.0.1", int(port))
+
+class RunnerService:
+    """Bounded job queue in front of a persistent EpisodeScheduler, served over HTTP"""
+
+    def __init__(self, devices: List[Optional[str]], tracer=None, stream=None, policy=None, retries: int = 1,
+                 max_queue: Optional[int] = None, max_jobs: int = 1000, drain_sec: Optional[float] = None,
+                 keepalive_sec: Optional[float] = None):
+        self.sched = EpisodeScheduler(devices, tracer=tracer, retries=retries, on_record=self._on_record,
+                                      policy=policy, persistent=True)
+        self.devices = self.sched.devices
+        self.stream = stream
+        self.max_queue = max_queue or int(os.getenv("SERVICE_QUEUE_DEPTH", "100"))
+        self.max_jobs = max_jobs  # finished jobs kept for GET /jobs/<id>
+        self.drain_sec = drain_sec if drain_sec is not None else float(os.getenv("SERVICE_DRAIN_SEC", "600"))
+        self.keepalive_sec = keepalive_sec if keepalive_sec is not None else float(os.getenv("SERVICE_KEEPALIVE_SEC", "60"))
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self.draining = False
+        self.stats = {"accepted": 0, "rejected": 0, "episodes": 0}
+        self._episodes = itertools.count()
+        self._stop: Optional[asyncio.Event] = None
+        self._conns: set = set()
+
+    # --- jobs -------------------------------------------------------------
+
+    def _on_record(self, rec: Dict[str, Any]):
+        if self.stream is not None:
+            self.stream.append(rec)
+        self.stats["episodes"] += 1
+        job = self.jobs.get(rec.get("job_id"))
+        if job is not None:
+            job.add(rec)
+        self._trim()
+
+    def _trim(self):
+        while len(self.jobs) > self.max_jobs:
+            oldest = next(iter(self.jobs.values()))
+            if not oldest.done:
+                break
+            self.jobs.popitem(last=False)
+
+    def retry_after(self) -> int:
+        """Seconds until the current backlog should have drained"""
+        h = metrics.histogram("episode_seconds")
+        mean = h.sum_us / h.count / 1e6 if h.count else 30.0
+        return max(1, math.ceil(self.sched.backlog() * mean / max(1, len(self.sched.active()))))
+
+    def submit(self, body: Any) -> Job:
+        """Validate and queue a job (all episodes or none)"""
+        if self.draining:
+            raise Rejected(503, "draining")
+        if isinstance(body, dict) and "requests" in body:
+            reqs = body["requests"]
+        elif isinstance(body, dict):
+            n = body.get("episodes", 1)
+            if isinstance(n, bool) or not isinstance(n, int) or n < 1:
+                raise Rejected(400, f"episodes must be a positive integer, got {n!r}")
+            # Checked before the list is built: the count comes from the client
+            if n > self.max_queue:
+                raise Rejected(413, f"{n} episodes exceed the queue depth ({self.max_queue}); split the job")
+            reqs = [body] * n
+        elif isinstance(body, str):
+            reqs = [body]
+        else:
+            reqs = body
+        if not isinstance(reqs, list) or not reqs:
+            raise Rejected(400, "expected a request, a list of requests or {\"requests\": [...]}")
+        if len(reqs) > self.max_queue:
+            raise Rejected(413, f"{len(reqs)} episodes exceed the queue depth ({self.max_queue}); split the job")
+        plans = []
+        for n, req in enumerate(reqs):
+            prompt, plan, err = plan_request(req)
+            if err:
+                raise Rejected(400, f"request {n}: {err}")
+            plans.append((prompt, plan))
+        if self.sched.backlog() + len(plans) > self.max_queue:
+            self.stats["rejected"] += 1
+            metrics.inc("service_jobs_rejected")
+            raise Rejected(429, f"queue full ({self.sched.backlog()}/{self.max_queue})", self.retry_after())
+        job = Job(uuid.uuid4().hex[:12], len(plans))
+        self.jobs[job.id] = job
+        for n, (prompt, plan) in enumerate(plans):
+            self.sched.submit(next(self._episodes), prompt, plan, job_id=job.id, job_index=n)
+        self.stats["accepted"] += 1
+        metrics.inc("service_jobs_accepted")
+        print(f"[service] job {job.id}: {job.total} episodes queued (backlog {self.sched.backlog()})")
+        return job
+
+    def health(self) -> Dict[str, Any]:
+        return {
+            "status": "draining" if self.draining else ("ok" if self.sched.active() else "no healthy devices"),
+            "devices": len(self.sched.active()),
+            "busy": self.sched.busy(),
+            "queue_depth": self.sched.backlog(),
+            "max_queue": self.max_queue,
+            **self.stats,
+        }
+
+    # --- HTTP -------------------------------------------------------------
+
+    async def _send(self, writer: asyncio.StreamWriter, status: int, body: Any = None,
+                    headers: Optional[Dict[str, str]] = None):
+        data = (json.dumps(body) + "\n").encode() if body is not None else b""
+        head = [f"HTTP/1.1 {status} {_REASONS.get(status, '')}", "Content-Type: application/json",
+                f"Content-Length: {len(data)}", "Connection: close"]
+        head += [f"{k}: {v}" for k, v in (headers or {}).items()]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode() + data)
+        await writer.drain()
+
+    async def _stream(self, writer: asyncio.StreamWriter, job: Job):
+        """NDJSON records until the job is done (no Content-Length; the response ends when the connection closes)"""
+        writer.write(f"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\nX-Job-Id: {job.id}\r\n"
+                     "Connection: close\r\n\r\n".encode())
+        await writer.drain()
+        async for rec in job.follow():
+            writer.write((json.dumps(rec) + "\n").encode())
+            await writer.drain()
+
+    async def _route(self, method: str, target: str, body: bytes, writer: asyncio.StreamWriter):
+        path, _, query = target.partition("?")
+        parts = [p for p in path.split("/") if p]
+        if parts == ["healthz"]:
+            h = self.health()
+            return await self._send(writer, 200 if h["status"] == "ok" else 503, h)
+        if parts == ["jobs"] and method == "POST":
+            try:
+                job = self.submit(json.loads(body or b"null"))
+            except ValueError as e:
+                return await self._send(writer, 400, {"error": f"invalid JSON: {e}"})
+            except Rejected as e:
+                headers = {"Retry-After": str(e.retry_after)} if e.retry_after else None
+                return await self._send(writer, e.status, {"error": str(e)}, headers)
+            if "stream=1" in query.split("&"):
+                return await self._stream(writer, job)
+            return await self._send(writer, 202, {"job_id": job.id, "episodes": job.total})
+        if parts == ["jobs"]:
+            return await self._send(writer, 200, [j.status(records=False) for j in self.jobs.values()])
+        if len(parts) in (2, 3) and parts[0] == "jobs" and method == "GET":
+            job = self.jobs.get(parts[1])
+            if job is None:
+                return await self._send(writer, 404, {"error": f"no job {parts[1]}"})
+            if len(parts) == 3 and parts[2] == "stream":
+                return await self._stream(writer, job)
+            if len(parts) == 2:
+                return await self._send(writer, 200, job.status())
+        if parts and parts[0] in ("jobs", "healthz"):
+            return await self._send(writer, 405, {"error": f"{method} not allowed on {path}"})
+        return await self._send(writer, 404, {"error": f"no route {path}"})
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """One request per connection"""
+        task = asyncio.current_task()
+        self._conns.add(task)
+        try:
+            method, target, _ = (await reader.readline()).decode("latin-1").split(" ", 2)
+            length = 0
+            while True:
+                line = (await reader.readline()).decode("latin-1").strip()
+                if not line:
+                    break
+                name, _, value = line.partition(":")
+                if name.strip().lower() == "content-length":
+                    length = int(value)
+            body = await reader.readexactly(length) if length else b""
+            await self._route(method.upper(), target, body, writer)
+        except (ValueError, ConnectionError, asyncio.IncompleteReadError):
+            pass  # malformed request or client went away
+        finally:
+            self._conns.discard(task)
+            writer.close()
+
+    # --- lifecycle --------------------------------------------------------
+
+    async def _warm(self, dev: Optional[str]):
+        """Start the health monitor and wake/unlock the device before any job needs it"""
+        health.get(dev)
+        await asyncio.to_thread(wake_state.ensure_awake, dev)
+
+    async def _keepalive(self):
+        """Re-check idle devices as their cached wake state expires, so the screen never sleeps between jobs;
+        checkpoint learned ADB timeouts while at it"""
+        while True:
+            await asyncio.sleep(self.keepalive_sec)
+            await asyncio.to_thread(timeouts.save)
+            if self.stream is not None:
+                self.stream.sync()
+            await asyncio.gather(*(asyncio.to_thread(wake_state.ensure_awake, d) for d in self.sched.idle()),
+                                 return_exceptions=True)
+
+    def drain(self):
+        """Stop admitting jobs and finish what is queued (SIGTERM)"""
+        if not self.draining:
+            print(f"[service] draining: {self.sched.backlog()} queued, {self.sched.busy()} in flight")
+            self.draining = True
+            self.sched.close()
+            self._stop.set()
+
+    async def serve(self, address: str):
+        """Run until drained; returns after the last queued episode has finished (or SERVICE_DRAIN_SEC passed)"""
+        self._stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, self.drain)
+        kind, where = parse_address(address)
+        if kind == "unix":
+            if os.path.exists(where):
+                os.unlink(where)
+            server = await asyncio.start_unix_server(self._handle, path=where)
+        else:
+            server = await asyncio.start_server(self._handle, *where)
+        await asyncio.gather(*(self._warm(d) for d in self.devices), return_exceptions=True)
+        print(f"[service] listening on {address} with {len(self.devices)} devices (queue depth {self.max_queue})")
+        run = asyncio.ensure_future(self.sched.run())
+        keepalive = asyncio.ensure_future(self._keepalive()) if self.keepalive_sec > 0 else None
+        stopped = asyncio.ensure_future(self._stop.wait())
+        await asyncio.wait([run, stopped], return_when=asyncio.FIRST_COMPLETED)
+        if run.done() and not self.draining:
+            print("[service] no healthy devices left; shutting down")
+            self.draining = True
+        if keepalive is not None:
+            keepalive.cancel()
+        try:
+            await asyncio.wait_for(asyncio.shield(run), timeout=self.drain_sec)
+        except asyncio.TimeoutError:
+            print(f"[service] drain timed out after {self.drain_sec:g}s; abandoning {self.sched.busy()} episodes")
+            run.cancel()
+        # Let streaming clients receive the last records before the listener goes away
+        if self._conns:
+            await asyncio.wait(list(self._conns), timeout=5.0)
+        server.close()
+        await server.wait_closed()
+        stopped.cancel()
+        if kind == "unix" and os.path.exists(where):
+            os.unlink(where)
+        print(f"[service] drained: {self.stats['accepted']} jobs, {self.stats['episodes']} episodes, "
+              f"{self.stats['rejected']} rejected")
@@ -0,0 +1,108 @@
+import base64, os, re, shlex, threading, time
+from typing import Any, Dict, Optional
+from agents.batch import InputBatch
+from agents.flows import AdbCall, Flow
+from observability.metrics import metrics
+
+# What `input text` can type: printable ASCII (newline and tab are sent as key
+# events). "%s" is its escape for a space, so a literal "%s" can't be typed either.
+_KEYS_SAFE = re.compile(r"[\x20-\x7e\n\t]*")
+_KEYCODES = {"\n": 66, "\t": 61}  # ENTER, TAB
+_SEGMENTS = re.compile(r"([\n\t])")
+
+def needs_ime(text: str) -> bool:
+    """True if `input text` can't type this (non-ASCII, control characters, a literal "%s")"""
+    return not _KEYS_SAFE.fullmatch(text) or "%s" in text
+
+def _quoted(chunk: str) -> str:
+    return shlex.quote(chunk.replace(" ", "%s"))
+
+class TextInput:
+    """Chooses and runs the fastest way to type a string on a device.
+
+    - keys: `input text`, which injects one key event per character. Short
+      ASCII strings go in a single call; longer ones in TEXT_CHUNK_CHARS
+      pieces inside one on-device script (one round trip, no argument-length
+      or dropped-character trouble), with newlines/tabs as key events.
+    - ime: the ADB keyboard IME (TEXT_INPUT_IME, e.g. ADBKeyboard) commits
+      base64-encoded text from a broadcast in one step, independent of length
+      and including any Unicode. Needs the IME installed; it is selected on
+      first use and stays selected.
+
+    TEXT_INPUT_MODE=auto (default) uses the IME when the device has it and the
+    text is at least TEXT_IME_MIN_CHARS long or can't be typed as keys, and
+    keys otherwise. The IME probe costs one round trip per device, once.
+    """
+
+    def __init__(self, mode: Optional[str] = None, ime: Optional[str] = None):
+        self.mode = mode or os.getenv("TEXT_INPUT_MODE", "auto")
+        self.ime = ime or os.getenv("TEXT_INPUT_IME", "com.android.adbkeyboard/.AdbIME")
+        self.ime_min_chars = int(os.getenv("TEXT_IME_MIN_CHARS", "32"))
+        self.chunk_chars = int(os.getenv("TEXT_CHUNK_CHARS", "100"))
+        self.ime_chunk_chars = int(os.getenv("TEXT_IME_CHUNK_CHARS", "4000"))
+        self.key_sec = float(os.getenv("TEXT_KEY_SEC", "0.05"))  # timeout budget per typed key
+        self._devices: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _state(self, device: str) -> Dict[str, Any]:
+        with self._lock:
+            return self._devices.setdefault(device, {"available": None, "active": False})
+
+    def invalidate(self, device: str):
+        with self._lock:
+            self._devices.pop(device, None)
+
+    def flow(self, text: str, device: str) -> Flow:
+        """Type `text` into the focused field; returns {"ok", "code", "mode", "details"}"""
+        t0 = time.perf_counter()
+        st = self._state(device)
+        want_ime = self.mode == "ime" or (self.mode == "auto" and
+                                          (len(text) >= self.ime_min_chars or needs_ime(text)))
+        if want_ime and st["available"] is None:
+            code, out = yield AdbCall(["shell", "ime list -s; echo __qg_ime; settings get secure default_input_method"], 5.0)
+            listed, _, current = (out or "").partition("__qg_ime")
+            st["available"] = code == 0 and self.ime in listed.split()
+            st["active"] = current.strip() == self.ime
+        if want_ime and st["available"]:
+            mode, (code, out) = "ime", (yield from self._ime(text, st))
+        elif needs_ime(text) or self.mode == "ime":
+            return {"ok": False, "code": 1, "mode": "ime",
+                    "details": f"text needs an IME ({self.ime} is not installed): non-ASCII, control "
+                               f"characters or '%s' can't be typed with `input text`"}
+        else:
+            mode, (code, out) = "keys", (yield from self._keys(text))
+        if code == 0:
+            metrics.observe("type_text_seconds", time.perf_counter() - t0, mode=mode)
+            metrics.inc("typed_chars_total", len(text), mode=mode)
+        elif mode == "ime":
+            self.invalidate(device)  # re-probe next time (IME removed or switched away)
+        details = f"typed {len(text)} chars via {mode}" if code == 0 else (out or "")[-200:]
+        return {"ok": code == 0, "code": code, "mode": mode, "details": details}
+
+    def _ime(self, text: str, st: Dict[str, Any]) -> Flow:
+        n = self.ime_chunk_chars
+        msgs = [base64.b64encode(text[i:i + n].encode()).decode() for i in range(0, len(text), n)] or [""]
+        if st["active"] and len(msgs) == 1:
+            code, out = yield AdbCall(["shell", "am", "broadcast", "-a", "ADB_INPUT_B64", "--es", "msg", msgs[0]], 5.0)
+            return code, out
+        parts = [] if st["active"] else [f"ime enable {self.ime} >/dev/null", f"ime set {self.ime} >/dev/null",
+                                         "sleep 0.5"]  # let the IME bind to the focused field
+        parts += [f"am broadcast -a ADB_INPUT_B64 --es msg {m} >/dev/null || exit 1" for m in msgs]
+        code, out = yield AdbCall(["shell", "; ".join(parts)], 5.0 + 2.0 * len(parts))
+        st["active"] = st["active"] or code == 0
+        return code, out
+
+    def _keys(self, text: str) -> Flow:
+        if len(text) < self.ime_min_chars and not _SEGMENTS.search(text):
+            code, out = yield AdbCall(["shell", "input", "text", _quoted(text)], 5.0 + self.key_sec * len(text))
+            return code, out
+        batch = InputBatch(stop_on_error=True)
+        for seg in filter(None, _SEGMENTS.split(text)):
+            if seg in _KEYCODES:
+                batch.keyevent(_KEYCODES[seg])
+                continue
+            for i in range(0, len(seg), self.chunk_chars):
+                batch.text(seg[i:i + self.chunk_chars])
+        res = yield from batch.flow(5.0 * len(batch.steps) + self.key_sec * len(text))
+        failed = next((s for s in res["steps"] if s["code"] not in (0, None)), None)
+        return res["code"], res["output"] or (f"{failed['label']} failed" if failed else "")
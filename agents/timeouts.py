@@ -0,0 +1,129 @@
+import json, os, pathlib, threading
+from typing import Any, Dict, Optional, Tuple
+from observability.metrics import Histogram
+
+# Call kinds whose duration depends on their content (multi-step input scripts)
+# rather than on the device; they keep the caller's budget
+FIXED_KINDS = {"script"}
+
+class AdaptiveTimeouts:
+    """Per-(device, command kind) timeouts learned from observed ADB latencies.
+
+    Once a key has `min_samples` successful calls, its timeout is
+    p99 x `factor`, clamped to [floor_sec, max_sec]; before that the
+    caller's static budget applies (devices differ too much to borrow
+    another device's distribution). A timeout under a learned value doubles that
+    key's multiplier (up to `max_backoff`) so slow devices get room instead
+    of repeated false timeouts; successes halve it again. Latencies persist
+    in `path` across runs (decayed by halving once a key exceeds `window`), one
+    file per ADB backend; mocked calls (MOCK_ADB=1) are never recorded.
+    """
+
+    def __init__(self, path: Optional[str] = None, factor: Optional[float] = None,
+                 floor_sec: Optional[float] = None, max_sec: Optional[float] = None,
+                 min_samples: Optional[int] = None, window: Optional[int] = None,
+                 max_backoff: float = 8.0):
+        self.enabled = os.getenv("ADAPTIVE_TIMEOUTS", "1") == "1"
+        self.backend = _backend()
+        self.path = pathlib.Path(path or os.getenv("ADAPTIVE_TIMEOUT_FILE", f"results/adb_latency_{self.backend}.json"))
+        self.factor = factor if factor is not None else float(os.getenv("ADAPTIVE_TIMEOUT_FACTOR", "3"))
+        self.floor_sec = floor_sec if floor_sec is not None else float(os.getenv("ADAPTIVE_TIMEOUT_FLOOR_SEC", "1"))
+        self.max_sec = max_sec if max_sec is not None else float(os.getenv("ADAPTIVE_TIMEOUT_MAX_SEC", "60"))
+        self.min_samples = min_samples if min_samples is not None else int(os.getenv("ADAPTIVE_TIMEOUT_MIN_SAMPLES", "20"))
+        self.window = window if window is not None else int(os.getenv("ADAPTIVE_TIMEOUT_WINDOW", "2000"))
+        self.max_backoff = max_backoff
+        self.tracer = None  # set by the runner so timeouts land in the trace
+        self._hist: Dict[Tuple[str, str], Histogram] = {}
+        self._backoff: Dict[Tuple[str, str], float] = {}
+        self._stats: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _load(self):
+        self._loaded = True
+        if self.backend == "mock":
+            return
+        try:
+            data = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            return
+        for key, d in data.get("latency", {}).items():
+            device, _, kind = key.partition("|")
+            self._hist.setdefault((device, kind), Histogram()).merge(Histogram.from_dict(d))
+
+    def _learned(self, device: str, kind: str) -> Optional[float]:
+        h = self._hist.get((device, kind))
+        if h is None or h.count < self.min_samples:
+            return None
+        t = h.quantile(0.99) * self.factor * self._backoff.get((device, kind), 1.0)
+        return round(min(self.max_sec, max(self.floor_sec, t)), 3)
+
+    def effective(self, kind: str, device: str, default: float) -> float:
+        """Timeout to use for one call (the static `default` until enough has been observed)"""
+        if not self.enabled or kind in FIXED_KINDS:
+            return default
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            return self._learned(device, kind) or default
+
+    def observe(self, kind: str, device: str, seconds: float, code: int, timeout_sec: float):
+        key = (device, kind)
+        with self._lock:
+            st = self._stats.setdefault(key, {"calls": 0, "timeouts": 0})
+            st["calls"] += 1
+            st["timeout_sec"] = timeout_sec
+            if self.backend == "mock":
+                return
+            if code != 124:
+                h = self._hist.setdefault(key, Histogram())
+                h.record(seconds)
+                if h.count > self.window:
+                    _halve(h)
+                if key in self._backoff:
+                    self._backoff[key] = max(1.0, self._backoff[key] / 2)
+                return
+            # Censored sample: the call took at least timeout_sec, so its latency is not recorded
+            st["timeouts"] += 1
+            learned = self._learned(device, kind) is not None
+            if learned:
+                self._backoff[key] = min(self.max_backoff, self._backoff.get(key, 1.0) * 2)
+        print(f"[timeouts] {device}: {kind} timed out after {timeout_sec}s{' (learned)' if learned else ''}")
+        if self.tracer is not None:
+            with self.tracer.span("adb.timeout", device=device, command=kind, timeout_sec=timeout_sec, learned=learned):
+                pass
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per device|kind: calls, timeouts, last applied and currently learned timeout, p99"""
+        out = {}
+        with self._lock:
+            for key, st in self._stats.items():
+                h = self._hist.get(key)
+                out["|".join(key)] = {**st, "learned_sec": self._learned(*key),
+                                      "p99_sec": round(h.quantile(0.99), 3) if h else None}
+        return out
+
+    def save(self):
+        """Persist latency histograms for the next run (merged with whatever the file held)"""
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            if not self._hist:
+                return
+            data = {"latency": {"|".join(k): h.to_dict() for k, h in self._hist.items()}}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(data))
+        os.replace(tmp, self.path)
+
+def _backend() -> str:
+    """Latencies aren't comparable across transports, and mocked ones aren't latencies at all"""
+    if os.getenv("MOCK_ADB") == "1":
+        return "mock"
+    return "socket" if os.getenv("ADB_BACKEND") == "socket" else "subprocess"
+
+def _halve(h: Histogram):
+    """Exponential decay: older observations count for half"""
+    h.counts = {i: n // 2 for i, n in h.counts.items() if n // 2}
+    h.sum_us //= 2
+    h.count = sum(h.counts.values())
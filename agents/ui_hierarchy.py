@@ -0,0 +1,195 @@
+import os, re, threading, time
+import xml.etree.ElementTree as ET
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from agents.flows import AdbCall, Flow
+from observability.metrics import metrics
+
+# Foreground window and display state; a changed key means the cached hierarchy is gone
+WINDOW_QUERY = "dumpsys window | grep -E 'mCurrentFocus=|mFocusedApp=|mRotation='"
+# One round trip: hierarchy XML, then the window key it belongs to. The dump file is
+# removed after reading so a failed dump can never return the previous screen.
+_DUMP_FILE = "/sdcard/qg_ui.xml"
+DUMP_QUERY = (f"uiautomator dump {_DUMP_FILE} >/dev/null; r=$?; cat {_DUMP_FILE}; rm -f {_DUMP_FILE}; "
+              f"{WINDOW_QUERY}; exit $r")
+
+_BOUNDS_RE = re.compile(r"\[(-?\d+),(-?\d+)\]\[(-?\d+),(-?\d+)\]")
+_XML_RE = re.compile(r"<\?xml.*?</hierarchy>|<hierarchy.*?</hierarchy>", re.S)
+
+# Command kinds that can change what is on screen. Navigation (new activity,
+# back, home) and anything that can move content within the same window (a
+# swipe, or an on-device script, which may hold swipes: scroll, batched
+# sequence steps) drop the device's entry, since the window key can't tell a
+# scrolled list from the original. Other input only marks it stale, and a
+# stale entry is reused if the window key is unchanged and the selector still
+# resolves (one cheap dumpsys instead of a 1-3 s uiautomator dump).
+SCREEN_KINDS = {"am start", "am start -W", "monkey", "input keyevent", "cmd statusbar", "input swipe", "script"}
+CONTENT_KINDS = {"input tap", "input text", "input", "am broadcast"}
+
+class UiNode(NamedTuple):
+    text: str
+    resource_id: str
+    desc: str
+    cls: str
+    bounds: Tuple[int, int, int, int]
+    clickable: bool
+    enabled: bool
+
+    @property
+    def center(self) -> Tuple[int, int]:
+        x1, y1, x2, y2 = self.bounds
+        return (x1 + x2) // 2, (y1 + y2) // 2
+
+class UiIndex:
+    """Nodes of one hierarchy dump, indexed by text, resource-id and content-desc"""
+
+    def __init__(self, nodes: List[UiNode]):
+        self.nodes = nodes
+        self.by_text: Dict[str, List[UiNode]] = {}
+        self.by_id: Dict[str, List[UiNode]] = {}
+        self.by_desc: Dict[str, List[UiNode]] = {}
+        for n in nodes:
+            if n.text:
+                self.by_text.setdefault(n.text.casefold(), []).append(n)
+            if n.resource_id:
+                self.by_id.setdefault(n.resource_id, []).append(n)
+                # "com.android.settings:id/search" is also reachable as "search"
+                self.by_id.setdefault(n.resource_id.rpartition(":id/")[2], []).append(n)
+            if n.desc:
+                self.by_desc.setdefault(n.desc.casefold(), []).append(n)
+
+    def find(self, selector: Dict[str, Any]) -> Optional[UiNode]:
+        """First match for {"text" | "id" | "desc": value[, "index": n]}: exact (case-insensitive)
+        before substring for text/desc, enabled+clickable nodes before the rest"""
+        if "id" in selector:
+            found = self.by_id.get(str(selector["id"]), [])
+        else:
+            field = "text" if "text" in selector else "desc"
+            table = self.by_text if field == "text" else self.by_desc
+            want = str(selector[field]).casefold()
+            found = table.get(want) or [n for key, ns in table.items() if want in key for n in ns]
+        found = sorted(found, key=lambda n: not (n.clickable and n.enabled))
+        i = int(selector.get("index", 0))
+        return found[i] if 0 <= i < len(found) else None
+
+def parse_hierarchy(xml: str) -> UiIndex:
+    """uiautomator dump XML -> UiIndex (nodes without bounds are skipped)"""
+    nodes = []
+    for el in ET.fromstring(xml).iter("node"):
+        m = _BOUNDS_RE.fullmatch(el.get("bounds", ""))
+        if not m:
+            continue
+        nodes.append(UiNode(el.get("text", ""), el.get("resource-id", ""), el.get("content-desc", ""),
+                            el.get("class", ""), tuple(int(v) for v in m.groups()),
+                            el.get("clickable") == "true", el.get("enabled", "true") == "true"))
+    return UiIndex(nodes)
+
+def describe(selector: Dict[str, Any]) -> str:
+    return ", ".join(f"{k}={selector[k]!r}" for k in ("text", "id", "desc") if k in selector)
+
+class UiHierarchyCache:
+    """Per-device cache of parsed UI hierarchies for element-targeted actions.
+
+    An entry holds the index of the last dump and the window key (focused
+    activity, rotation) it was taken under. Lookups on a fresh entry cost no
+    ADB call. After input that may have changed the content (tap, text) the
+    entry is stale: the next lookup checks the window key and reuses the
+    index if the key matches and the selector resolves, and dumps otherwise.
+    Navigation, swipes and input scripts drop the entry. Entries older than UI_CACHE_TTL_SEC are
+    treated as stale; UI_CACHE_STRICT=1 re-dumps whenever an entry is stale.
+    """
+
+    def __init__(self, ttl_sec: Optional[float] = None, strict: Optional[bool] = None):
+        self.ttl_sec = ttl_sec if ttl_sec is not None else float(os.getenv("UI_CACHE_TTL_SEC", "30"))
+        self.strict = strict if strict is not None else os.getenv("UI_CACHE_STRICT", "0") == "1"
+        self.lookups = {"hit": 0, "revalidated": 0, "miss": 0}
+        self.dumps = 0
+        self.dump_failures = 0
+        self.dump_sec = 0.0
+        self.invalidations = 0
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, kind: str, device: str):
+        """Called for every ADB call (executor._record_adb): invalidate on screen-changing commands"""
+        if kind in SCREEN_KINDS:
+            with self._lock:
+                if self._entries.pop(device, None) is not None:
+                    self.invalidations += 1
+        elif kind in CONTENT_KINDS:
+            with self._lock:
+                e = self._entries.get(device)
+                if e is not None and not e["stale"]:
+                    e["stale"] = True
+                    self.invalidations += 1
+
+    def invalidate(self, device: Optional[str] = None):
+        """Forget one device's hierarchy (or every device's)"""
+        with self._lock:
+            if device is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(device, None)
+
+    def _dump(self, device: str) -> Flow:
+        t = time.perf_counter()
+        code, out = yield AdbCall(["shell", DUMP_QUERY], 15.0)
+        seconds = time.perf_counter() - t
+        self.dumps += 1
+        self.dump_sec += seconds
+        metrics.observe("ui_dump_seconds", seconds, device=device)
+        m = _XML_RE.search(out or "")
+        try:
+            index = parse_hierarchy(m.group()) if code == 0 and m else None
+        except ET.ParseError:
+            index = None
+        if index is None:
+            self.dump_failures += 1
+            return None
+        entry = {"index": index, "key": _XML_RE.sub("", out).strip(), "at": time.monotonic(), "stale": False}
+        with self._lock:
+            self._entries[device] = entry
+        return entry
+
+    def find_flow(self, device: str, selector: Dict[str, Any]) -> Flow:
+        """Resolve a selector to a UiNode (None if it isn't on screen), dumping only when needed"""
+        with self._lock:
+            entry = self._entries.get(device)
+        if entry is not None and time.monotonic() - entry["at"] >= self.ttl_sec:
+            entry["stale"] = True
+        if entry is not None and not entry["stale"]:
+            node = entry["index"].find(selector)
+            if node is not None:
+                self._count("hit")
+                return node
+        elif entry is not None and not self.strict:
+            # Stale: worth a window-key check only if the old screen has the element
+            node = entry["index"].find(selector)
+            if node is not None:
+                code, out = yield AdbCall(["shell", WINDOW_QUERY], 5.0)
+                if code in (0, 1) and (out or "").strip() == entry["key"]:
+                    entry["stale"] = False
+                    entry["at"] = time.monotonic()
+                    self._count("revalidated")
+                    return node
+        self._count("miss")
+        entry = yield from self._dump(device)
+        return entry["index"].find(selector) if entry else None
+
+    def _count(self, outcome: str):
+        with self._lock:
+            self.lookups[outcome] += 1
+        metrics.inc("ui_cache_lookups_total", outcome=outcome)
+
+    def stats(self) -> Dict[str, Any]:
+        n = self.lookups
+        total = sum(n.values())
+        return {
+            "hits": n["hit"],
+            "revalidated": n["revalidated"],
+            "misses": n["miss"],
+            "hit_rate": round((n["hit"] + n["revalidated"]) / total, 3) if total else 0.0,
+            "dumps": self.dumps,
+            "dump_failures": self.dump_failures,
+            "dump_avg_ms": round(1000 * self.dump_sec / self.dumps, 1) if self.dumps else 0.0,
+            "invalidations": self.invalidations,
+        }
@@ -4,6 +4,14 @@ EPISODES=${1:-10}
 PROMPT="${2:-search for qualgent test}"
 RETRIES=${RETRIES:-1}
 
+# A runner service (agents/runner.py --serve) is already attached to the devices:
+# submit the job and stream its records back
+if [ -n "${RUNNER_URL:-}" ]; then
+  echo "[evaluate] Submitting $EPISODES episodes to $RUNNER_URL"
+  body=$(python3 -c 'import json,sys; print(json.dumps({"prompt": sys.argv[1], "episodes": int(sys.argv[2])}))' "$PROMPT" "$EPISODES")
+  exec curl -sSN --fail-with-body -X POST "$RUNNER_URL/jobs?stream=1" -H 'Content-Type: application/json' -d "$body"
+fi
+
 # Check if we're in mock mode first
 if [ "${MOCK_ADB:-}" = "1" ]; then
   echo "[evaluate] Running in MOCK_ADB mode - skipping real device connection"
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Demand-driven autoscaler: turns runner backlog signals into a desired device
+pool size and runner replica count.
+
+Runners export (METRICS_PORT, /metrics.json) queue_depth, inflight_episodes,
+devices_total and devices_busy gauges plus queue_wait_seconds and
+episode_seconds histograms. Each cycle the autoscaler scrapes and merges them,
+reduces them to a signal sample (see signals()) and decides:
+
+    devices = busy / TARGET_UTILIZATION                  (headroom over work in flight)
+            + backlog x mean episode time / DRAIN_SEC    (drain the queue in time)
+    raised to devices x p95 queue wait / QUEUE_WAIT_SLO  (latency SLO missed)
+    runners = devices / DEVICES_PER_RUNNER
+
+Scale-up is immediate (at most x MAX_SCALE_UP per cycle); scale-down takes the
+highest recommendation of the last SCALE_DOWN_WINDOW_SEC, like the HPA. The
+desired device count goes to --demand-file (read by pool_controller.py) and
+both numbers are served on --port as autoscaler_desired_* gauges for a
+custom-metrics HPA (k8s/runner-hpa.yaml).
+
+Samples can be recorded (--record) and replayed (--replay) offline; Autoscaler
+itself only sees samples and timestamps, so traces drive it deterministically.
+"""
+
+import argparse, json, math, os, pathlib, socket, sys, time, urllib.request
+from collections import deque
+from typing import Any, Dict, Iterator, List, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from observability.metrics import Histogram, Metrics, merge_snapshots, start_http_server
+from infra.pool_controller import write_atomic
+
+def _window(cur: Histogram, prev: Optional[Histogram]) -> Histogram:
+    """Observations recorded since `prev` (bucket-count difference of cumulative histograms)"""
+    if prev is None or prev.count > cur.count:
+        return cur  # first scrape, or a runner restarted
+    out = Histogram()
+    for i, n in cur.counts.items():
+        d = n - prev.counts.get(i, 0)
+        if d > 0:
+            out.counts[i] = d
+    out.count = cur.count - prev.count
+    out.sum_us = cur.sum_us - prev.sum_us
+    out.max_us = cur.max_us
+    return out
+
+def signals(cur: Metrics, prev: Optional[Metrics] = None, dt: float = 0.0) -> Dict[str, float]:
+    """One autoscaling sample from merged runner metrics; latency signals cover the last `dt` seconds"""
+    episodes = _window(cur.histogram("episode_seconds"), prev.histogram("episode_seconds") if prev else None)
+    waits = _window(cur.histogram("queue_wait_seconds"), prev.histogram("queue_wait_seconds") if prev else None)
+    total, busy = cur.gauge_total("devices_total"), cur.gauge_total("devices_busy")
+    return {
+        "queue_depth": cur.gauge_total("queue_depth"),
+        "inflight": cur.gauge_total("inflight_episodes"),
+        "devices": total,
+        "busy": busy,
+        "utilization": round(busy / total, 3) if total else 0.0,
+        "episode_mean_sec": round(episodes.sum_us / episodes.count / 1e6, 3) if episodes.count else 0.0,
+        "episode_p95_sec": round(episodes.quantile(0.95), 3),
+        "queue_wait_p95_sec": round(waits.quantile(0.95), 3),
+        "completed_per_sec": round(episodes.count / dt, 3) if dt > 0 else 0.0,
+    }
+
+class Autoscaler:
+    """Desired devices/runners from signal samples (pure: no I/O, time passed in)"""
+
+    def __init__(self, target_utilization: float = 0.75, drain_sec: float = 300.0,
+                 queue_wait_slo_sec: Optional[float] = 60.0, devices_per_runner: int = 4,
+                 min_devices: int = 1, max_devices: int = 20, min_runners: int = 1, max_runners: int = 10,
+                 max_scale_up: float = 2.0, scale_down_window_sec: float = 300.0,
+                 default_episode_sec: float = 30.0):
+        self.target_utilization = target_utilization
+        self.drain_sec = drain_sec
+        self.queue_wait_slo_sec = queue_wait_slo_sec
+        self.devices_per_runner = devices_per_runner
+        self.min_devices, self.max_devices = min_devices, max_devices
+        self.min_runners, self.max_runners = min_runners, max_runners
+        self.max_scale_up = max_scale_up
+        self.scale_down_window_sec = scale_down_window_sec
+        self.default_episode_sec = default_episode_sec
+        self.episode_sec = default_episode_sec  # last observed mean, kept while nothing completes
+        self.current: Optional[int] = None
+        self._recent: deque = deque()  # (t, recommendation)
+
+    @classmethod
+    def from_env(cls, **overrides) -> "Autoscaler":
+        env = {
+            "target_utilization": float(os.getenv("TARGET_UTILIZATION", "0.75")),
+            "drain_sec": float(os.getenv("DRAIN_SEC", "300")),
+            "queue_wait_slo_sec": float(os.getenv("QUEUE_WAIT_SLO_SEC", "60")) or None,
+            "devices_per_runner": int(os.getenv("DEVICES_PER_RUNNER", "4")),
+            "min_devices": int(os.getenv("POOL_MIN", "1")),
+            "max_devices": int(os.getenv("POOL_MAX", "20")),
+            "min_runners": int(os.getenv("RUNNERS_MIN", "1")),
+            "max_runners": int(os.getenv("RUNNERS_MAX", "10")),
+            "max_scale_up": float(os.getenv("MAX_SCALE_UP", "2")),
+            "scale_down_window_sec": float(os.getenv("SCALE_DOWN_WINDOW_SEC", "300")),
+        }
+        return cls(**{**env, **overrides})
+
+    def recommend(self, s: Dict[str, float]) -> Dict[str, Any]:
+        """Raw recommendation for one sample, before stabilization"""
+        if s.get("episode_mean_sec"):
+            self.episode_sec = s["episode_mean_sec"]
+        for_work = math.ceil(s["busy"] / self.target_utilization) if s["busy"] else 0
+        for_backlog = math.ceil(s["queue_depth"] * self.episode_sec / self.drain_sec) if s["queue_depth"] else 0
+        devices, reason = for_work + for_backlog, "utilization" if not for_backlog else "backlog"
+        wait = s.get("queue_wait_p95_sec", 0.0)
+        if self.queue_wait_slo_sec and wait > self.queue_wait_slo_sec and s["queue_depth"]:
+            for_slo = math.ceil(max(1.0, s["devices"]) * wait / self.queue_wait_slo_sec)
+            if for_slo > devices:
+                devices, reason = for_slo, "queue wait SLO"
+        return {"devices": devices, "reason": reason}
+
+    def step(self, s: Dict[str, float], now: float) -> Dict[str, Any]:
+        """Decision for one sample at time `now` (seconds, any monotonic origin)"""
+        rec = self.recommend(s)
+        want = max(self.min_devices, min(self.max_devices, rec["devices"]))
+        self._recent.append((now, want))
+        while self._recent and self._recent[0][0] < now - self.scale_down_window_sec:
+            self._recent.popleft()
+        current = self.current if self.current is not None else max(self.min_devices, int(s["devices"]))
+        if want > current:
+            cap = max(current + 1, math.ceil(current * self.max_scale_up))
+            devices = min(want, cap)
+        else:
+            # Scale down only as far as every recommendation in the window allows
+            devices = min(current, max(w for _, w in self._recent))
+        self.current = devices
+        runners = math.ceil(devices / self.devices_per_runner)
+        if devices > current:
+            reason = rec["reason"]
+        elif devices < current:
+            reason = "scale down"
+        else:
+            reason = "steady" if want == current else "stabilizing"
+        return {
+            "devices": devices,
+            "runners": max(self.min_runners, min(self.max_runners, runners)),
+            "recommended": want,
+            "reason": reason,
+        }
+
+def expand_targets(targets: List[str]) -> List[str]:
+    """Scrape URLs; "dns+HOST:PORT" expands to every address HOST resolves to (headless service)"""
+    urls = []
+    for t in targets:
+        if t.startswith("dns+"):
+            host, _, port = t[4:].rpartition(":")
+            addrs = sorted({ai[4][0] for ai in socket.getaddrinfo(host, int(port), proto=socket.IPPROTO_TCP)})
+            urls += [f"http://{a}:{port}/metrics.json" for a in addrs]
+        else:
+            urls.append(t if "://" in t else f"http://{t}/metrics.json")
+    return urls
+
+def scrape(targets: List[str], timeout_sec: float = 5.0) -> Metrics:
+    """Merged /metrics.json of every reachable runner"""
+    snaps = []
+    for url in expand_targets(targets):
+        try:
+            with urllib.request.urlopen(url, timeout=timeout_sec) as r:
+                snaps.append(json.load(r))
+        except (OSError, ValueError) as e:
+            print(f"[autoscaler] scrape {url} failed: {e}")
+    return merge_snapshots(snaps)
+
+def read_trace(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def replay(scaler: Autoscaler, samples: Iterator[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Decisions for a recorded trace (each sample carries its own "t")"""
+    return [{"t": s["t"], **scaler.step(s, s["t"])} for s in samples]
+
+def main():
+    ap = argparse.ArgumentParser(description="Scale devices and runners on backlog, utilization and queue-wait SLO")
+    ap.add_argument("--scrape", action="append", default=[], metavar="TARGET",
+                    help="Runner metrics endpoint: HOST:PORT, URL, or dns+SERVICE:PORT (repeatable)")
+    ap.add_argument("--interval", type=float, default=15.0)
+    ap.add_argument("--demand-file", default=None, help="Write the desired device count here (pool_controller.py --demand-file)")
+    ap.add_argument("--port", type=int, default=None, help="Serve autoscaler_desired_* gauges on this port")
+    ap.add_argument("--record", default=None, help="Append each signal sample to this JSONL trace")
+    ap.add_argument("--replay", default=None, help="Print decisions for a recorded trace and exit")
+    ap.add_argument("--once", action="store_true")
+    args = ap.parse_args()
+
+    scaler = Autoscaler.from_env()
+    if args.replay:
+        for d in replay(scaler, read_trace(args.replay)):
+            print(json.dumps(d))
+        return 0
+    if not args.scrape:
+        ap.error("--scrape is required (or --replay)")
+
+    out = Metrics()
+    if args.port:
+        start_http_server(args.port, registry=out, host=os.getenv("METRICS_HOST", "127.0.0.1"))
+    prev, prev_t, t0 = None, None, time.monotonic()
+    while True:
+        now = time.monotonic()
+        cur = scrape(args.scrape)
+        s = signals(cur, prev, now - prev_t if prev_t else 0.0)
+        prev, prev_t = cur, now
+        d = scaler.step(s, now)
+        if args.record:
+            with open(args.record, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"t": round(now - t0, 3), **s}) + "\n")
+        if args.demand_file:
+            write_atomic(pathlib.Path(args.demand_file), f"{d['devices']}\n")
+        for k, v in s.items():
+            out.set(f"autoscaler_signal_{k}", v)
+        out.set("autoscaler_desired_devices", d["devices"])
+        out.set("autoscaler_desired_runners", d["runners"])
+        print(f"[autoscaler] queue={s['queue_depth']:g} busy={s['busy']:g}/{s['devices']:g} "
+              f"wait p95={s['queue_wait_p95_sec']}s -> devices={d['devices']} runners={d['runners']} ({d['reason']})")
+        if args.once:
+            return 0
+        time.sleep(args.interval)
+
+if __name__ == "__main__":
+    sys.exit(main())
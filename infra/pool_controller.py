@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Device-pool controller: keeps `demand + warm` Genymotion devices ready.
+
+Each cycle makes one `gmsaas instances list` call, then in parallel: opens ADB
+tunnels for devices that came ONLINE, probes ready devices, starts devices
+for any shortfall and stops recycled or surplus ones. Devices are recycled
+after --max-episodes episodes (counted from results/*.jsonl records' "device")
+or --health-failures failed probes in a row. infra/adb_tunnels.txt and
+infra/instances.txt are rewritten atomically, so runners never read a
+half-written pool. While anything is booting the controller polls every
+--fast-interval seconds, otherwise every POLL_INTERVAL_SEC.
+
+    python3 infra/pool_controller.py --demand 4 --warm 2           # loop
+    python3 infra/pool_controller.py --demand-file infra/demand --once
+    GMSAAS="python3 loadtest/fake_gmsaas.py" python3 infra/pool_controller.py --demand 2 --health-failures 0
+"""
+
+import argparse, json, os, pathlib, shlex, subprocess, sys, time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+INFRA = pathlib.Path(__file__).resolve().parent
+READY_STATES = ("ONLINE", "RUNNING", "ON")
+BOOTING_STATES = ("CREATING", "STARTING", "BOOTING", "CREATED")
+
+class GmsaasError(RuntimeError):
+    """gmsaas exited non-zero or printed something other than JSON"""
+
+class Gmsaas:
+    """Thin JSON wrapper over the gmsaas CLI ($GMSAAS overrides the command, e.g. the offline stub)"""
+
+    def __init__(self, command: Optional[str] = None, timeout_sec: float = 120.0):
+        self.command = shlex.split(command or os.getenv("GMSAAS", "gmsaas"))
+        self.timeout_sec = timeout_sec
+
+    def _run(self, *args: str) -> Dict[str, Any]:
+        try:
+            p = subprocess.run([*self.command, *args], capture_output=True, text=True, timeout=self.timeout_sec)
+        except subprocess.TimeoutExpired:
+            raise GmsaasError(f"gmsaas {' '.join(args)} timed out")
+        try:
+            data = json.loads(p.stdout or "{}")
+        except ValueError:
+            raise GmsaasError(f"gmsaas {' '.join(args)}: {(p.stdout or p.stderr).strip()[-200:]}")
+        if p.returncode != 0:
+            raise GmsaasError(f"gmsaas {' '.join(args)}: {data.get('error', {}).get('message') or p.stderr.strip()[-200:]}")
+        return data
+
+    def list(self) -> List[Dict[str, Any]]:
+        data = self._run("instances", "list")
+        return data.get("instances") or data.get("vms") or []
+
+    def start(self, template: str, name: str) -> Dict[str, Any]:
+        return self._run("instances", "start", template, name).get("instance", {})
+
+    def adbconnect(self, uuid: str) -> str:
+        inst = self._run("instances", "adbconnect", uuid).get("instance", {})
+        return inst.get("adb_serial") or inst.get("adb_serial_port") or ""
+
+    def stop(self, uuid: str):
+        self._run("instances", "stop", uuid)
+
+def write_atomic(path: pathlib.Path, text: str):
+    """Replace `path` in one rename so readers see the old or the new file, never a partial one"""
+    tmp = path.with_name(f".{path.name}.tmp")
+    with open(tmp, "w") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+class EpisodeCounter:
+    """Episodes per device serial, read incrementally from results/*.jsonl"""
+
+    def __init__(self, results_dir: pathlib.Path, offsets: Optional[Dict[str, int]] = None):
+        self.results_dir = results_dir
+        self.offsets: Dict[str, int] = dict(offsets or {})
+
+    def scan(self) -> Dict[str, int]:
+        """Count records appended since the last scan; returns the new counts per serial"""
+        new: Dict[str, int] = {}
+        for path in sorted(self.results_dir.glob("*.jsonl")):
+            key = str(path)
+            start = self.offsets.get(key, 0)
+            if path.stat().st_size < start:
+                start = 0  # file was rewritten
+            with open(path, "rb") as f:
+                f.seek(start)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # torn tail of an in-flight write; read it next cycle
+                    start += len(line)
+                    try:
+                        dev = json.loads(line).get("device")
+                    except ValueError:
+                        continue
+                    if dev:
+                        new[dev] = new.get(dev, 0) + 1
+            self.offsets[key] = start
+        return new
+
+class PoolController:
+    """Reconciles the device pool towards clamp(demand + warm, min_size, max_size).
+
+    Per-device bookkeeping (episodes run, consecutive failed probes) and the
+    results-file offsets are kept in infra/pool_state.json so --once runs
+    (e.g. from a CronJob) pick up where the last one stopped.
+    """
+
+    def __init__(self, gm: Gmsaas, template: str, prefix: str = "pool-runner", warm: int = 1,
+                 min_size: int = 0, max_size: int = 20, max_episodes: int = 0, health_failures: int = 3,
+                 probe: Optional[Callable[[str], bool]] = None, infra_dir: pathlib.Path = INFRA,
+                 results_dir: pathlib.Path = pathlib.Path("results"), workers: int = 8):
+        self.gm = gm
+        self.template = template
+        self.prefix = prefix
+        self.warm = warm
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_episodes = max_episodes
+        self.health_failures = health_failures
+        self.probe = probe
+        self.infra_dir = infra_dir
+        self.state_path = infra_dir / "pool_state.json"
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        state = json.loads(self.state_path.read_text()) if self.state_path.is_file() else {}
+        self.devices: Dict[str, Dict[str, Any]] = state.get("devices", {})
+        self.episodes = EpisodeCounter(results_dir, state.get("offsets"))
+        self._seq = state.get("seq", 0)
+
+    def _save(self):
+        write_atomic(self.state_path, json.dumps(
+            {"devices": self.devices, "offsets": self.episodes.offsets, "seq": self._seq}, indent=2))
+
+    def _name(self) -> str:
+        self._seq += 1
+        return f"{self.prefix}-{int(time.time())}-{self._seq}"
+
+    def _parallel(self, fn: Callable, items: List[Any]) -> List[Any]:
+        """fn over items on the worker pool; exceptions are returned, not raised"""
+        def safe(item):
+            try:
+                return fn(item)
+            except Exception as e:
+                return e
+        return list(self.pool.map(safe, items))
+
+    def target(self, demand: int) -> int:
+        return max(self.min_size, min(self.max_size, demand + self.warm))
+
+    def reconcile(self, demand: int) -> Dict[str, Any]:
+        """One control cycle; returns what it saw and did"""
+        ours = [i for i in self.gm.list() if (i.get("name") or "").startswith(self.prefix)]
+        state = {i["uuid"]: (i.get("state") or i.get("status") or "UNKNOWN").upper() for i in ours if i.get("uuid")}
+        for uuid in list(self.devices):
+            if uuid not in state:
+                del self.devices[uuid]  # stopped elsewhere or deleted
+        for inst in ours:
+            dev = self.devices.setdefault(inst["uuid"], {"name": inst.get("name"), "serial": "",
+                                                         "episodes": 0, "health_failures": 0})
+            dev["created_at"] = inst.get("created_at", "")
+
+        # Tunnels for devices that just came online
+        connect = [u for u, s in state.items() if s in READY_STATES and not self.devices[u]["serial"]]
+        for uuid, res in zip(connect, self._parallel(self.gm.adbconnect, connect)):
+            if isinstance(res, Exception) or not res:
+                print(f"[pool] adbconnect {uuid} failed: {res or 'no serial'}")
+            else:
+                self.devices[uuid]["serial"] = res
+        ready = [u for u, s in state.items() if s in READY_STATES and self.devices[u]["serial"]]
+
+        # Usage and health of ready devices
+        by_serial = {self.devices[u]["serial"]: u for u in ready}
+        for serial, n in self.episodes.scan().items():
+            if serial in by_serial:
+                self.devices[by_serial[serial]]["episodes"] += n
+        if self.probe is not None and self.health_failures > 0:
+            for uuid, ok in zip(ready, self._parallel(lambda u: self.probe(self.devices[u]["serial"]), ready)):
+                dev = self.devices[uuid]
+                dev["health_failures"] = 0 if ok is True else dev["health_failures"] + 1
+
+        recycle = [u for u in ready if
+                   (self.max_episodes and self.devices[u]["episodes"] >= self.max_episodes) or
+                   (self.health_failures and self.devices[u]["health_failures"] >= self.health_failures)]
+        failed = [u for u, s in state.items() if s not in READY_STATES and s not in BOOTING_STATES]
+        ready = [u for u in ready if u not in recycle]
+        booting = [u for u, s in state.items() if s in BOOTING_STATES or (s in READY_STATES and u not in ready + recycle)]
+
+        # Scale: replacements for recycled devices start in the same cycle
+        want = self.target(demand)
+        surplus = []
+        if len(ready) > want and not booting:
+            # Most-used first, so the pool turns over instead of aging one device
+            surplus = sorted(ready, key=lambda u: -self.devices[u]["episodes"])[:len(ready) - want]
+            ready = [u for u in ready if u not in surplus]
+        n_start = max(0, want - len(ready) - len(booting))
+        stop = recycle + surplus + failed
+        started = [r for r in self._parallel(lambda name: self.gm.start(self.template, name),
+                                             [self._name() for _ in range(n_start)])
+                   if not isinstance(r, Exception) and r.get("uuid")]
+        for uuid, res in zip(stop, self._parallel(self.gm.stop, stop)):
+            if isinstance(res, Exception):
+                print(f"[pool] stop {uuid} failed: {res}")
+            self.devices.pop(uuid, None)
+        for inst in started:
+            self.devices[inst["uuid"]] = {"name": inst.get("name"), "serial": "", "episodes": 0,
+                                          "health_failures": 0, "created_at": inst.get("created_at", "")}
+
+        self.write_pool(ready)
+        self._save()
+        return {"demand": demand, "target": want, "ready": len(ready), "booting": len(booting) + len(started),
+                "started": len(started), "recycled": len(recycle), "surplus": len(surplus), "failed": len(failed)}
+
+    def write_pool(self, ready: List[str]):
+        """adb_tunnels.txt ("UUID HOST:PORT" per ready device) and instances.txt, oldest first"""
+        ready = sorted(ready, key=lambda u: self.devices[u].get("created_at", ""))
+        write_atomic(self.infra_dir / "adb_tunnels.txt", "".join(f"{u} {self.devices[u]['serial']}\n" for u in ready))
+        write_atomic(self.infra_dir / "instances.txt", "".join(f"{u}\n" for u in self.devices))
+
+    def run(self, demand: Callable[[], int], interval: float, fast_interval: float, once: bool = False):
+        while True:
+            try:
+                st = self.reconcile(demand())
+                print(f"[pool] demand={st['demand']} target={st['target']} ready={st['ready']} "
+                      f"booting={st['booting']} started={st['started']} recycled={st['recycled']} "
+                      f"surplus={st['surplus']} failed={st['failed']}")
+            except GmsaasError as e:
+                print(f"[pool] {e}")
+                st = {"booting": 0}
+            if once:
+                return st
+            time.sleep(fast_interval if st["booting"] else interval)
+
+def demand_source(args) -> Callable[[], int]:
+    """Current demand: --demand, or re-read from --demand-file every cycle"""
+    if args.demand_file:
+        def read() -> int:
+            try:
+                return int(pathlib.Path(args.demand_file).read_text().strip() or 0)
+            except (OSError, ValueError):
+                return args.demand
+        return read
+    return lambda: args.demand
+
+def main():
+    ap = argparse.ArgumentParser(description="Keep a warm pool of ready Genymotion devices")
+    ap.add_argument("--demand", type=int, default=int(os.getenv("DESIRED", "1")), help="Devices in use / needed now")
+    ap.add_argument("--demand-file", default=None, help="File holding the current demand, re-read every cycle")
+    ap.add_argument("--warm", type=int, default=int(os.getenv("POOL_WARM", "1")), help="Ready devices kept above demand")
+    ap.add_argument("--min", dest="min_size", type=int, default=int(os.getenv("POOL_MIN", "0")))
+    ap.add_argument("--max", dest="max_size", type=int, default=int(os.getenv("POOL_MAX", "20")))
+    ap.add_argument("--max-episodes", type=int, default=int(os.getenv("POOL_MAX_EPISODES", "0")),
+                    help="Recycle a device after this many episodes (0 = never)")
+    ap.add_argument("--health-failures", type=int, default=int(os.getenv("POOL_HEALTH_FAILURES", "3")),
+                    help="Recycle after this many failed probes in a row (0 = don't probe)")
+    ap.add_argument("--interval", type=float, default=float(os.getenv("POLL_INTERVAL_SEC", "5")))
+    ap.add_argument("--fast-interval", type=float, default=1.0, help="Poll interval while devices are booting")
+    ap.add_argument("--prefix", default=os.getenv("NAME_PREFIX", "pool-runner"))
+    ap.add_argument("--template", default=os.getenv("GM_TEMPLATE", "53d71621-b0b8-4e5a-8cea-0055ea98988f"))
+    ap.add_argument("--infra-dir", default=str(INFRA), help="Where adb_tunnels.txt, instances.txt and pool_state.json live")
+    ap.add_argument("--once", action="store_true", help="Run a single reconcile cycle and exit")
+    args = ap.parse_args()
+
+    probe = None
+    if args.health_failures > 0:
+        from agents.executor import adb_healthcheck
+        probe = adb_healthcheck
+    ctl = PoolController(Gmsaas(), args.template, args.prefix, args.warm, args.min_size, args.max_size,
+                         args.max_episodes, args.health_failures, probe, pathlib.Path(args.infra_dir))
+    try:
+        ctl.run(demand_source(args), args.interval, args.fast_interval, once=args.once)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
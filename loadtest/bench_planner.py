@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Planner throughput benchmark: prompt -> (task, params) for N prompts (default 1M),
+uncached vs. memoized, plus validation and --prompts-file ingestion.
+"""
+
+import argparse, json, os, random, sys, tempfile, time
+from typing import Dict, Any, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from agents.prompt_to_task import _plan, plan_from_prompt, planner_cache_info, validate_plan, iter_prompt_file
+
+TEMPLATES = [
+    "search for {w}", "open settings", "scroll down {n} times", "take {n} screenshots",
+    "open app com.example.{w}/.MainActivity", "open url https://example.com/{w}", "tap {x} {y}",
+    "swipe {x} {y} {x} {y}", "type {w} {w}", "go home", "back", "recents", "notifications",
+    "wifi on", "wifi off", "{w} {w} {w}",
+]
+WORDS = ["qualgent", "android", "agent", "latency", "device", "pixel", "settings", "test"]
+
+def make_prompts(n: int, distinct: int, seed: int = 7) -> List[str]:
+    """n prompts drawn from `distinct` unique ones (realistic batches repeat prompts)"""
+    rnd = random.Random(seed)
+    pool = [rnd.choice(TEMPLATES).format(w=rnd.choice(WORDS), n=rnd.randint(1, 9),
+                                         x=rnd.randint(10, 1080), y=rnd.randint(10, 2400))
+            for _ in range(distinct)]
+    return [rnd.choice(pool) for _ in range(n)]
+
+def rate(n: int, sec: float) -> float:
+    return round(n / sec) if sec > 0 else 0.0
+
+def bench(n: int, distinct: int) -> Dict[str, Any]:
+    prompts = make_prompts(n, distinct)
+    uncached = _plan.__wrapped__
+
+    t0 = time.perf_counter()
+    for p in prompts:
+        uncached(p)
+    t_uncached = time.perf_counter() - t0
+
+    _plan.cache_clear()
+    t0 = time.perf_counter()
+    plans = [plan_from_prompt(p) for p in prompts]
+    t_cached = time.perf_counter() - t0
+    info = planner_cache_info()
+
+    t0 = time.perf_counter()
+    for task, params in plans:
+        validate_plan(task, params)
+    t_validate = time.perf_counter() - t0
+
+    with tempfile.NamedTemporaryFile("w", suffix=".jsonl", delete=False) as f:
+        for p in prompts:
+            f.write(json.dumps({"prompt": p}) + "\n")
+    try:
+        t0 = time.perf_counter()
+        valid = sum(1 for _, _, plan, _ in iter_prompt_file(f.name) if plan)
+        t_file = time.perf_counter() - t0
+    finally:
+        os.unlink(f.name)
+
+    return {
+        "prompts": n,
+        "distinct_prompts": distinct,
+        "uncached_per_sec": rate(n, t_uncached),
+        "cached_per_sec": rate(n, t_cached),
+        "cache_hit_rate": round(info.hits / max(1, info.hits + info.misses), 4),
+        "validate_per_sec": rate(n, t_validate),
+        "file_ingest_per_sec": rate(n, t_file),
+        "file_valid": valid,
+    }
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark prompt planning throughput")
+    ap.add_argument("--prompts", type=int, default=1_000_000)
+    ap.add_argument("--distinct", type=int, default=2000, help="Unique prompts in the mix")
+    ap.add_argument("--json", dest="json_path", default=None, help="Write results as JSON")
+    args = ap.parse_args()
+
+    res = bench(args.prompts, args.distinct)
+    print(f"[bench] {res['prompts']} prompts ({res['distinct_prompts']} distinct)")
+    print(f"[bench] planner uncached: {res['uncached_per_sec']:>12,.0f} prompts/s")
+    print(f"[bench] planner cached:   {res['cached_per_sec']:>12,.0f} prompts/s (hit rate {res['cache_hit_rate']:.1%})")
+    print(f"[bench] validate:         {res['validate_per_sec']:>12,.0f} plans/s")
+    print(f"[bench] JSONL ingest:     {res['file_ingest_per_sec']:>12,.0f} lines/s ({res['file_valid']} valid)")
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(res, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark suite on simulated devices (device_sim.py), through the
+socket backend:
+
+- overhead: wall time per action against an instant device (time scale 0),
+  i.e. what the framework itself costs, also as a multiple of a bare adb
+  round trip measured in the same run, plus adb round trips per action
+- scaling: episodes/s for 1..N devices with realistic device latency
+- retries: outcome of episodes when commands fail or hang at a given rate
+- text: type_text throughput in chars/s for short and long strings, `input
+  text` keys vs the ADB keyboard IME (the 10k-char keys run takes ~2 min)
+
+Results are compared against a checked-in baseline (loadtest/bench_baseline.json);
+--update-baseline rewrites it. Exits 1 if a metric regressed beyond --tolerance
+(and beyond its noise floor). Host-dependent wall times (overhead p50_ms/p99_ms)
+are reported but not gated: the gate uses round trips and the in-run ratio.
+"""
+
+import argparse, asyncio, json, os, pathlib, socket, sys, threading, time
+from typing import Any, Dict, List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+# The socket client reads its server address at import time, so point it at the simulator first
+os.environ["ADB_BACKEND"] = "socket"
+os.environ.pop("MOCK_ADB", None)
+os.environ["ADB_SERVER_PORT"] = os.getenv("BENCH_ADB_PORT") or str(_free_port())
+os.environ.setdefault("RETRY_BASE_SEC", "0.05")
+# Timeouts are learned within the run only, not from latencies persisted by earlier runs
+os.environ["ADAPTIVE_TIMEOUT_FILE"] = os.devnull
+
+from agents import executor
+from agents.adb_protocol import adb_socket
+from agents.executor import run_task, health, screenshots
+from agents.prompt_to_task import plan_from_prompt
+from agents.retry import RetryPolicy
+from agents.scheduler import EpisodeScheduler
+from agents.text_input import TextInput
+from loadtest.device_sim import DeviceSim
+from loadtest.fake_adb_server import FakeAdbServer
+from observability.metrics import Histogram
+
+BASELINE = pathlib.Path(__file__).with_name("bench_baseline.json")
+
+ACTIONS = [
+    ("tap", {"x": 500, "y": 1000}),
+    ("swipe", {}),
+    ("scroll", {"count": 3}),
+    ("type_text", {"text": "hello world"}),
+    ("nav_home", {}),
+    ("open_settings", {}),
+    ("open_url", {"url": "https://example.com"}),
+    ("wifi", {"enabled": True}),
+    ("screenshot", {"filename": "bench_sim.png"}),
+]
+PROMPTS = ["open settings", "tap 500 600", "scroll down 2 times", "go home", "search for qualgent"]
+# Faults in the retry benchmark hit the actions themselves, not healthchecks or the wake query
+ACTION_KINDS = ("am start", "input tap", "input swipe", "input keyevent")
+
+class SimBench:
+    """One fake adb server for the whole suite; each scenario swaps in a fresh DeviceSim"""
+
+    def __init__(self):
+        self.server = FakeAdbServer(("127.0.0.1", int(os.environ["ADB_SERVER_PORT"])), [])
+        self.scenario = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def sim(self, n_devices: int, **kwargs) -> Tuple[DeviceSim, List[str]]:
+        # New serials per scenario: cached wake state and breaker state don't carry over
+        health.stop_all()
+        self.scenario += 1
+        serials = [f"sim{self.scenario}-{i}" for i in range(n_devices)]
+        sim = DeviceSim(serials, **kwargs)
+        self.server.serials = serials
+        self.server.handler, self.server.online = sim.handler, sim.online
+        return sim, serials
+
+    def close(self):
+        health.stop_all()
+        screenshots.flush()
+        self.server.shutdown()
+        self.server.server_close()
+
+def _calls(sim: DeviceSim, kind: str) -> int:
+    return int(sim.counts.get(kind, {}).get("calls", 0))
+
+def bench_overhead(bench: SimBench, iterations: int, seed: int) -> Dict[str, Any]:
+    """Framework cost per action: the device answers instantly, so all time is ours.
+    "p50_x_ref" divides by the p50 of a bare socket round trip ("raw_round_trip"),
+    which cancels out most of the host's speed"""
+    sim, (serial,) = bench.sim(1, time_scale=0.0, seed=seed)
+    ref = Histogram()
+    for _ in range(iterations + 1):
+        t0 = time.perf_counter()
+        adb_socket(["shell", "echo"], 5.0, serial)
+        ref.record(time.perf_counter() - t0)
+    ref_ms = ref.quantile(0.5) * 1000
+    out = {"raw_round_trip": {"p50_ms": round(ref_ms, 3), "p99_ms": round(ref.quantile(0.99) * 1000, 3),
+                              "p50_x_ref": 1.0, "round_trips": 1.0}}
+    for task, params in ACTIONS:
+        run_task(task, params, serial)  # warm-up: wake sequence, health monitor, connections
+        screenshots.flush()
+        hist = Histogram()
+        trips = _calls(sim, "transport") + _calls(sim, "get-state")
+        for _ in range(iterations):
+            t0 = time.perf_counter()
+            res = run_task(task, params, serial)
+            hist.record(time.perf_counter() - t0)
+            if not res["success"]:
+                raise RuntimeError(f"{task} failed on the simulator: {res['details']}")
+        screenshots.flush()
+        trips = _calls(sim, "transport") + _calls(sim, "get-state") - trips
+        out[task] = {
+            "p50_ms": round(hist.quantile(0.5) * 1000, 3),
+            "p99_ms": round(hist.quantile(0.99) * 1000, 3),
+            "p50_x_ref": round(hist.quantile(0.5) * 1000 / ref_ms, 2),
+            "round_trips": round(trips / iterations, 2),
+        }
+    pathlib.Path("results", "bench_sim.png").unlink(missing_ok=True)
+    return out
+
+def _run_pool(serials: List[str], episodes: int, retries: int = 1) -> Tuple[List[Dict[str, Any]], float, RetryPolicy]:
+    sched = EpisodeScheduler(serials, retries=retries, policy=RetryPolicy(retries))
+    for i in range(episodes):
+        prompt = PROMPTS[i % len(PROMPTS)]
+        sched.submit(i, prompt, plan_from_prompt(prompt))
+    t0 = time.perf_counter()
+    records = asyncio.run(sched.run())
+    return records, time.perf_counter() - t0, sched.policy
+
+def bench_scaling(bench: SimBench, counts: List[int], per_device: int, time_scale: float,
+                  seed: int) -> List[Dict[str, Any]]:
+    """Episodes/s vs. device count with realistic latency; efficiency is relative to linear scaling"""
+    out, single = [], None
+    for n in counts:
+        _, serials = bench.sim(n, time_scale=time_scale, seed=seed)
+        records, elapsed, _ = _run_pool(serials, n * per_device)
+        hist = Histogram()
+        for rec in records:
+            hist.record(rec["latency_sec"])
+        rate = len(records) / elapsed
+        single = single or rate / n
+        out.append({
+            "devices": n,
+            "episodes": len(records),
+            "episodes_per_sec": round(rate, 3),
+            "efficiency": round(rate / (single * n), 3),
+            "episode_p99_sec": round(hist.quantile(0.99), 3),
+        })
+    return out
+
+def bench_retries(bench: SimBench, episodes: int, devices: int, fail_rate: float, hang_rate: float,
+                  retries: int, time_scale: float, seed: int) -> Dict[str, Any]:
+    """Episode outcomes when action commands fail/hang with the given probabilities"""
+    # Hangs outlast the longest per-command timeout the mix uses (10s) only by a little
+    sim, serials = bench.sim(devices, fail={k: fail_rate for k in ACTION_KINDS},
+                             hang={k: hang_rate for k in ACTION_KINDS},
+                             hang_sec=11.0, time_scale=time_scale, seed=seed)
+    records, elapsed, policy = _run_pool(serials, episodes, retries)
+    n = max(1, len(records))
+    st = policy.stats()
+    return {
+        "episodes": len(records),
+        "fail_rate": fail_rate,
+        "hang_rate": hang_rate,
+        "success_rate": round(sum(r["success"] for r in records) / n, 3),
+        "first_try_rate": round(sum(r["success"] and r["attempts"] == 1 for r in records) / n, 3),
+        "mean_attempts": round(sum(r["attempts"] for r in records) / n, 3),
+        "retries": st["retries"],
+        "denied_budget": st["denied_budget"],
+        "timeouts": st.get("fail_timeout", 0),
+        "injected_failures": sum(int(c["failed"]) for c in sim.counts.values()),
+        "injected_hangs": sum(int(c["hung"]) for c in sim.counts.values()),
+        "elapsed_sec": round(elapsed, 3),
+    }
+
+def bench_text(bench: SimBench, sizes: List[int], time_scale: float, seed: int) -> Dict[str, Any]:
+    """type_text throughput per mode and text length; the simulator checks what arrived"""
+    sim, (serial,) = bench.sim(1, time_scale=time_scale, adb_keyboard=True, seed=seed)
+    dev, default = sim.devices[serial], executor.text_input
+    out: Dict[str, Any] = {}
+    try:
+        for mode in ("keys", "ime"):
+            executor.text_input = TextInput(mode=mode)
+            run_task("type_text", {"text": "warm up"}, serial)  # wake sequence, IME probe and selection
+            for n in sizes:
+                payload = ("The quick brown fox jumps over the lazy dog. " * (n // 45 + 1))[:n]
+                dev.typed = ""
+                t0 = time.perf_counter()
+                res = run_task("type_text", {"text": payload}, serial)
+                elapsed = time.perf_counter() - t0
+                if not res["success"] or dev.typed != payload:
+                    raise RuntimeError(f"type_text via {mode} ({n} chars) failed on the simulator: {res['details']}")
+                out.setdefault(mode, {})[f"chars={n}"] = {
+                    "elapsed_sec": round(elapsed, 3),
+                    "chars_per_sec": round(n / elapsed, 1),
+                }
+    finally:
+        executor.text_input = default
+    return out
+
+def _flatten(d: Any, prefix: str = "") -> Dict[str, float]:
+    out = {}
+    if isinstance(d, dict):
+        for k, v in d.items():
+            out.update(_flatten(v, f"{prefix}{k}."))
+    elif isinstance(d, list):
+        for v in d:
+            key = f"devices={v['devices']}" if isinstance(v, dict) and "devices" in v else str(len(out))
+            out.update(_flatten(v, f"{prefix}{key}."))
+    elif isinstance(d, (int, float)) and not isinstance(d, bool):
+        out[prefix.rstrip(".")] = float(d)
+    return out
+
+# Counted, not timed: a regression beyond the noise floor, whatever the tolerance
+EXACT = {"round_trips"}
+# Absolute change a metric must also exceed to count: below it the difference
+# is timer and scheduler noise on a busy host (or a background health probe), not the code
+# (by metric name, or by full key where one scenario is noisier)
+NOISE_FLOOR = {"round_trips": 0.05, "p50_x_ref": 1.0, "episode_p99_sec": 0.1, "elapsed_sec": 0.25, "mean_attempts": 0.1,
+               "success_rate": 0.05, "first_try_rate": 0.05,
+               # whether a thread lands on one of the few injected 11 s hangs moves it by that much
+               "retries.elapsed_sec": 12.0}
+
+def _direction(key: str) -> int:
+    """+1 higher is better, -1 lower is better, 0 informational"""
+    name = key.rsplit(".", 1)[-1]
+    if name in ("episodes_per_sec", "efficiency", "success_rate", "first_try_rate"):
+        return 1
+    if name.endswith("_ms") or name == "chars_per_sec":
+        return 0  # host wall time (overhead) / the inverse of elapsed_sec (text)
+    if name.endswith("_sec") or name in ("p50_x_ref", "round_trips", "mean_attempts"):
+        return -1
+    return 0
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Metrics that got worse than the baseline by more than `tolerance` (relative)
+    and by more than their NOISE_FLOOR (absolute); EXACT metrics regardless of `tolerance`"""
+    cur, base = _flatten(current["results"]), _flatten(baseline["results"])
+    regressions = []
+    for key, old in sorted(base.items()):
+        new, sign = cur.get(key), _direction(key)
+        if new is None or not sign or old == 0:
+            continue
+        name = key.rsplit(".", 1)[-1]
+        change = (new - old) / abs(old) * sign
+        if (name in EXACT or change < -tolerance) and (old - new) * sign > NOISE_FLOOR.get(key, NOISE_FLOOR.get(name, 0.0)):
+            regressions.append(f"{key}: {old:g} -> {new:g} ({change:+.0%})")
+    return regressions
+
+def main():
+    ap = argparse.ArgumentParser(description="Framework overhead, scaling and retry benchmarks on simulated devices")
+    ap.add_argument("--iterations", type=int, default=50, help="Runs per action in the overhead benchmark")
+    ap.add_argument("--devices", default="1,2,4,8", help="Device counts for the scaling benchmark")
+    ap.add_argument("--episodes-per-device", type=int, default=10)
+    ap.add_argument("--time-scale", type=float, default=1.0, help="Multiply simulated device latency")
+    ap.add_argument("--retry-episodes", type=int, default=40)
+    ap.add_argument("--fail-rate", type=float, default=0.1)
+    ap.add_argument("--hang-rate", type=float, default=0.01)
+    ap.add_argument("--retries", type=int, default=2)
+    ap.add_argument("--text-sizes", default="10,1000,10000", help="Text lengths for the text benchmark")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--only", choices=("overhead", "scaling", "retries", "text"), action="append", default=None,
+                    help="Scenarios to run (default: all)")
+    ap.add_argument("--baseline", default=str(BASELINE))
+    ap.add_argument("--update-baseline", action="store_true", help="Write results as the new baseline")
+    ap.add_argument("--tolerance", type=float, default=0.3, help="Allowed relative regression")
+    ap.add_argument("--json", dest="json_path", default=None, help="Also write results here")
+    args = ap.parse_args()
+
+    only = set(args.only or ("overhead", "scaling", "retries", "text"))
+    counts = [int(n) for n in args.devices.split(",") if n.strip()]
+    bench = SimBench()
+    results: Dict[str, Any] = {}
+    try:
+        if "overhead" in only:
+            results["overhead"] = bench_overhead(bench, args.iterations, args.seed)
+            for task, r in results["overhead"].items():
+                print(f"[bench-sim] overhead {task:<14} p50 {r['p50_ms']:7.2f} ms  p99 {r['p99_ms']:7.2f} ms  "
+                      f"({r['p50_x_ref']:5.2f}x raw)  {r['round_trips']:g} round trips")
+        if "scaling" in only:
+            results["scaling"] = bench_scaling(bench, counts, args.episodes_per_device, args.time_scale, args.seed)
+            for r in results["scaling"]:
+                print(f"[bench-sim] scaling {r['devices']:>3} devices: {r['episodes_per_sec']:7.2f} episodes/s "
+                      f"(efficiency {r['efficiency']:.0%}, episode p99 {r['episode_p99_sec']:.2f}s)")
+        if "retries" in only:
+            r = results["retries"] = bench_retries(bench, args.retry_episodes, max(counts), args.fail_rate,
+                                                   args.hang_rate, args.retries, args.time_scale, args.seed)
+            print(f"[bench-sim] retries: success {r['success_rate']:.0%} (first try {r['first_try_rate']:.0%}), "
+                  f"{r['mean_attempts']:.2f} attempts/episode, {r['retries']} retries, "
+                  f"{r['denied_budget']} denied by budget, {r['timeouts']} timeouts "
+                  f"({r['injected_failures']} failures / {r['injected_hangs']} hangs injected)")
+        if "text" in only:
+            results["text"] = bench_text(bench, [int(n) for n in args.text_sizes.split(",") if n.strip()],
+                                         args.time_scale, args.seed)
+            for mode, sizes in results["text"].items():
+                for size, r in sizes.items():
+                    print(f"[bench-sim] text {mode:<4} {size:<12} {r['chars_per_sec']:10.1f} chars/s "
+                          f"({r['elapsed_sec']:.2f}s)")
+    finally:
+        bench.close()
+
+    report = {
+        "config": {k: v for k, v in vars(args).items() if k not in ("baseline", "update_baseline", "json_path")},
+        "python": sys.version.split()[0],
+        "results": results,
+    }
+    if args.json_path:
+        pathlib.Path(args.json_path).write_text(json.dumps(report, indent=2) + "\n")
+    baseline = pathlib.Path(args.baseline)
+    if args.update_baseline:
+        baseline.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"[bench-sim] baseline written to {baseline}")
+        return 0
+    if not baseline.is_file():
+        print(f"[bench-sim] no baseline at {baseline} (run with --update-baseline)")
+        return 0
+    regressions = compare(report, json.loads(baseline.read_text()), args.tolerance)
+    for line in regressions:
+        print(f"[bench-sim] REGRESSION {line}")
+    if not regressions:
+        print(f"[bench-sim] no regressions vs {baseline} (tolerance {args.tolerance:.0%})")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,536 @@
+#!/usr/bin/env python3
+"""
+Simulated Android devices behind the fake adb server (fake_adb_server.py).
+
+Unlike MOCK_ADB=1, every command costs time drawn from a per-command latency
+distribution, can fail or hang past its timeout, and changes device state:
+screen on/off, keyguard, foreground activity, wifi, running apps (frame,
+memory and CPU figures for gfxinfo/meminfo/top). Command kinds are the
+executor's metric labels ("input tap", "am start", "dumpsys", ...), plus
+"get-state" and "transport" (per round trip). On-device scripts (batched input,
+the wake-state query) are interpreted statement by statement.
+
+    python3 loadtest/device_sim.py --port 5099 --devices 4 --fail "am start=0.05"
+    ADB_BACKEND=socket ADB_SERVER_PORT=5099 PYTHONPATH=. python3 agents/runner.py --devices sim-0,sim-1,sim-2,sim-3
+"""
+
+import argparse, base64, html, json, random, struct, sys, os, threading, time, zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from agents.executor import command_kind
+from loadtest.fake_adb_server import FAKE_PNG, FakeAdbServer, run_script
+
+# Rough latencies of a mid-range emulator over a local tunnel
+DEFAULT_LATENCY = {
+    "default": "lognormal:0.03:0.5",
+    "transport": "lognormal:0.004:0.5",
+    "get-state": "lognormal:0.005:0.5",
+    "input tap": "lognormal:0.08:0.4",
+    "input swipe": "lognormal:0.35:0.3",
+    "input keyevent": "lognormal:0.06:0.4",
+    "input text": "lognormal:0.15:0.4",
+    "am start": "lognormal:0.45:0.5",
+    "am start -W": "lognormal:0.45:0.5",  # plus the launch itself (below)
+    "monkey": "lognormal:0.6:0.5",
+    "dumpsys": "lognormal:0.06:0.5",
+    "screencap": "lognormal:0.25:0.3",
+    "uiautomator": "lognormal:1.5:0.3",
+    "am broadcast": "lognormal:0.12:0.4",
+    "ime": "lognormal:0.2:0.3",
+    "settings put": "lognormal:0.08:0.4",
+    "top": "lognormal:0.12:0.3",
+    # Not command kinds: time from `am start -W` to the first frame (TotalTime)
+    "launch cold": "lognormal:0.8:0.3",
+    "launch warm": "lognormal:0.25:0.3",
+    "echo": "fixed:0",
+    "cat": "fixed:0",
+    "rm": "fixed:0",
+    "sleep": "fixed:0",
+}
+
+LAUNCHER = "com.google.android.apps.nexuslauncher/.NexusLauncherActivity"
+ACTIONS = {
+    "android.intent.action.VIEW": "com.android.chrome/com.google.android.apps.chrome.Main",
+    "android.settings.SETTINGS": "com.android.settings/.Settings",
+}
+# Elements (text, resource-id, content-desc) on each package's screen, for uiautomator dumps
+SCREENS = {
+    "com.google.android.apps.nexuslauncher": [("Chrome", "", "Chrome"), ("Settings", "", "Settings"),
+                                              ("Play Store", "", "Play Store"), ("YouTube", "", "YouTube")],
+    "com.android.settings": [("", "com.android.settings:id/search_action_bar", "Search settings"),
+                             ("Network & internet", "android:id/title", ""), ("Connected devices", "android:id/title", ""),
+                             ("Apps", "android:id/title", ""), ("Battery", "android:id/title", ""),
+                             ("Display", "android:id/title", "")],
+    "com.android.chrome": [("", "com.android.chrome:id/url_bar", "Search or type web address"),
+                           ("", "com.android.chrome:id/tab_switcher_button", "Switch or close tabs")],
+}
+LATIN_IME = "com.android.inputmethod.latin/.LatinIME"
+ADB_IME = "com.android.adbkeyboard/.AdbIME"
+PACKAGES = {"com.android.chrome", "com.android.settings", "com.google.android.apps.nexuslauncher",
+            "com.android.vending", "com.google.android.youtube"}
+
+class Latency:
+    """Latency distribution from a spec: fixed:S, uniform:LO:HI, lognormal:MEDIAN:SIGMA, exp:MEAN"""
+
+    def __init__(self, spec: str):
+        kind, *vals = spec.split(":")
+        try:
+            nums = [float(v) for v in vals]
+        except ValueError:
+            raise ValueError(f"bad latency spec {spec!r}")
+        arity = {"fixed": 1, "uniform": 2, "lognormal": 2, "exp": 1}
+        if kind not in arity or len(nums) != arity[kind]:
+            raise ValueError(f"bad latency spec {spec!r} (expected fixed:S, uniform:LO:HI, lognormal:MEDIAN:SIGMA or exp:MEAN)")
+        self.spec, self.kind, self.nums = spec, kind, nums
+
+    def sample(self, rnd: random.Random) -> float:
+        if self.kind == "fixed":
+            return self.nums[0]
+        if self.kind == "uniform":
+            return rnd.uniform(*self.nums)
+        if self.kind == "lognormal":
+            median, sigma = self.nums
+            return median * rnd.lognormvariate(0.0, sigma) if median > 0 else 0.0
+        return rnd.expovariate(1.0 / self.nums[0]) if self.nums[0] > 0 else 0.0
+
+def _kind_map(pairs: List[str]) -> Dict[str, str]:
+    """Parse ["am start=0.05", ...] (CLI KIND=VALUE pairs) into a dict"""
+    out = {}
+    for pair in pairs:
+        kind, sep, value = pair.rpartition("=")
+        if not sep or not kind:
+            raise ValueError(f"expected KIND=VALUE, got {pair!r}")
+        out[kind.strip()] = value.strip()
+    return out
+
+class SimDevice:
+    """State of one simulated device"""
+
+    def __init__(self, serial: str):
+        self.serial = serial
+        self.online = True
+        self.awake = True
+        self.locked = False
+        self.stay_on = False
+        self.wifi = True
+        self.activity = LAUNCHER
+        self.back_stack: List[str] = []
+        self.files: Dict[str, bytes] = {}
+        self.typed = ""  # everything typed into the (single, always focused) text field
+        self.scroll = 0  # rows the foreground screen's list is scrolled by (swipes move it)
+        self.tapped: List[str] = []  # element hit by each tap (text, desc or id; "" for empty space)
+        self.ime = LATIN_IME
+        self.last_input = time.monotonic()
+        self.started: Dict[str, float] = {LAUNCHER.split("/")[0]: time.monotonic()}  # running apps -> start
+        self.frames_reset: Dict[str, float] = {}  # package -> last `dumpsys gfxinfo <pkg> reset`
+        self.lock = threading.Lock()
+
+    def state(self) -> Dict[str, Any]:
+        return {"online": self.online, "awake": self.awake, "locked": self.locked,
+                "activity": self.activity, "wifi": self.wifi, "stay_on": self.stay_on}
+
+class DeviceSim:
+    """Simulated devices with per-command latency, failure and timeout injection.
+
+    `fail` and `hang` map command kinds (or "default") to probabilities; a
+    failing command exits 1, a hanging one answers only after `hang_sec`, so
+    the client's deadline turns it into a timeout. `time_scale` multiplies
+    every latency and on-device sleep (0 = instant device, for measuring
+    framework overhead). With `screen_off_sec`, the screen turns off and locks
+    after that much idle time unless stay-awake is set. `input text` costs
+    `text_char_sec` per character on top of its latency (one key event each);
+    with `adb_keyboard` the ADBKeyboard IME is installed. The foreground app
+    renders `fps` frames per second, `jank_rate` of them janky.
+    """
+
+    def __init__(self, serials: List[str], latency: Optional[Dict[str, str]] = None,
+                 fail: Optional[Dict[str, float]] = None, hang: Optional[Dict[str, float]] = None,
+                 hang_sec: float = 30.0, time_scale: float = 1.0, screen_off_sec: float = 0.0,
+                 screen: Tuple[int, int] = (108, 240), text_char_sec: float = 0.01,
+                 adb_keyboard: bool = False, fps: float = 30.0, jank_rate: float = 0.05,
+                 seed: Optional[int] = None):
+        self.devices = {s: SimDevice(s) for s in serials}
+        self.latency = {k: Latency(v) for k, v in {**DEFAULT_LATENCY, **(latency or {})}.items()}
+        self.fail = dict(fail or {})
+        self.hang = dict(hang or {})
+        self.hang_sec = hang_sec
+        self.time_scale = time_scale
+        self.screen_off_sec = screen_off_sec
+        self.screen = screen
+        self.text_char_sec = text_char_sec
+        self.imes = [LATIN_IME] + ([ADB_IME] if adb_keyboard else [])
+        self.fps = fps
+        self.jank_rate = jank_rate
+        self._rnd = random.Random(seed)
+        self._lock = threading.Lock()
+        self.counts: Dict[str, Dict[str, float]] = {}
+
+    # -- injection -----------------------------------------------------------
+    def _count(self, kind: str, field: str, n: float = 1):
+        with self._lock:
+            c = self.counts.setdefault(kind, {"calls": 0, "failed": 0, "hung": 0, "device_sec": 0.0})
+            c[field] += n
+
+    def _delay(self, kind: str):
+        """Sleep for one sample of the kind's latency"""
+        with self._lock:
+            d = self.latency.get(kind, self.latency["default"]).sample(self._rnd) * self.time_scale
+        self._count(kind, "device_sec", d)
+        if d > 0:
+            time.sleep(d)
+
+    def _fault(self, kind: str) -> Optional[str]:
+        """"hang", "fail" or None for one call of `kind`"""
+        self._count(kind, "calls")
+        with self._lock:
+            r = self._rnd.random()
+        p_hang = self.hang.get(kind, self.hang.get("default", 0.0))
+        p_fail = self.fail.get(kind, self.fail.get("default", 0.0))
+        if r < p_hang:
+            self._count(kind, "hung")
+            return "hang"
+        if r < p_hang + p_fail:
+            self._count(kind, "failed")
+            return "fail"
+        return None
+
+    def _idle_check(self, dev: SimDevice):
+        if self.screen_off_sec and not dev.stay_on and dev.awake and \
+                time.monotonic() - dev.last_input > self.screen_off_sec:
+            dev.awake, dev.locked = False, True
+
+    # -- FakeAdbServer hooks -------------------------------------------------
+    def online(self, serial: str) -> bool:
+        """get-state: False when the device is offline or the probe fails"""
+        dev = self.devices[serial]
+        fault = self._fault("get-state")
+        self._delay("get-state")
+        if fault == "hang":
+            time.sleep(self.hang_sec)
+        return dev.online and fault != "fail"
+
+    def handler(self, serial: str, command: str) -> Tuple[int, bytes]:
+        """Run one shell/exec request (possibly a multi-statement script)"""
+        dev = self.devices[serial]
+        fault = self._fault("transport")
+        self._delay("transport")
+        if fault == "hang":
+            time.sleep(self.hang_sec)
+        if not dev.online or fault == "fail":
+            return 1, b"error: device offline\n"
+        with dev.lock:
+            self._idle_check(dev)
+        return run_script(command, lambda argv: self._command(dev, argv))
+
+    def _command(self, dev: SimDevice, argv: List[str]) -> Tuple[int, bytes]:
+        kind = command_kind(["shell", *argv])
+        fault = self._fault(kind)
+        self._delay(kind)
+        if fault == "hang":
+            time.sleep(self.hang_sec)
+        if fault == "fail":
+            return 1, f"Error: simulated {kind} failure\n".encode()
+        with dev.lock:
+            return self._apply(dev, argv)
+
+    def _apply(self, dev: SimDevice, argv: List[str]) -> Tuple[int, bytes]:
+        prog, args = argv[0], argv[1:]
+        if prog == "echo":
+            return 0, (" ".join(args) + "\n").encode()
+        if prog == "sleep":
+            self._sleep(dev, float(args[0]) * self.time_scale if args else 0.0)
+            return 0, b""
+        if prog == "input":
+            return self._input(dev, args)
+        if prog == "am" and args[:1] == ["start"]:
+            return self._am_start(dev, args[1:])
+        if prog == "monkey":
+            pkg = args[args.index("-p") + 1] if "-p" in args[:-1] else ""
+            if pkg not in PACKAGES:
+                return 252, b"** No activities found to run, monkey aborted.\n"
+            self._launch(dev, f"{pkg}/.Main")
+            return 0, b"Events injected: 1\n"
+        if prog == "settings":
+            if args[:3] == ["put", "global", "stay_on_while_plugged_in"] and len(args) > 3:
+                dev.stay_on = args[3] != "0"
+                return 0, b""
+            if args[:3] == ["get", "global", "stay_on_while_plugged_in"]:
+                return 0, b"3\n" if dev.stay_on else b"0\n"
+            if args[:3] == ["get", "secure", "default_input_method"]:
+                return 0, f"{dev.ime}\n".encode()
+            return 0, b""
+        if prog == "svc" and args[:1] == ["wifi"] and len(args) > 1:
+            dev.wifi = args[1] == "enable"
+            return 0, b""
+        if prog == "cmd" and args[:1] == ["statusbar"]:
+            return 0, b""
+        if prog == "dumpsys":
+            return 0, self._dumpsys(dev, args).encode()
+        if prog == "top":
+            return 0, self._top(dev).encode()
+        if prog == "screencap":
+            if "-p" in args:
+                return 0, FAKE_PNG
+            w, h = self.screen
+            fill = b"\xff\xff\xff\xff" if dev.awake else b"\x00\x00\x00\xff"
+            return 0, struct.pack("<IIII", w, h, 1, 0) + fill * (w * h)
+        if prog == "ime":
+            return self._ime(dev, args)
+        if prog == "am" and args[:1] == ["broadcast"]:
+            action = args[args.index("-a") + 1] if "-a" in args[:-1] else None
+            extras = {args[i + 1]: args[i + 2] for i, a in enumerate(args[:-2]) if a == "--es"}
+            if action == "ADB_INPUT_B64" and dev.ime == ADB_IME:
+                dev.typed += base64.b64decode(extras.get("msg", "")).decode("utf-8")
+            return 0, f"Broadcasting: Intent {{ act={action} flg=0x400000 (has extras) }}\nBroadcast completed: result=0\n".encode()
+        if prog == "uiautomator" and args[:1] == ["dump"]:
+            path = args[1] if len(args) > 1 else "/sdcard/window_dump.xml"
+            dev.files[path] = self._hierarchy(dev).encode()
+            return 0, f"UI hierchary dumped to: {path}\n".encode()
+        if prog == "cat" and args:
+            if args[0] not in dev.files:
+                return 1, f"cat: {args[0]}: No such file or directory\n".encode()
+            return 0, dev.files[args[0]]
+        if prog == "rm":
+            for path in args:
+                dev.files.pop(path, None)
+            return 0, b""
+        if prog == "wm" and args[:1] == ["size"]:
+            return 0, f"Physical size: {self.screen[0]}x{self.screen[1]}\n".encode()
+        if prog == "getprop":
+            return 0, b"1\n"
+        return 127, f"/system/bin/sh: {prog}: not found\n".encode()
+
+    def _input(self, dev: SimDevice, args: List[str]) -> Tuple[int, bytes]:
+        if not args:
+            return 1, b"Usage: input [<source>] <command> [<arg>...]\n"
+        dev.last_input = time.monotonic()
+        if args[0] == "keyevent" and len(args) > 1:
+            key = int(args[1]) if args[1].isdigit() else -1
+            if key == 224:      # WAKEUP
+                dev.awake = True
+            elif key == 223:    # SLEEP
+                dev.awake, dev.locked = False, True
+            elif key == 26:     # POWER toggles
+                dev.awake = not dev.awake
+                dev.locked = dev.locked or not dev.awake
+            elif key == 82 and dev.awake:   # MENU dismisses an insecure keyguard
+                dev.locked = False
+            elif dev.awake and not dev.locked:
+                if key == 3:
+                    self._launch(dev, LAUNCHER)
+                elif key == 4 and dev.back_stack:
+                    dev.activity, dev.scroll = dev.back_stack.pop(), 0
+                elif key == 187:
+                    self._launch(dev, "com.android.systemui/.recents.RecentsActivity")
+                elif key in (66, 61):   # ENTER, TAB into the text field
+                    dev.typed += "\n" if key == 66 else "\t"
+            return 0, b""
+        if args[0] == "text" and len(args) > 1:
+            text = args[1].replace("%s", " ")
+            if not text.isascii():
+                return 1, b"Exception occurred while executing 'text':\njava.lang.NullPointerException\n"
+            d = len(text) * self.text_char_sec * self.time_scale
+            self._count("input text", "device_sec", d)
+            if d > 0:
+                time.sleep(d)
+            dev.typed += text
+            return 0, b""
+        if args[0] == "tap" and len(args) > 2 and dev.awake and not dev.locked:
+            x, y = int(float(args[1])), int(float(args[2]))
+            hit = next((text or desc or rid for text, rid, desc, (x1, y1, x2, y2) in self._layout(dev)
+                        if x1 <= x < x2 and y1 <= y < y2), "")
+            dev.tapped = (dev.tapped + [hit])[-100:]
+            return 0, b""
+        if args[0] == "swipe" and len(args) > 4 and dev.awake and not dev.locked:
+            # Finger moving up scrolls the list forward by one row, down scrolls it back
+            dy = int(float(args[2])) - int(float(args[4]))
+            n = len(SCREENS.get(dev.activity.split("/")[0], []))
+            dev.scroll = max(0, min(n - 1, dev.scroll + (dy > 0) - (dy < 0)))
+            return 0, b""
+        if args[0] in ("tap", "swipe", "text"):
+            return 0, b""
+        return 1, f"Error: Unknown command: {args[0]}\n".encode()
+
+    def _ime(self, dev: SimDevice, args: List[str]) -> Tuple[int, bytes]:
+        if args[:1] == ["list"]:
+            return 0, "".join(f"{i}\n" for i in self.imes).encode()
+        if args[:1] in (["enable"], ["set"]) and len(args) > 1:
+            if args[1] not in self.imes:
+                return 255, f"Unknown input method {args[1]} cannot be {args[0]}d for user #0\n".encode()
+            if args[0] == "set":
+                dev.ime = args[1]
+            return 0, f"Input method {args[1]}: {'selected' if args[0] == 'set' else 'already enabled'} for user #0\n".encode()
+        return 1, b"ime: unknown command\n"
+
+    def _sleep(self, dev: SimDevice, d: float):
+        if d > 0:
+            dev.lock.release()  # other requests to this device proceed while the script sleeps
+            try:
+                time.sleep(d)
+            finally:
+                dev.lock.acquire()
+
+    def _launch(self, dev: SimDevice, activity: str):
+        dev.started.setdefault(activity.split("/")[0], time.monotonic())
+        if activity != dev.activity:
+            dev.back_stack = (dev.back_stack + [dev.activity])[-20:]
+            dev.activity, dev.scroll = activity, 0
+
+    def _am_start(self, dev: SimDevice, args: List[str]) -> Tuple[int, bytes]:
+        wait = "-W" in args
+        opts = dict(zip(*[iter(a for a in args if a != "-W")] * 2))
+        if opts.get("-c") == "android.intent.category.LAUNCHER" and opts.get("-p") in PACKAGES:
+            component = f"{opts['-p']}/.Main"
+        else:
+            component = opts.get("-n") or ACTIONS.get(opts.get("-a", ""))
+        if component is None:
+            return 1, b"Error: Activity not started, unable to resolve Intent\n"
+        if component.split("/")[0] not in PACKAGES:
+            return 1, f"Error: Activity class {{{component}}} does not exist.\n".encode()
+        cold = component.split("/")[0] not in dev.started
+        self._launch(dev, component)
+        out = f"Starting: Intent {{ cmp={component} }}\n"
+        if not wait:
+            return 0, out.encode()
+        # -W: answer once the activity has drawn its first frame
+        with self._lock:
+            d = self.latency["launch cold" if cold else "launch warm"].sample(self._rnd)
+        self._sleep(dev, d * self.time_scale)
+        total = max(1, int(d * 1000))
+        return 0, (f"{out}Status: ok\nLaunchState: {'COLD' if cold else 'WARM'}\nActivity: {component}\n"
+                   f"TotalTime: {total}\nWaitTime: {total + 4}\nComplete\n").encode()
+
+    def _dumpsys(self, dev: SimDevice, args: List[str]) -> str:
+        service = args[:1]
+        if service in (["gfxinfo"], ["meminfo"]) and len(args) > 1:
+            pkg = args[1]
+            if pkg not in dev.started:
+                return f"No process found for: {pkg}\n"
+            return self._gfxinfo(dev, pkg, "reset" in args[2:]) if service == ["gfxinfo"] else self._meminfo(dev, pkg)
+        if service == ["power"]:
+            return (f"  mWakefulness={'Awake' if dev.awake else 'Asleep'}\n"
+                    f"Display Power: state={'ON' if dev.awake else 'OFF'}\n")
+        if service == ["window"]:
+            locked = str(dev.locked).lower()
+            return (f"    mDreamingLockscreen={locked}\n    mShowingLockscreen={locked}\n"
+                    f"  mCurrentFocus=Window{{1c0 u0 {dev.activity}}}\n  mFocusedApp=ActivityRecord{{2d1 u0 {dev.activity} t1}}\n")
+        if service == ["activity"]:
+            return f"  mResumedActivity: ActivityRecord{{0 u0 {dev.activity} t1}}\n"
+        return ""
+
+    def _gfxinfo(self, dev: SimDevice, pkg: str, reset: bool) -> str:
+        """Frames since the last reset (or the process start); only the foreground app renders"""
+        now = time.monotonic()
+        since = max(dev.started[pkg], dev.frames_reset.get(pkg, 0.0))
+        if reset:
+            dev.frames_reset[pkg] = now
+        frames = int((now - since) * self.fps) if dev.activity.split("/")[0] == pkg and dev.awake else 0
+        with self._lock:
+            janky = sum(self._rnd.random() < self.jank_rate for _ in range(frames))
+            p50, p90 = self._rnd.randint(5, 9), self._rnd.randint(11, 24)
+        pct = 100 * janky / frames if frames else 0.0
+        return (f"\n** Graphics info for pid {_pid(pkg)} [{pkg}] **\n\nStats since: {int(since * 1e9)}ns\n"
+                f"Total frames rendered: {frames}\nJanky frames: {janky} ({pct:.2f}%)\n"
+                f"50th percentile: {p50}ms\n90th percentile: {p90}ms\n95th percentile: {p90 + 4}ms\n"
+                f"99th percentile: {p90 * 2}ms\n")
+
+    def _meminfo(self, dev: SimDevice, pkg: str) -> str:
+        """PSS: a per-package base that grows with the process's age"""
+        age = time.monotonic() - dev.started[pkg]
+        with self._lock:
+            pss = 60000 + zlib.crc32(pkg.encode()) % 120000 + int(min(age * 200, 50000)) + self._rnd.randint(0, 2000)
+        return (f"Applications Memory Usage (in Kilobytes):\n** MEMINFO in pid {_pid(pkg)} [{pkg}] **\n"
+                f"        TOTAL   {pss}    {pss * 3 // 4}    {pss // 10}        0\n"
+                f"TOTAL PSS:   {pss}            TOTAL RSS:   {pss * 3 // 2}       TOTAL SWAP PSS:        0\n")
+
+    def _top(self, dev: SimDevice) -> str:
+        """`top -b -n 1 -q -o PID,%CPU,ARGS`: the foreground app busy, others idle"""
+        fg = dev.activity.split("/")[0]
+        with self._lock:
+            rows = [(_pid(p), self._rnd.uniform(5, 45) if p == fg and dev.awake else self._rnd.uniform(0, 1), p)
+                    for p in dev.started]
+        rows.append((512, 3.0, "system_server"))
+        return "".join(f"{pid:>5} {cpu:>5.1f} {args}\n" for pid, cpu, args in sorted(rows, key=lambda r: -r[1]))
+
+    def _layout(self, dev: SimDevice) -> List[Tuple[str, str, str, Tuple[int, int, int, int]]]:
+        """(text, resource-id, content-desc, bounds) of the foreground package's SCREENS elements:
+        one row each in a column, shifted up by the scroll offset (rows scrolled off the top are gone)"""
+        w, h = self.screen
+        items = SCREENS.get(dev.activity.split("/")[0], [])
+        row = h // (len(items) + 1) if items else h
+        return [(text, rid, desc, (0, (i - dev.scroll + 1) * row, w, (i - dev.scroll + 2) * row))
+                for i, (text, rid, desc) in enumerate(items) if i >= dev.scroll]
+
+    def _hierarchy(self, dev: SimDevice) -> str:
+        """uiautomator-style XML for the foreground package (see _layout)"""
+        w, h = self.screen
+        pkg = dev.activity.split("/")[0]
+        nodes = "".join(
+            f'<node index="{i}" text={_attr(text)} resource-id={_attr(rid)} class="android.widget.TextView" '
+            f'package="{pkg}" content-desc={_attr(desc)} clickable="true" enabled="true" '
+            f'bounds="[{x1},{y1}][{x2},{y2}]" />'
+            for i, (text, rid, desc, (x1, y1, x2, y2)) in enumerate(self._layout(dev)))
+        return ("<?xml version='1.0' encoding='UTF-8' standalone='yes' ?><hierarchy rotation=\"0\">"
+                f'<node index="0" text="" resource-id="" class="android.widget.FrameLayout" package="{pkg}" '
+                f'content-desc="" clickable="false" enabled="true" bounds="[0,0][{w},{h}]">{nodes}</node></hierarchy>')
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            kinds = {k: {**c, "device_sec": round(c["device_sec"], 4)} for k, c in sorted(self.counts.items())}
+        return {"commands": kinds, "devices": {s: d.state() for s, d in self.devices.items()}}
+
+def _pid(pkg: str) -> int:
+    return 1000 + zlib.crc32(pkg.encode()) % 30000
+
+def _attr(value: str) -> str:
+    return '"' + html.escape(value, quote=True) + '"'
+
+def start_sim(serials: List[str], port: int = 0, **kwargs) -> Tuple[FakeAdbServer, DeviceSim]:
+    """Serve simulated devices on a fake adb server (daemon thread); port 0 picks a free port"""
+    sim = DeviceSim(serials, **kwargs)
+    server = FakeAdbServer(("127.0.0.1", port), serials, handler=sim.handler, online=sim.online)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, sim
+
+def sim_options(profile: Optional[str], latency: List[str], fail: List[str], hang: List[str]) -> Dict[str, Any]:
+    """DeviceSim keyword arguments from a JSON profile file overlaid with KIND=VALUE flags"""
+    opts: Dict[str, Any] = json.loads(open(profile).read()) if profile else {}
+    opts["latency"] = {**opts.get("latency", {}), **_kind_map(latency)}
+    opts["fail"] = {**opts.get("fail", {}), **{k: float(v) for k, v in _kind_map(fail).items()}}
+    opts["hang"] = {**opts.get("hang", {}), **{k: float(v) for k, v in _kind_map(hang).items()}}
+    return opts
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulated adb devices for offline runs and benchmarks")
+    parser.add_argument("--port", type=int, default=5037, help="Port to listen on")
+    parser.add_argument("--devices", type=int, default=1, help="Number of devices (serials sim-0..sim-N-1)")
+    parser.add_argument("--serial", action="append", default=[], help="Explicit device serial (repeatable)")
+    parser.add_argument("--profile", default=None, help="JSON file with DeviceSim options (latency/fail/hang/...)")
+    parser.add_argument("--latency", action="append", default=[], metavar="KIND=SPEC",
+                        help='e.g. "am start=lognormal:0.4:0.5", "default=fixed:0.01"')
+    parser.add_argument("--fail", action="append", default=[], metavar="KIND=P", help="Failure probability per call")
+    parser.add_argument("--hang", action="append", default=[], metavar="KIND=P", help="Probability a call hangs past its timeout")
+    parser.add_argument("--hang-sec", type=float, default=30.0)
+    parser.add_argument("--time-scale", type=float, default=1.0, help="Multiply all latencies (0 = instant)")
+    parser.add_argument("--screen-off-sec", type=float, default=0.0, help="Idle time before the screen turns off (0 = never)")
+    parser.add_argument("--text-char-sec", type=float, default=0.01, help="Per-character cost of `input text`")
+    parser.add_argument("--adb-keyboard", action="store_true", help="Devices have the ADBKeyboard IME installed")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    serials = args.serial or [f"sim-{i}" for i in range(args.devices)]
+    opts = sim_options(args.profile, args.latency, args.fail, args.hang)
+    opts.update(hang_sec=args.hang_sec, time_scale=args.time_scale, screen_off_sec=args.screen_off_sec,
+                text_char_sec=args.text_char_sec, adb_keyboard=args.adb_keyboard, seed=args.seed)
+    sim = DeviceSim(serials, **opts)
+    server = FakeAdbServer(("127.0.0.1", args.port), serials, handler=sim.handler, online=sim.online)
+    print(f"[device-sim] listening on 127.0.0.1:{args.port} devices={serials}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(json.dumps(sim.stats(), indent=2))
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
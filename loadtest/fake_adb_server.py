@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Local fake adb server for offline testing of the socket backend
+Speaks enough of the adb server protocol (host:, shell,v2:, exec:, sync:) for agents/adb_protocol.py
+"""
+
+import argparse, re, socketserver, struct, threading, shlex
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Canned 1x1 PNG returned for `screencap -p`
+FAKE_PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082"
+)
+
+_VAR_RE = re.compile(r"\$(\?|\w+)")
+
+def split_unquoted(s: str, sep: str) -> List[str]:
+    """Split on `sep` outside single/double quotes"""
+    parts, buf, quote, i = [], [], None, 0
+    while i < len(s):
+        c = s[i]
+        if quote:
+            quote = None if c == quote else quote
+        elif c in "'\"":
+            quote = c
+        elif s.startswith(sep, i):
+            parts.append("".join(buf)); buf = []
+            i += len(sep)
+            continue
+        buf.append(c)
+        i += 1
+    parts.append("".join(buf))
+    return [p.strip() for p in parts]
+
+# -- tiny shell ----------------------------------------------------------------
+# Enough sh for the scripts the executor sends (batched input, the wake-state
+# query, UI dumps): `;` statements, `||`, $? and $var, var=value, exit,
+# [ a -eq b ], `| grep PATTERN` and output redirection. `run` executes one
+# command's argv and returns (exit code, output).
+
+def run_script(command: str, run: Callable[[List[str]], Tuple[int, bytes]]) -> Tuple[int, bytes]:
+    """Run one shell/exec request, statement by statement"""
+    env = {"?": "0"}
+    out = bytearray()
+    for stmt in filter(None, split_unquoted(command, ";")):
+        code, data = _statement(stmt, env, run)
+        out += data
+        if code is None:  # exit
+            return int(env.get("?", "0")), bytes(out)
+        env["?"] = str(code)
+    return int(env["?"]), bytes(out)
+
+def _statement(stmt: str, env: Dict[str, str], run: Callable) -> Tuple[Optional[int], bytes]:
+    # Expand $vars outside single quotes (double-quoted text is expanded too)
+    def expand(m: re.Match) -> str:
+        if m.group(1):
+            return env.get(m.group(1), "")
+        return _VAR_RE.sub(expand, m.group()) if m.group().startswith('"') else m.group()
+    stmt = re.sub(r"'[^']*'|\"[^\"]*\"|\$(\?|\w+)", expand, stmt)
+    first, *rest = split_unquoted(stmt, "||")
+    code, out = _pipeline(first, env, run)
+    for alt in rest:
+        if code == 0 or code is None:
+            break
+        code, more = _pipeline(alt, env, run)
+        out += more
+    return code, out
+
+def _pipeline(stmt: str, env: Dict[str, str], run: Callable) -> Tuple[Optional[int], bytes]:
+    m = re.fullmatch(r"(\w+)=(\S*)", stmt)
+    if m:
+        env[m.group(1)] = m.group(2)
+        return int(env["?"]), b""
+    stages = split_unquoted(stmt, "|")
+    try:
+        argv = shlex.split(stages[0])
+    except ValueError:
+        return 2, b"/system/bin/sh: syntax error\n"
+    redirected = [a for a in argv if a.startswith(">")]
+    argv = [a for a in argv if not a.startswith(">")]
+    if not argv:
+        return 0, b""
+    if argv[0] == "exit":
+        env["?"] = argv[1] if len(argv) > 1 else env["?"]
+        return None, b""
+    if argv[0] == "[":
+        return _test(argv), b""
+    code, out = run(argv)
+    if redirected:
+        out = b""
+    for stage in stages[1:]:
+        args = shlex.split(stage)
+        if args[:1] == ["grep"] and len(args) > 1:
+            pat = re.compile(args[-1])
+            lines = [l for l in out.decode("utf-8", "replace").splitlines(True) if pat.search(l)]
+            out = "".join(lines).encode()
+            code = 0 if lines else 1
+    return code, out
+
+def _test(argv: List[str]) -> int:
+    args = argv[1:-1] if argv[-1] == "]" else argv[1:]
+    if len(args) == 3 and args[1] in ("-eq", "-ne", "="):
+        a, op, b = args
+        try:
+            same = int(a) == int(b) if op != "=" else a == b
+        except ValueError:
+            return 2
+        return 0 if same == (op != "-ne") else 1
+    return 2
+
+def _default_command(argv: List[str]) -> Tuple[int, bytes]:
+    prog = argv[0]
+    if prog == "echo":
+        return 0, (" ".join(argv[1:]) + "\n").encode()
+    if prog == "screencap":
+        if "-p" in argv:
+            return 0, FAKE_PNG
+        # Raw framebuffer: width, height, format (RGBA_8888) + one pixel
+        return 0, struct.pack("<III", 1, 1, 1) + b"\xff\xff\xff\xff"
+    if prog == "am":
+        return 0, b"Starting: Intent { }\n"
+    if prog in ("input", "settings", "svc", "cmd", "monkey", "sleep"):
+        return 0, b""
+    if prog == "getprop":
+        return 0, b"1\n"
+    return 127, f"/system/bin/sh: {prog}: not found\n".encode()
+
+def default_handler(serial: str, command: str) -> Tuple[int, bytes]:
+    """Answer the handful of shell commands the executor issues (scripts included)"""
+    return run_script(command, _default_command)
+
+class FakeAdbServer(socketserver.ThreadingTCPServer):
+    """Threaded TCP server emulating the adb host server"""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, addr: Tuple[str, int], serials: List[str],
+                 handler: Callable[[str, str], Tuple[int, bytes]] = default_handler,
+                 files: Optional[Dict[str, bytes]] = None,
+                 online: Optional[Callable[[str], bool]] = None):
+        super().__init__(addr, _Connection)
+        self.serials = serials
+        self.handler = handler
+        self.files = files or {}
+        self.online = online  # get-state hook: False answers "offline" (see device_sim.py)
+        self.requests_seen: List[str] = []
+        self._seen_lock = threading.Lock()
+
+    def record(self, req: str):
+        with self._seen_lock:
+            self.requests_seen.append(req)
+
+class _Connection(socketserver.BaseRequestHandler):
+    server: FakeAdbServer
+
+    def _recv_exact(self, n: int) -> bytes:
+        buf = b""
+        while len(buf) < n:
+            chunk = self.request.recv(n - len(buf))
+            if not chunk:
+                raise ConnectionError("client closed")
+            buf += chunk
+        return buf
+
+    def _read_request(self) -> str:
+        n = int(self._recv_exact(4), 16)
+        req = self._recv_exact(n).decode("utf-8")
+        self.server.record(req)
+        return req
+
+    def _okay(self, payload: Optional[bytes] = None):
+        msg = b"OKAY"
+        if payload is not None:
+            msg += b"%04x" % len(payload) + payload
+        self.request.sendall(msg)
+
+    def _fail(self, message: str):
+        data = message.encode()
+        self.request.sendall(b"FAIL" + b"%04x" % len(data) + data)
+
+    def handle(self):
+        try:
+            self._serve()
+        except (ConnectionError, OSError):
+            pass
+
+    def _serve(self):
+        serials = self.server.serials
+        req = self._read_request()
+        if req == "host:version":
+            return self._okay(b"0029")
+        if req == "host:devices":
+            return self._okay("".join(f"{s}\tdevice\n" for s in serials).encode())
+        if req.endswith(":get-state"):
+            serial = req[len("host-serial:"):-len(":get-state")] if req.startswith("host-serial:") else None
+            if serial is None and serials:
+                serial = serials[0]
+            if serial in serials:
+                if self.server.online is not None and not self.server.online(serial):
+                    return self._fail(f"device '{serial}' offline")
+                return self._okay(b"device")
+            return self._fail(f"device '{serial}' not found")
+        if req.startswith("host:transport"):
+            serial = req.split(":", 2)[2] if req.startswith("host:transport:") else (serials[0] if serials else None)
+            if serial not in serials:
+                return self._fail(f"device '{serial}' not found")
+            self._okay()
+            return self._device_service(serial, self._read_request())
+        return self._fail(f"unknown host service '{req}'")
+
+    def _device_service(self, serial: str, req: str):
+        if req.startswith("shell,v2") and ":" in req:
+            code, out = self.server.handler(serial, req.split(":", 1)[1])
+            self._okay()
+            self.request.sendall(struct.pack("<BI", 1, len(out)) + out + struct.pack("<BIB", 3, 1, code & 0xFF))
+        elif req.startswith("exec:"):
+            _, out = self.server.handler(serial, req[len("exec:"):])
+            self._okay()
+            self.request.sendall(out)
+        elif req == "sync:":
+            self._okay()
+            self._sync()
+        else:
+            self._fail(f"unknown device service '{req}'")
+
+    def _sync(self):
+        while True:
+            tag, n = struct.unpack("<4sI", self._recv_exact(8))
+            if tag == b"QUIT":
+                return
+            path = self._recv_exact(n).decode("utf-8")
+            data = self.server.files.get(path)
+            if tag == b"RECV":
+                if data is None:
+                    msg = b"No such file or directory"
+                    self.request.sendall(b"FAIL" + struct.pack("<I", len(msg)) + msg)
+                    continue
+                for i in range(0, len(data), 64 * 1024):
+                    chunk = data[i:i + 64 * 1024]
+                    self.request.sendall(b"DATA" + struct.pack("<I", len(chunk)) + chunk)
+                self.request.sendall(b"DONE" + struct.pack("<I", 0))
+            elif tag == b"STAT":
+                mode, size = (0o100644, len(data)) if data is not None else (0, 0)
+                self.request.sendall(b"STAT" + struct.pack("<III", mode, size, 0))
+            else:
+                return
+
+def start_background(port: int = 0, serials: Optional[List[str]] = None, **kwargs) -> FakeAdbServer:
+    """Start a fake server on a daemon thread; port 0 picks a free port (see server.server_address)"""
+    server = FakeAdbServer(("127.0.0.1", port), serials or ["emulator-5554"], **kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake adb server for offline testing")
+    parser.add_argument("--port", type=int, default=5037, help="Port to listen on")
+    parser.add_argument("--serial", action="append", default=[], help="Device serial to expose (repeatable)")
+    args = parser.parse_args()
+
+    server = FakeAdbServer(("127.0.0.1", args.port), args.serial or ["emulator-5554"])
+    print(f"[fake-adb] listening on 127.0.0.1:{args.port} devices={server.serials}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Offline stand-in for the gmsaas CLI (JSON output format), for exercising the
+pool controller and infra scripts without Genymotion.
+
+Supports `instances list|start|adbconnect|stop` and `config set` (ignored).
+Instances live in a JSON state file (FAKE_GMSAAS_STATE) and go
+CREATING -> BOOTING -> ONLINE over FAKE_GMSAAS_BOOT_SEC seconds;
+FAKE_GMSAAS_FAIL_RATE makes that fraction of starts end in ERROR.
+
+    GMSAAS="python3 loadtest/fake_gmsaas.py" python3 infra/pool_controller.py --demand 2
+"""
+
+import fcntl, json, os, random, sys, time, uuid
+from typing import Any, Dict
+
+STATE = os.getenv("FAKE_GMSAAS_STATE", "/tmp/fake_gmsaas.json")
+BOOT_SEC = float(os.getenv("FAKE_GMSAAS_BOOT_SEC", "3"))
+FAIL_RATE = float(os.getenv("FAKE_GMSAAS_FAIL_RATE", "0"))
+FIRST_PORT = int(os.getenv("FAKE_GMSAAS_FIRST_PORT", "40000"))
+
+def _state_of(inst: Dict[str, Any]) -> str:
+    if inst["state"] in ("DELETED", "ERROR"):
+        return inst["state"]
+    age = time.time() - inst["started"]
+    if inst.get("doomed") and age >= BOOT_SEC / 2:
+        return "ERROR"
+    if age >= BOOT_SEC:
+        return "ONLINE"
+    return "BOOTING" if age >= BOOT_SEC / 3 else "CREATING"
+
+def _public(inst: Dict[str, Any]) -> Dict[str, Any]:
+    return {"uuid": inst["uuid"], "name": inst["name"], "state": _state_of(inst),
+            "created_at": inst["created_at"], "adb_serial": inst.get("adb_serial") or ""}
+
+def _fail(msg: str) -> int:
+    print(json.dumps({"error": {"message": msg}}, indent=2))
+    return 1
+
+def main(argv=None) -> int:
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if argv[:1] == ["config"]:
+        return 0
+    if argv[:1] != ["instances"] or len(argv) < 2:
+        return _fail(f"unsupported command: {' '.join(argv)}")
+    cmd, args = argv[1], argv[2:]
+    with open(STATE, "a+") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)  # concurrent starts from the controller's thread pool
+        f.seek(0)
+        db = json.loads(f.read() or '{"instances": {}, "next_port": %d}' % FIRST_PORT)
+        insts = db["instances"]
+        rc = 0
+        if cmd == "list":
+            print(json.dumps({"instances": [_public(i) for i in insts.values() if _state_of(i) != "DELETED"]}, indent=2))
+        elif cmd == "start" and len(args) >= 2:
+            iid = str(uuid.uuid4())
+            insts[iid] = {"uuid": iid, "recipe": args[0], "name": args[1], "state": "CREATING",
+                          "started": time.time(), "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                          "doomed": random.random() < FAIL_RATE}
+            print(json.dumps({"instance": _public(insts[iid])}, indent=2))
+        elif cmd == "adbconnect" and args:
+            inst = insts.get(args[0])
+            if inst is None or _state_of(inst) != "ONLINE":
+                rc = _fail(f"instance {args[0]} is not ONLINE")
+            else:
+                if not inst.get("adb_serial"):
+                    inst["adb_serial"] = f"localhost:{db['next_port']}"
+                    db["next_port"] += 1
+                print(json.dumps({"instance": _public(inst)}, indent=2))
+        elif cmd == "stop" and args:
+            inst = insts.get(args[0])
+            if inst is None:
+                rc = _fail(f"instance {args[0]} not found")
+            else:
+                inst["state"] = "DELETED"
+                print(json.dumps({"instance": _public(inst)}, indent=2))
+        else:
+            rc = _fail(f"unsupported command: instances {' '.join([cmd, *args])}")
+        f.seek(0)
+        f.truncate()
+        f.write(json.dumps(db))
+    return rc
+
+if __name__ == "__main__":
+    exit(main())
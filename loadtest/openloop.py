@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Open-loop load generator: episodes arrive on a schedule (constant, step, ramp or
+Poisson) whether or not earlier ones have finished, and are dispatched to the
+first idle device in the pool.
+
+Every episode records its intended start (from the schedule) and its actual
+start (when a device picked it up). Latency is reported both as service time
+(actual start -> end) and corrected response time (intended start -> end), so
+time spent waiting behind a saturated pool is not hidden (coordinated omission).
+--find-max searches for the highest rate the pool sustains.
+
+Per-episode records go to results/<run_id>.jsonl/.csv in the runner's format,
+and the summaries are computed from those files.
+"""
+
+import argparse, asyncio, json, os, pathlib, random, sys, time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from agents.harness import run_episode_async
+from agents.executor import health, screenshots
+from agents.prompt_to_task import plan_from_prompt
+from agents.results import ResultStream
+from agents.result_store import open_store
+from agents.retry import RetryPolicy
+from agents.scheduler import parse_devices
+from observability.metrics import Histogram
+from observability.trace import JsonTracer
+
+PROFILES = ("constant", "step", "ramp", "poisson")
+
+def rate_at(profile: str, t: float, rate: float, duration: float, start_rate: float, steps: int) -> float:
+    """Target arrival rate (episodes/s) at offset t"""
+    if profile == "ramp":
+        return start_rate + (rate - start_rate) * min(1.0, t / duration)
+    if profile == "step" and steps > 1:
+        level = min(steps - 1, int(t * steps / duration))
+        return start_rate + (rate - start_rate) * level / (steps - 1)
+    return rate
+
+def arrival_times(profile: str, rate: float, duration: float, start_rate: Optional[float] = None,
+                  steps: int = 4, seed: Optional[int] = None) -> Iterator[float]:
+    """Intended start offsets (seconds from t0) over `duration`"""
+    if profile not in PROFILES:
+        raise ValueError(f"unknown profile {profile!r} (expected one of {', '.join(PROFILES)})")
+    start_rate = rate / max(1, steps) if start_rate is None else start_rate
+    rnd = random.Random(seed)
+    t = 0.0
+    while t < duration - 1e-9:
+        yield t
+        r = max(1e-6, rate_at(profile, t, rate, duration, start_rate, steps))
+        t += rnd.expovariate(r) if profile == "poisson" else 1.0 / r
+
+async def run_trial(schedule: List[float], devices: List[Optional[str]], prompt: str, stream: ResultStream,
+                    tracer: JsonTracer, retries: int = 1, max_backlog: int = 1000) -> int:
+    """Dispatch episodes at their intended times; returns how many were shed (backlog full)"""
+    loop = asyncio.get_running_loop()
+    idle: "asyncio.Queue[Optional[str]]" = asyncio.Queue()
+    for d in devices:
+        idle.put_nowait(d)
+    policy = RetryPolicy(retries)
+    plan = plan_from_prompt(prompt)
+    backlog = shed = 0
+    t0 = loop.time()
+
+    async def one(i: int, intended: float):
+        nonlocal backlog
+        try:
+            serial = await idle.get()
+            started = loop.time() - t0
+            try:
+                with tracer.span("task.execute", episode=i, device=serial):
+                    rec = await run_episode_async(prompt, max_retries=retries, serial=serial,
+                                                  plan=plan, policy=policy)
+            except Exception as e:
+                # Still one completed (failed) episode: dropping it would flatter the trial
+                rec = {"task": plan[0], "params": plan[1], "success": False, "latency_sec": 0.0,
+                       "attempts": 0, "flaky": 0, "details": f"episode raised: {e!r}"[-400:], "error": repr(e)}
+            finally:
+                idle.put_nowait(serial)
+            ended = loop.time() - t0
+        finally:
+            backlog -= 1
+        rec.update({
+            "episode": i, "run_id": tracer.run_id, "trace_id": tracer.trace_id, "device": serial,
+            "intended_start_sec": round(intended, 4),
+            "start_sec": round(started, 4),
+            "end_sec": round(ended, 4),
+            "queue_delay_sec": round(started - intended, 4),
+            "service_sec": round(ended - started, 4),
+            "response_sec": round(ended - intended, 4),
+        })
+        stream.append(rec)
+
+    tasks = []
+    for i, intended in enumerate(schedule):
+        delay = t0 + intended - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if backlog >= max_backlog:
+            shed += 1
+            continue
+        backlog += 1
+        tasks.append(asyncio.ensure_future(one(i, intended)))
+    await asyncio.gather(*tasks)
+    return shed
+
+def summarize(stream: ResultStream, offered: int, duration: float, shed: int) -> Dict[str, Any]:
+    """Trial summary from the episode records on disk"""
+    service, response, queue = Histogram(), Histogram(), Histogram()
+    done = ok = 0
+    makespan = 0.0
+    for rec in stream.records():
+        done += 1
+        ok += bool(rec.get("success"))
+        service.record(rec["service_sec"])
+        response.record(rec["response_sec"])
+        queue.record(rec["queue_delay_sec"])
+        makespan = max(makespan, rec["end_sec"])
+    elapsed = max(duration, makespan)
+    return {
+        "run_id": stream.run_id,
+        "offered": offered,
+        "completed": done,
+        "shed": shed,
+        "success_rate": round(ok / done, 4) if done else 0.0,
+        "offered_rate": round(offered / duration, 3),
+        "throughput": round(done / elapsed, 3) if elapsed else 0.0,
+        "goodput": round(ok / elapsed, 3) if elapsed else 0.0,
+        "makespan_sec": round(makespan, 3),
+        "service": service.summary(),
+        "response": response.summary(),
+        "queue_delay": queue.summary(),
+    }
+
+def sustainable(s: Dict[str, Any], min_ratio: float, slo_p99: Optional[float]) -> bool:
+    """The pool kept up: nothing shed, throughput tracked the offered rate, tail within SLO"""
+    if s["shed"] or not s["completed"] or s["throughput"] < min_ratio * s["offered_rate"]:
+        return False
+    return slo_p99 is None or s["response"]["p99"] <= slo_p99
+
+def trial(args, devices: List[Optional[str]], profile: str, rate: float, label: str) -> Dict[str, Any]:
+    schedule = list(arrival_times(profile, rate, args.duration, args.start_rate, args.steps, args.seed))
+    run_id = f"{args.run_id}_{label}"
+    stream = ResultStream(run_id, pathlib.Path("results"), store=open_store())
+    tracer = JsonTracer(run_id)
+    health.tracer = tracer
+    with tracer.span("loadtest.trial", profile=profile, rate=rate, episodes=len(schedule), devices=len(devices)):
+        shed = asyncio.run(run_trial(schedule, devices, args.prompt, stream, tracer,
+                                     retries=args.retries, max_backlog=args.max_backlog))
+    screenshots.flush()
+    stream.close()
+    s = summarize(stream, len(schedule), args.duration, shed)
+    s.update(profile=profile, target_rate=rate, sustainable=sustainable(s, args.min_ratio, args.slo_p99))
+    with tracer.span("loadtest.result", **{k: v for k, v in s.items() if not isinstance(v, dict)}):
+        pass
+    tracer.close()
+    print(f"[openloop] {profile} {rate:g}/s: offered={s['offered']} done={s['completed']} shed={s['shed']} "
+          f"throughput={s['throughput']}/s service p99={s['service']['p99']:.3f}s "
+          f"response p99={s['response']['p99']:.3f}s{'' if s['sustainable'] else '  UNSUSTAINABLE'}")
+    return s
+
+def find_max(args, devices: List[Optional[str]]) -> Tuple[float, List[Dict[str, Any]]]:
+    """Double the rate until the pool falls behind, then bisect; returns (max sustainable rate, trials)"""
+    trials, good, bad, rate = [], 0.0, None, args.rate
+    while bad is None and rate <= args.max_rate:
+        s = trial(args, devices, args.profile, rate, f"r{len(trials)}")
+        trials.append(s)
+        if s["sustainable"]:
+            good, rate = rate, rate * 2
+        else:
+            bad = rate
+    for _ in range(args.search_steps if bad is not None else 0):
+        rate = (good + bad) / 2
+        s = trial(args, devices, args.profile, rate, f"r{len(trials)}")
+        trials.append(s)
+        if s["sustainable"]:
+            good = rate
+        else:
+            bad = rate
+    return good, trials
+
+def write_report(report: Dict[str, Any], outdir: pathlib.Path) -> pathlib.Path:
+    path = outdir / f"{report['run_id']}.json"
+    path.write_text(json.dumps(report, indent=2))
+    lines = [
+        "# Open-Loop Load Test Report",
+        f"- Run ID: {report['run_id']}",
+        f"- Profile: {report['config']['profile']} • Devices: {len(report['devices'])} • Duration: {report['config']['duration']}s",
+    ]
+    if "max_sustainable_rate" in report:
+        lines.append(f"- Max sustainable rate: {report['max_sustainable_rate']:g} episodes/s")
+    lines += [
+        "",
+        "| target/s | offered | done | shed | throughput/s | service p50/p99 (s) | response p50/p99 (s) | ok |",
+        "|---|---|---|---|---|---|---|---|",
+    ]
+    for s in report["trials"]:
+        lines.append(f"| {s['target_rate']:g} | {s['offered']} | {s['completed']} | {s['shed']} | {s['throughput']} "
+                     f"| {s['service']['p50']:.3f} / {s['service']['p99']:.3f} "
+                     f"| {s['response']['p50']:.3f} / {s['response']['p99']:.3f} "
+                     f"| {'✓' if s['sustainable'] else '✗'} |")
+    lines += ["", "Response time is measured from each episode's intended start (corrected for coordinated omission);",
+              f"per-episode records: results/{report['run_id']}_*.jsonl"]
+    (outdir / "openloop_report.md").write_text("\n".join(lines))
+    return path
+
+def main():
+    ap = argparse.ArgumentParser(description="Open-loop load test: schedule episodes at a target arrival rate")
+    ap.add_argument("--profile", choices=PROFILES, default="constant")
+    ap.add_argument("--rate", type=float, default=1.0, help="Target (peak) arrival rate, episodes/s; start rate for --find-max")
+    ap.add_argument("--start-rate", type=float, default=None, help="step/ramp: initial rate (default rate/steps)")
+    ap.add_argument("--steps", type=int, default=4, help="step: number of rate levels")
+    ap.add_argument("--duration", type=float, default=30.0, help="Seconds of arrivals per trial")
+    ap.add_argument("--prompt", type=str, default="search for load test")
+    ap.add_argument("--retries", type=int, default=1)
+    ap.add_argument("--devices", type=str, default=None,
+                    help="Comma-separated serials or a tunnels file (default: infra/adb_tunnels.txt, else $ANDROID_SERIAL)")
+    ap.add_argument("--max-backlog", type=int, default=1000, help="Episodes waiting for a device before new arrivals are shed")
+    ap.add_argument("--find-max", action="store_true", help="Search for the highest sustainable rate")
+    ap.add_argument("--max-rate", type=float, default=1000.0, help="--find-max: upper bound")
+    ap.add_argument("--search-steps", type=int, default=4, help="--find-max: bisection steps after the first failure")
+    ap.add_argument("--min-ratio", type=float, default=0.95, help="Sustainable: throughput >= this x offered rate")
+    ap.add_argument("--slo-p99", type=float, default=None, help="Sustainable: corrected p99 response time <= this (s)")
+    ap.add_argument("--seed", type=int, default=None, help="Poisson arrivals seed")
+    ap.add_argument("--run-id", default=None, help="Prefix for result files (default openloop_<timestamp>)")
+    args = ap.parse_args()
+
+    devices = parse_devices(args.devices)
+    if not devices:
+        print("[openloop] No devices found")
+        return 1
+    args.run_id = args.run_id or f"openloop_{int(time.time())}"
+    outdir = pathlib.Path("results"); outdir.mkdir(parents=True, exist_ok=True)
+    print(f"[openloop] {args.profile} arrivals on {len(devices)} devices, {args.duration:g}s per trial")
+
+    report: Dict[str, Any] = {"run_id": args.run_id, "devices": devices,
+                              "config": {k: v for k, v in vars(args).items() if k not in ("devices", "run_id")}}
+    try:
+        if args.find_max:
+            report["max_sustainable_rate"], report["trials"] = find_max(args, devices)
+            print(f"[openloop] max sustainable rate: {report['max_sustainable_rate']:g} episodes/s")
+        else:
+            report["trials"] = [trial(args, devices, args.profile, args.rate, "r0")]
+    finally:
+        health.stop_all()
+    path = write_report(report, outdir)
+    print(f"[openloop] wrote {path} and {outdir / 'openloop_report.md'}")
+    return 0 if args.find_max or report["trials"][0]["sustainable"] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,18 +1,34 @@
 #!/usr/bin/env python3
 """
 Load testing script for Android World agents
-Runs multiple workers in parallel, each with its own device
+Runs multiple workers in parallel, each with its own device (closed loop: each
+worker runs its episodes back to back). For a target arrival rate, see openloop.py.
 """
 
 import argparse, subprocess, time, json, pathlib, os, sys
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Dict, List, Any
 
-def run_worker(serial: str, episodes: int, idx: int, prompt: str = "search for load test") -> Dict[str, Any]:
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from observability.metrics import Histogram
+from agents.result_store import open_store
+
+EPISODE_FIELDS = ("episode", "task", "success", "latency_sec", "attempts", "flaky", "failure_kind")
+
+def read_episodes(run_id: str) -> List[Dict[str, Any]]:
+    """Per-episode records from the runner's results/<run_id>.json"""
+    path = pathlib.Path("results") / f"{run_id}.json"
+    if not path.is_file():
+        return []
+    return [{k: rec.get(k) for k in EPISODE_FIELDS} for rec in json.loads(path.read_text())]
+
+def run_worker(serial: str, episodes: int, idx: int, prompt: str = "search for load test",
+               run_prefix: str = "load") -> Dict[str, Any]:
     """Run a single worker against a specific device"""
     env = os.environ.copy()
     env["ANDROID_SERIAL"] = serial
     env["PYTHONPATH"] = "."
+    run_id = f"{run_prefix}_w{idx}"
     
     t0 = time.time()
     try:
@@ -21,7 +37,8 @@ def run_worker(serial: str, episodes: int, idx: int, prompt: str = "search for l
             sys.executable, "agents/runner.py", 
             "--episodes", str(episodes),
             "--prompt", prompt,
-            "--retries", "1"
+            "--retries", "1",
+            "--run-id", run_id,
         ]
         
         print(f"[worker-{idx}] Starting {episodes} episodes on {serial}")
@@ -30,22 +47,15 @@ def run_worker(serial: str, episodes: int, idx: int, prompt: str = "search for l
         duration = time.time() - t0
         success = result.returncode == 0
         
-        # Parse results if successful
-        episode_results = []
-        if success and result.stdout:
-            # Extract episode results from stdout
-            for line in result.stdout.split('\n'):
-                if line.startswith('[episode '):
-                    episode_results.append(line.strip())
-        
         return {
             "worker": idx,
             "serial": serial,
+            "run_id": run_id,
             "episodes": episodes,
             "success": success,
             "duration_sec": round(duration, 2),
             "returncode": result.returncode,
-            "episode_results": episode_results,
+            "episode_results": read_episodes(run_id),
             "stdout_tail": result.stdout[-1000:] if result.stdout else "",
             "stderr_tail": result.stderr[-500:] if result.stderr else "",
         }
@@ -59,7 +69,7 @@ def run_worker(serial: str, episodes: int, idx: int, prompt: str = "search for l
             "success": False,
             "duration_sec": round(duration, 2),
             "returncode": -1,
-            "episode_results": [],
+            "episode_results": read_episodes(run_id),
             "stdout_tail": "TIMEOUT",
             "stderr_tail": "Process timed out after 300s",
         }
@@ -72,7 +82,7 @@ def run_worker(serial: str, episodes: int, idx: int, prompt: str = "search for l
             "success": False,
             "duration_sec": round(duration, 2),
             "returncode": -2,
-            "episode_results": [],
+            "episode_results": read_episodes(run_id),
             "stdout_tail": "",
             "stderr_tail": f"Exception: {e}",
         }
@@ -130,7 +140,7 @@ def main():
     with ThreadPoolExecutor(max_workers=actual_concurrency) as executor:
         # Submit all workers
         future_to_idx = {
-            executor.submit(run_worker, device, args.episodes, i, args.prompt): i 
+            executor.submit(run_worker, device, args.episodes, i, args.prompt, f"load_{int(start_time)}"): i 
             for i, device in enumerate(devices_to_use)
         }
         
@@ -162,6 +172,11 @@ def main():
     successful_workers = sum(1 for r in results if r.get("success", False))
     total_episodes = sum(r.get("episodes", 0) for r in results)
     avg_worker_duration = sum(r.get("duration_sec", 0) for r in results) / len(results) if results else 0
+    latency = Histogram()
+    episode_records = [e for r in results for e in r.get("episode_results", [])]
+    for e in episode_records:
+        latency.record(e["latency_sec"] or 0.0)
+    episode_successes = sum(1 for e in episode_records if e["success"])
     
     # Save detailed results
     timestamp = int(time.time())
@@ -180,7 +195,10 @@ def main():
             "total_workers": len(results),
             "success_rate": round(successful_workers / len(results), 3) if results else 0,
             "avg_worker_duration_sec": round(avg_worker_duration, 2),
-            "episodes_per_second": round(total_episodes / total_duration, 2) if total_duration > 0 else 0
+            "episodes_per_second": round(total_episodes / total_duration, 2) if total_duration > 0 else 0,
+            "episodes_recorded": len(episode_records),
+            "episode_success_rate": round(episode_successes / len(episode_records), 3) if episode_records else 0,
+            "episode_latency": latency.summary(),
         },
         "worker_results": results,
         "devices_used": devices_to_use
@@ -189,6 +207,14 @@ def main():
     # Write results
     report_file = results_dir / f"load_test_{timestamp}.json"
     report_file.write_text(json.dumps(load_report, indent=2))
+    # Worker runs already stored their episodes; the load test itself is a run that groups them
+    store = open_store()
+    if store is not None:
+        store.begin_run(report_file.stem, kind="load_test", started_at=timestamp,
+                        meta={"test_config": load_report["test_config"], "summary": load_report["summary"],
+                              "runs": [r.get("run_id") for r in results]})
+        store.finish_run(report_file.stem)
+        store.close()
     
     # Write summary report
     summary_lines = [
@@ -206,6 +232,8 @@ def main():
         f"- Successful workers: {successful_workers}/{len(results)} ({successful_workers/len(results)*100:.1f}%)",
         f"- Average worker duration: {avg_worker_duration:.1f}s",
         f"- Episodes per second: {total_episodes/total_duration:.2f}",
+        f"- Episode success rate: {episode_successes}/{len(episode_records)}",
+        "- Episode latency p50/p95/p99: {p50:.2f}s / {p95:.2f}s / {p99:.2f}s".format(**latency.summary()),
         "",
         "## Recommendations",
         "- Max stable concurrency: {}".format(actual_concurrency if successful_workers == len(results) else successful_workers),
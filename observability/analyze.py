@@ -0,0 +1,192 @@
+# observability/analyze.py
+"""Trace analytics: latency percentiles per span name, episode time breakdown and outliers.
+
+Streams trace_*.jsonl files line by line (memory does not grow with file size)
+and processes files in parallel worker processes; the per-file partial results
+are sums and observability.metrics Histograms (the same buckets, so the same
+percentiles, as the runners' metrics).
+
+    python -m observability.analyze                       # observability/trace_*.jsonl
+    python -m observability.analyze traces/ --json summary.json --workers 8
+"""
+import argparse, glob, heapq, json, os, sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from observability.metrics import Histogram
+
+PHASES = ("setup", "healthcheck", "wake", "action", "retry_sleep", "other")
+SETUP_SPANS = ("agent.plan", "runner.attach_emulator")
+
+def _summary(h: Histogram, unit: str) -> Dict[str, float]:
+    """Percentiles of a histogram of seconds, in `unit` ("ms" or "sec")"""
+    scale = 1000 if unit == "ms" else 1
+    return {
+        "count": h.count,
+        f"p50_{unit}": round(h.quantile(0.50) * scale, 3),
+        f"p95_{unit}": round(h.quantile(0.95) * scale, 3),
+        f"p99_{unit}": round(h.quantile(0.99) * scale, 3),
+        f"max_{unit}": round(h.max_us / 1e6 * scale, 3),
+        f"total_{unit}": round(h.sum_us / 1e6 * scale, 3),
+    }
+
+def _empty() -> Dict[str, Any]:
+    return {"files": 0, "spans": 0, "bad_lines": 0, "episodes": 0, "span_hist": {},
+            "episode_hist": Histogram(), "breakdown": dict.fromkeys(PHASES, 0.0), "slowest": []}
+
+def _close_episode(acc: Dict[str, Any], key: Tuple[str, Any], ep: Dict[str, float], top: int):
+    execute = ep.pop("execute", 0.0)
+    ep["other"] = max(0.0, execute - sum(ep.get(p, 0.0) for p in ("healthcheck", "wake", "action", "retry_sleep")))
+    total = execute + ep.get("setup", 0.0)
+    acc["episodes"] += 1
+    acc["episode_hist"].record(total)
+    for p in PHASES:
+        acc["breakdown"][p] += ep.get(p, 0.0)
+    item = (round(total, 3), str(key[0]), key[1], {p: round(ep.get(p, 0.0), 3) for p in PHASES})
+    if len(acc["slowest"]) < top:
+        heapq.heappush(acc["slowest"], item)
+    elif item[0] > acc["slowest"][0][0]:
+        heapq.heapreplace(acc["slowest"], item)
+
+def analyze_file(path: str, top: int = 20) -> Dict[str, Any]:
+    """Aggregate one trace file (streamed); the result merges with merge_results()"""
+    acc = _empty()
+    acc["files"] = 1
+    # Only episodes still in flight are held; they close on their episode.phases span
+    open_eps: Dict[Tuple[str, Any], Dict[str, float]] = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+                name, dur_ms = rec["span"], float(rec["dur_ms"])
+            except (ValueError, KeyError, TypeError):
+                acc["bad_lines"] += 1
+                continue
+            acc["spans"] += 1
+            hist = acc["span_hist"].get(name)
+            if hist is None:
+                hist = acc["span_hist"][name] = Histogram()
+            hist.record(dur_ms / 1000)
+
+            attrs = rec.get("attrs") or {}
+            if name == "agent.setup":
+                acc["breakdown"]["setup"] += dur_ms / 1000
+            if "episode" not in attrs:
+                continue
+            key = (rec.get("run_id"), attrs["episode"])
+            if name in SETUP_SPANS:
+                ep = open_eps.setdefault(key, {})
+                ep["setup"] = ep.get("setup", 0.0) + dur_ms / 1000
+            elif name == "task.execute":
+                ep = open_eps.setdefault(key, {})
+                ep["execute"] = ep.get("execute", 0.0) + dur_ms / 1000  # requeued episodes run more than once
+            elif name == "episode.phases":
+                ep = open_eps.pop(key, {})
+                for p in ("healthcheck", "wake", "action", "retry_sleep"):
+                    ep[p] = float(attrs.get(f"{p}_sec", 0.0))
+                _close_episode(acc, key, ep, top)
+    # Traces written before episode.phases existed: everything is "other"
+    for key, ep in open_eps.items():
+        if "execute" in ep:
+            _close_episode(acc, key, ep, top)
+    return acc
+
+def merge_results(parts: Iterable[Dict[str, Any]], top: int = 20) -> Dict[str, Any]:
+    acc = _empty()
+    slowest: List[tuple] = []
+    for part in parts:
+        for k in ("files", "spans", "bad_lines", "episodes"):
+            acc[k] += part[k]
+        for name, hist in part["span_hist"].items():
+            acc["span_hist"].setdefault(name, Histogram()).merge(hist)
+        acc["episode_hist"].merge(part["episode_hist"])
+        for p in PHASES:
+            acc["breakdown"][p] += part["breakdown"][p]
+        slowest = heapq.nlargest(top, slowest + part["slowest"], key=lambda t: t[0])
+    acc["slowest"] = slowest
+    return acc
+
+def _expand(paths: List[str]) -> List[str]:
+    files = []
+    for p in paths or [os.path.join(os.getenv("TRACE_DIR", "observability"), "trace_*.jsonl")]:
+        if os.path.isdir(p):
+            files += glob.glob(os.path.join(p, "trace_*.jsonl"))
+        else:
+            files += glob.glob(p) or ([p] if os.path.exists(p) else [])
+    # Largest first so one big file doesn't end up last on a single worker
+    return sorted(set(files), key=lambda p: -os.path.getsize(p))
+
+def analyze(paths: List[str], workers: Optional[int] = None, top: int = 20,
+            outlier_factor: float = 3.0) -> Dict[str, Any]:
+    """Analyze trace files (paths, globs or directories) and return the JSON-able summary"""
+    files = _expand(paths)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(files) or 1))
+    if workers == 1:
+        acc = merge_results((analyze_file(f, top) for f in files), top)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            acc = merge_results(pool.map(analyze_file, files, [top] * len(files)), top)
+
+    ep = acc["episode_hist"]
+    median = ep.quantile(0.5)
+    total = sum(acc["breakdown"].values())
+    return {
+        "files": acc["files"],
+        "spans": acc["spans"],
+        "bad_lines": acc["bad_lines"],
+        "episodes": acc["episodes"],
+        "span_latency_ms": {name: _summary(h, "ms") for name, h in sorted(acc["span_hist"].items())},
+        "episode_latency_sec": _summary(ep, "sec"),
+        "breakdown_sec": {p: round(v, 3) for p, v in acc["breakdown"].items()},
+        "breakdown_pct": {p: round(100 * v / total, 1) if total else 0.0 for p, v in acc["breakdown"].items()},
+        "outlier_threshold_sec": round(median * outlier_factor, 3),
+        "outliers": [
+            {"run_id": run_id, "episode": episode, "total_sec": t,
+             "dominant_phase": max(phases, key=phases.get), "phases_sec": phases}
+            for t, run_id, episode, phases in acc["slowest"] if median and t > median * outlier_factor
+        ],
+    }
+
+def format_text(res: Dict[str, Any]) -> str:
+    lines = [f"Trace analysis: {res['files']} files, {res['spans']} spans, {res['episodes']} episodes"
+             + (f" ({res['bad_lines']} unparseable lines)" if res["bad_lines"] else ""), ""]
+    lines.append(f"{'span':<26}{'count':>8}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}  (ms)")
+    for name, s in res["span_latency_ms"].items():
+        lines.append(f"{name:<26}{s['count']:>8}{s['p50_ms']:>10.1f}{s['p95_ms']:>10.1f}{s['p99_ms']:>10.1f}{s['max_ms']:>10.1f}")
+    e = res["episode_latency_sec"]
+    lines += ["", f"Episode latency: p50 {e['p50_sec']:.2f}s  p95 {e['p95_sec']:.2f}s  p99 {e['p99_sec']:.2f}s  max {e['max_sec']:.2f}s",
+              "", "Where episode time goes:"]
+    for p in PHASES:
+        lines.append(f"  {p:<12}{res['breakdown_sec'][p]:>10.2f}s {res['breakdown_pct'][p]:>6.1f}%")
+    if res["outliers"]:
+        lines += ["", f"Outlier episodes (> {res['outlier_threshold_sec']:.2f}s):"]
+        for o in res["outliers"]:
+            lines.append(f"  {o['run_id']} episode {o['episode']}: {o['total_sec']:.2f}s "
+                         f"(mostly {o['dominant_phase']} {o['phases_sec'][o['dominant_phase']]:.2f}s)")
+    return "\n".join(lines)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Summarize trace_*.jsonl files")
+    ap.add_argument("paths", nargs="*", help="Trace files, globs or directories (default: $TRACE_DIR/trace_*.jsonl)")
+    ap.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    ap.add_argument("--json", dest="json_path", default=None, help="Also write the full summary as JSON ('-' for stdout only)")
+    ap.add_argument("--top", type=int, default=20, help="Slowest episodes considered for outliers")
+    ap.add_argument("--outlier-factor", type=float, default=3.0, help="Outlier if slower than factor x median episode")
+    args = ap.parse_args(argv)
+
+    res = analyze(args.paths, workers=args.workers, top=args.top, outlier_factor=args.outlier_factor)
+    if not res["files"]:
+        print("[analyze] no trace files found", file=sys.stderr)
+        return 1
+    if args.json_path == "-":
+        print(json.dumps(res, indent=2))
+        return 0
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(res, f, indent=2)
+    print(format_text(res))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
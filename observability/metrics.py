@@ -0,0 +1,277 @@
+# observability/metrics.py
+"""Latency histograms, counters and gauges, with an optional Prometheus-style /metrics endpoint.
+
+Histograms are HDR-style (log-linear buckets with fixed boundaries), so
+histograms recorded in different threads, processes or runs merge exactly by
+adding bucket counts. Snapshots are plain JSON; merge them with merge_snapshots()
+or `python -m observability.metrics merge a.json b.json`.
+"""
+import json, os, sys, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+class Histogram:
+    """Log-linear histogram of non-negative durations, stored in integer microseconds.
+
+    Values below 64us are exact; above, each power of two is split into 32
+    linear sub-buckets (<= ~3% relative error). Recording is a couple of
+    integer operations and one dict update.
+    """
+    SUB_BITS = 5
+
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.sum_us = 0
+        self.max_us = 0
+
+    @classmethod
+    def _index(cls, v: int) -> int:
+        if v < 64:
+            return v
+        e = v.bit_length() - cls.SUB_BITS - 1
+        return (e << cls.SUB_BITS) + (v >> e)
+
+    @classmethod
+    def _bounds(cls, i: int) -> Tuple[int, int]:
+        if i < 64:
+            return i, i
+        e = (i >> cls.SUB_BITS) - 1
+        m = i - (e << cls.SUB_BITS)
+        return m << e, ((m + 1) << e) - 1
+
+    def record(self, seconds: float):
+        v = max(0, int(seconds * 1e6))
+        i = self._index(v)
+        self.counts[i] = self.counts.get(i, 0) + 1
+        self.count += 1
+        self.sum_us += v
+        if v > self.max_us:
+            self.max_us = v
+
+    def merge(self, other: "Histogram") -> "Histogram":
+        for i, n in other.counts.items():
+            self.counts[i] = self.counts.get(i, 0) + n
+        self.count += other.count
+        self.sum_us += other.sum_us
+        self.max_us = max(self.max_us, other.max_us)
+        return self
+
+    def quantile(self, q: float) -> float:
+        """Value (seconds) at quantile q: midpoint of the bucket holding that rank"""
+        if not self.count:
+            return 0.0
+        rank, seen = max(1, round(q * self.count)), 0
+        for i in sorted(self.counts):
+            seen += self.counts[i]
+            if seen >= rank:
+                lo, hi = self._bounds(i)
+                return min((lo + hi) / 2, self.max_us) / 1e6
+        return self.max_us / 1e6
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "mean": round(self.sum_us / self.count / 1e6, 6) if self.count else 0.0,
+            "p50": round(self.quantile(0.50), 6),
+            "p90": round(self.quantile(0.90), 6),
+            "p95": round(self.quantile(0.95), 6),
+            "p99": round(self.quantile(0.99), 6),
+            "max": round(self.max_us / 1e6, 6),
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"counts": {str(i): n for i, n in sorted(self.counts.items())},
+                "count": self.count, "sum_us": self.sum_us, "max_us": self.max_us}
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "Histogram":
+        h = cls()
+        h.counts = {int(i): n for i, n in d["counts"].items()}
+        h.count, h.sum_us, h.max_us = d["count"], d["sum_us"], d["max_us"]
+        return h
+
+Labels = Tuple[Tuple[str, str], ...]
+
+def _escape(value: str) -> str:
+    """Label value as the Prometheus text format requires (backslash, double quote and newline escaped)"""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _key(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+class Metrics:
+    """Thread-safe registry of labelled histograms, counters and gauges.
+
+    Gauges hold current levels (queue depth, in-flight episodes); merged
+    snapshots add them up, which gives pool-wide totals across runner processes.
+    """
+
+    def __init__(self):
+        self.histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self.counters: Dict[Tuple[str, Labels], int] = {}
+        self.gauges: Dict[Tuple[str, Labels], float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = (name, _key(labels))
+        with self._lock:
+            h = self.histograms.get(key)
+            if h is None:
+                h = self.histograms[key] = Histogram()
+            h.record(seconds)
+
+    def inc(self, name: str, n: int = 1, **labels):
+        key = (name, _key(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + n
+
+    def set(self, name: str, value: float, **labels):
+        with self._lock:
+            self.gauges[(name, _key(labels))] = value
+
+    def add(self, name: str, delta: float, **labels):
+        key = (name, _key(labels))
+        with self._lock:
+            self.gauges[key] = self.gauges.get(key, 0) + delta
+
+    def gauge_total(self, name: str, **match) -> float:
+        want = set(_key(match))
+        with self._lock:
+            return sum(v for (n, labels), v in self.gauges.items() if n == name and want <= set(labels))
+
+    def histogram(self, name: str, **match) -> Histogram:
+        """All series of `name` whose labels include `match`, merged"""
+        want, out = set(_key(match)), Histogram()
+        with self._lock:
+            for (n, labels), h in self.histograms.items():
+                if n == name and want <= set(labels):
+                    out.merge(h)
+        return out
+
+    def rollup(self, name: str, by: str) -> Dict[str, Histogram]:
+        """Histograms of `name` merged per value of one label (e.g. all commands per device)"""
+        out: Dict[str, Histogram] = {}
+        with self._lock:
+            for (n, labels), h in self.histograms.items():
+                if n == name:
+                    value = dict(labels).get(by, "")
+                    out.setdefault(value, Histogram()).merge(h)
+        return out
+
+    def counter_total(self, name: str, **match) -> int:
+        want = set(_key(match))
+        with self._lock:
+            return sum(v for (n, labels), v in self.counters.items() if n == name and want <= set(labels))
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "histograms": [{"name": n, "labels": dict(l), **h.to_dict()} for (n, l), h in self.histograms.items()],
+                "counters": [{"name": n, "labels": dict(l), "value": v} for (n, l), v in self.counters.items()],
+                "gauges": [{"name": n, "labels": dict(l), "value": v} for (n, l), v in self.gauges.items()],
+            }
+
+    def merge_snapshot(self, snap: Dict[str, Any]):
+        with self._lock:
+            for d in snap.get("histograms", []):
+                key = (d["name"], _key(d["labels"]))
+                self.histograms.setdefault(key, Histogram()).merge(Histogram.from_dict(d))
+            for d in snap.get("counters", []):
+                key = (d["name"], _key(d["labels"]))
+                self.counters[key] = self.counters.get(key, 0) + d["value"]
+            for d in snap.get("gauges", []):
+                key = (d["name"], _key(d["labels"]))
+                self.gauges[key] = self.gauges.get(key, 0) + d["value"]
+
+    def summaries(self, name: str, by: str) -> Dict[str, Dict[str, float]]:
+        return {k: h.summary() for k, h in sorted(self.rollup(name, by).items())}
+
+    def prometheus(self) -> str:
+        """Text exposition format; histograms are exported as summaries (quantiles, _sum, _count)"""
+        def fmt(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+            items = list(labels) + ([extra] if extra else [])
+            return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}" if items else ""
+
+        lines: List[str] = []
+        with self._lock:
+            hists = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+            gauges = sorted(self.gauges.items())
+        seen = set()
+        for (name, labels), h in hists:
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# TYPE {name} summary")
+            for q in (0.5, 0.9, 0.95, 0.99):
+                lines.append(f"{name}{fmt(labels, ('quantile', str(q)))} {h.quantile(q):.6f}")
+            lines.append(f"{name}_sum{fmt(labels)} {h.sum_us / 1e6:.6f}")
+            lines.append(f"{name}_count{fmt(labels)} {h.count}")
+        for (name, labels), v in counters:
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{fmt(labels)} {v}")
+        for (name, labels), v in gauges:
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name}{fmt(labels)} {v:g}")
+        return "\n".join(lines) + "\n"
+
+def merge_snapshots(snaps: Iterable[Dict[str, Any]]) -> Metrics:
+    m = Metrics()
+    for s in snaps:
+        m.merge_snapshot(s)
+    return m
+
+# Process-wide registry used by the executor, harness and runners
+metrics = Metrics()
+
+def start_http_server(port: int, registry: Metrics = metrics, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve /metrics (Prometheus text) and /metrics.json from a daemon thread"""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/metrics":
+                body, ctype = registry.prometheus().encode(), "text/plain; version=0.0.4"
+            elif self.path == "/metrics.json":
+                body, ctype = json.dumps(registry.snapshot()).encode(), "application/json"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+def maybe_serve() -> Optional[ThreadingHTTPServer]:
+    """Start the endpoint if METRICS_PORT is set"""
+    port = os.getenv("METRICS_PORT")
+    if not port:
+        return None
+    server = start_http_server(int(port), host=os.getenv("METRICS_HOST", "127.0.0.1"))
+    print(f"[metrics] serving http://{server.server_address[0]}:{server.server_address[1]}/metrics")
+    return server
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = list(sys.argv[1:] if argv is None else argv)
+    if len(args) < 2 or args[0] != "merge":
+        print("usage: python -m observability.metrics merge SNAPSHOT.json... [> merged.json]", file=sys.stderr)
+        return 2
+    snaps = []
+    for path in args[1:]:
+        with open(path, encoding="utf-8") as f:
+            snaps.append(json.load(f))
+    print(json.dumps(merge_snapshots(snaps).snapshot(), indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
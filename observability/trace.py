@@ -1,5 +1,5 @@
 # observability/trace.py
-import json, os, time, uuid, threading, contextlib, sys, datetime
+import json, os, time, uuid, threading, contextlib, sys, datetime, collections, random, atexit
 from typing import Optional
 
 TRACE_DIR = os.getenv("TRACE_DIR", "observability")
@@ -13,14 +13,42 @@ def _now_ns() -> int:
     return time.time_ns()
 
 class JsonTracer:
+    """JSONL span writer with a buffered, batched exporter.
+
+    span() only builds a record and appends it to a bounded in-memory buffer;
+    a background thread serializes and writes batches when TRACE_BATCH_SIZE
+    spans are queued or every TRACE_FLUSH_INTERVAL_SEC. When the buffer is
+    full the oldest spans are dropped (counted in `dropped`). TRACE_SAMPLE_RATE
+    applies head sampling at span start, and TRACE_STDOUT=1 mirrors spans to
+    stdout as structured logs for Cloud Logging. Pending spans are flushed at exit.
+    """
+
     def __init__(self, run_id: str, trace_id: Optional[str] = None):
         self.run_id = run_id
         self.trace_id = trace_id or new_trace_id()
         self.path = os.path.join(TRACE_DIR, f"trace_{self.run_id}.jsonl")
-        self._lock = threading.Lock()
+        self.buffer_size = int(os.getenv("TRACE_BUFFER_SIZE", "10000"))
+        self.batch_size = int(os.getenv("TRACE_BATCH_SIZE", "512"))
+        self.flush_interval_sec = float(os.getenv("TRACE_FLUSH_INTERVAL_SEC", "1.0"))
+        self.sample_rate = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+        self.stdout = os.getenv("TRACE_STDOUT", "0") == "1"
+        self.written = 0
+        self.dropped = 0
+        self.sampled_out = 0
+        self._buf: collections.deque = collections.deque()
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=f"tracer-{run_id}", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
 
     @contextlib.contextmanager
     def span(self, name: str, **attrs):
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            self.sampled_out += 1
+            yield
+            return
         start = _now_ns()
         try:
             yield
@@ -30,7 +58,7 @@ class JsonTracer:
             raise
         finally:
             end = _now_ns()
-            rec = {
+            self._enqueue({
                 "ts": datetime.datetime.utcnow().isoformat() + "Z",
                 "run_id": self.run_id,
                 "trace_id": self.trace_id,
@@ -40,11 +68,62 @@ class JsonTracer:
                 "dur_ms": round((end - start) / 1e6, 3),
                 "attrs": attrs,
                 "status": status,
-            }
-            with self._lock, open(self.path, "a", encoding="utf-8") as f:
-                f.write(json.dumps(rec) + "\n")
-            # also emit structured log to stdout for Cloud Logging
-            print(json.dumps({"level":"INFO","obs":"span","run_id":self.run_id,"trace_id":self.trace_id,**rec}), flush=True)
+            })
+
+    def _enqueue(self, rec: dict):
+        with self._cond:
+            if len(self._buf) >= self.buffer_size:
+                self._buf.popleft()
+                self.dropped += 1
+            self._buf.append(rec)
+            if len(self._buf) >= self.batch_size:
+                self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._closed or len(self._buf) >= self.batch_size,
+                                    timeout=self.flush_interval_sec)
+                closed = self._closed
+            self._drain()
+            if closed:
+                return
+
+    def _drain(self):
+        with self._write_lock:
+            with self._cond:
+                batch = list(self._buf)
+                self._buf.clear()
+            if not batch:
+                return
+            lines = [json.dumps(rec) for rec in batch]
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+            if self.stdout:
+                # also emit structured logs to stdout for Cloud Logging
+                sys.stdout.write("".join(json.dumps({"level": "INFO", "obs": "span", **rec}) + "\n" for rec in batch))
+                sys.stdout.flush()
+            self.written += len(batch)
+
+    def flush(self):
+        """Write every buffered span now"""
+        self._drain()
+
+    def close(self):
+        """Stop the background writer after a final flush (idempotent; also runs at exit)"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout=5.0)
+        self._drain()
+        if self.dropped:
+            print(f"[trace] {self.dropped} spans dropped (buffer full, TRACE_BUFFER_SIZE={self.buffer_size})", file=sys.stderr)
+
+    def stats(self) -> dict:
+        return {"written": self.written, "dropped": self.dropped, "sampled_out": self.sampled_out,
+                "buffered": len(self._buf)}
 
 # Optional GCP export helper
 def export_to_gcp_trace(trace_file: str, project_id: Optional[str] = None):
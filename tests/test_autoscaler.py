@@ -0,0 +1,26 @@
+import os, pathlib, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from infra.autoscaler import Autoscaler, read_trace, replay
+
+# Recorded signal samples (autoscaler.py --record format), every 15 s: a backlog
+# arrives, queue wait breaks the SLO, then the pool goes idle
+TRACE = pathlib.Path(__file__).with_name("data") / "autoscaler_trace.jsonl"
+
+def test_replay_scales_up_then_down():
+    scaler = Autoscaler(target_utilization=0.75, drain_sec=300, queue_wait_slo_sec=60, devices_per_runner=4,
+                        min_devices=1, max_devices=20, max_scale_up=2.0, scale_down_window_sec=300)
+    decisions = {d["t"]: d for d in replay(scaler, read_trace(str(TRACE)))}
+
+    # Scale-up: at most x2 per cycle, for work in flight, then backlog, then the SLO (capped at max)
+    assert [(decisions[t]["devices"], decisions[t]["reason"]) for t in (0.0, 15.0, 30.0, 45.0)] == [
+        (3, "utilization"), (6, "backlog"), (12, "backlog"), (20, "queue wait SLO")]
+    assert decisions[15.0]["recommended"] == 9
+    assert decisions[45.0]["runners"] == 5
+
+    # Idle from t=75, but nothing scales down while the window still holds a higher recommendation
+    assert all(decisions[t]["devices"] == 20 and decisions[t]["reason"] == "stabilizing"
+               for t in decisions if 60.0 <= t <= 345.0)
+    assert decisions[360.0]["devices"] == 16  # the t=60 recommendation is the window's highest
+    assert (decisions[375.0]["devices"], decisions[375.0]["runners"], decisions[375.0]["reason"]) == (1, 1, "scale down")
+    assert decisions[390.0]["reason"] == "steady"
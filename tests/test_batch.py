@@ -0,0 +1,51 @@
+import os, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from agents.batch import InputBatch
+from loadtest.fake_adb_server import run_script
+
+def _device(fail: set):
+    """adb callable running the compiled script through the fake server's shell;
+    `input` commands whose argv tail is in `fail` exit 1"""
+    ran = []
+
+    def run(argv):
+        if argv[0] == "input":
+            ran.append(" ".join(argv[1:]))
+            return (1, b"") if " ".join(argv[1:]) in fail else (0, b"")
+        if argv[0] == "echo":
+            return 0, (" ".join(argv[1:]) + "\n").encode()
+        return 0, b""  # sleep
+
+    def adb(args, timeout_sec=15.0, serial=None):
+        assert args[0] == "shell" and len(args) == 2  # the whole batch is one round trip
+        code, out = run_script(args[1], run)
+        return code, out.decode()
+    return adb, ran
+
+def _batch(stop_on_error: bool) -> InputBatch:
+    return InputBatch(stop_on_error=stop_on_error).tap(1, 2).keyevent(4, delay=0.5).swipe(1, 2, 3, 4, 100)
+
+def test_all_steps_succeed():
+    adb, ran = _device(fail=set())
+    res = _batch(stop_on_error=False).run(adb)
+    assert (res["ok"], res["code"]) == (True, 0)
+    assert [(s["step"], s["code"]) for s in res["steps"]] == [(0, 0), (1, 0), (2, 0)]
+    assert ran == ["tap 1 2", "keyevent 4", "swipe 1 2 3 4 100"]
+    assert res["output"] == ""  # step markers are stripped
+
+def test_failure_runs_remaining_steps():
+    # Without stop_on_error every step runs and the script exits with the last failure
+    adb, ran = _device(fail={"keyevent 4"})
+    res = _batch(stop_on_error=False).run(adb)
+    assert (res["ok"], res["code"]) == (False, 1)
+    assert [s["code"] for s in res["steps"]] == [0, 1, 0]
+    assert ran == ["tap 1 2", "keyevent 4", "swipe 1 2 3 4 100"]
+
+def test_stop_on_error_exits_at_first_failure():
+    adb, ran = _device(fail={"keyevent 4"})
+    res = _batch(stop_on_error=True).run(adb)
+    assert (res["ok"], res["code"]) == (False, 1)
+    # The step after the failure never ran, so it reports no code
+    assert [s["code"] for s in res["steps"]] == [0, 1, None]
+    assert ran == ["tap 1 2", "keyevent 4"]
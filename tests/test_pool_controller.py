@@ -0,0 +1,45 @@
+import json, os, pathlib, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from infra.pool_controller import Gmsaas, PoolController
+
+FAKE_GMSAAS = pathlib.Path(__file__).resolve().parent.parent / "loadtest" / "fake_gmsaas.py"
+
+def _controller(tmp_path, monkeypatch, **kw) -> PoolController:
+    # Instances boot instantly: ONLINE on the first list after start
+    monkeypatch.setenv("FAKE_GMSAAS_STATE", str(tmp_path / "gmsaas.json"))
+    monkeypatch.setenv("FAKE_GMSAAS_BOOT_SEC", "0")
+    (tmp_path / "results").mkdir()
+    return PoolController(Gmsaas(f"{sys.executable} {FAKE_GMSAAS}"), "template", prefix="test-pool",
+                          health_failures=0, infra_dir=tmp_path, results_dir=tmp_path / "results", **kw)
+
+def _tunnels(tmp_path) -> list:
+    return (tmp_path / "adb_tunnels.txt").read_text().splitlines()
+
+def test_warm_pool_size(tmp_path, monkeypatch):
+    ctl = _controller(tmp_path, monkeypatch, warm=2)
+    st = ctl.reconcile(demand=3)
+    assert (st["target"], st["started"], st["ready"]) == (5, 5, 0)
+    st = ctl.reconcile(demand=3)
+    assert (st["ready"], st["started"], st["booting"]) == (5, 0, 0)
+    assert len(_tunnels(tmp_path)) == 5
+    # Demand drops: the surplus is stopped down to demand + warm
+    st = ctl.reconcile(demand=1)
+    assert (st["target"], st["surplus"], st["ready"]) == (3, 2, 3)
+    assert len(_tunnels(tmp_path)) == 3
+
+def test_recycle_after_max_episodes(tmp_path, monkeypatch):
+    ctl = _controller(tmp_path, monkeypatch, warm=0, max_episodes=3)
+    ctl.reconcile(demand=2)
+    ctl.reconcile(demand=2)
+    (used, serial), (other, _) = [line.split() for line in _tunnels(tmp_path)]
+    with open(tmp_path / "results" / "run_1.jsonl", "w") as f:
+        for i in range(3):
+            f.write(json.dumps({"episode": i, "device": serial, "success": True}) + "\n")
+    st = ctl.reconcile(demand=2)
+    # The worn device is stopped and its replacement started in the same cycle
+    assert (st["recycled"], st["started"], st["ready"]) == (1, 1, 1)
+    assert used not in ctl.devices and other in ctl.devices
+    st = ctl.reconcile(demand=2)
+    assert (st["recycled"], st["ready"]) == (0, 2)
+    assert used not in (line.split()[0] for line in _tunnels(tmp_path))
@@ -0,0 +1,42 @@
+import json, os, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from agents import runner
+from agents.results import ResultStream, read_run_config
+
+CONFIG = {"prompt": "go home", "episodes": 3}
+
+def _rec(i: int) -> dict:
+    return {"episode": i, "task": "nav_home", "success": True, "latency_sec": 0.1, "attempts": 1, "flaky": 0}
+
+def _interrupted_run(tmp_path, torn: bytes):
+    stream = ResultStream("run_1", tmp_path, config=CONFIG)
+    stream.append(_rec(0))
+    stream.append(_rec(1))
+    stream.close()
+    with open(tmp_path / "run_1.jsonl", "ab") as f:
+        f.write(torn)  # crash mid-write of episode 2
+
+def test_resume_drops_torn_tail(tmp_path):
+    _interrupted_run(tmp_path, b'{"episode": 2, "task": "nav_')
+    stream = ResultStream("run_1", tmp_path, resume=True)
+    assert stream.completed == {0, 1}
+    assert stream.summary.episodes == 2
+    stream.append(_rec(2))
+    stream.close()
+    # Every line parses again: the partial record was cut, not appended to
+    lines = (tmp_path / "run_1.jsonl").read_text().splitlines()
+    assert [json.loads(l).get("episode") for l in lines] == [None, 0, 1, 2]
+    assert read_run_config(tmp_path / "run_1.jsonl") == CONFIG
+    assert [r["episode"] for r in ResultStream("run_1", tmp_path, resume=True).records()] == [0, 1, 2]
+
+def test_resume_refuses_changed_config(tmp_path, monkeypatch, capsys):
+    (tmp_path / "results").mkdir()
+    _interrupted_run(tmp_path / "results", b"")
+    before = (tmp_path / "results" / "run_1.jsonl").read_bytes()
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, "argv", ["runner", "--resume", "run_1", "--prompt", "open settings"])
+    assert runner.main() == 2
+    assert "prompt was 'go home', now 'open settings'" in capsys.readouterr().out
+    # Refused before anything ran or was appended
+    assert (tmp_path / "results" / "run_1.jsonl").read_bytes() == before
@@ -0,0 +1,55 @@
+import os, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from agents.retry import DEVICE, OK, PERMANENT, TIMEOUT, TRANSIENT, RetryBudget, RetryPolicy, classify
+
+def _failed(code, details: str) -> dict:
+    return {"success": False, "exit_code": code, "details": details}
+
+def test_classify():
+    assert classify({"success": True, "exit_code": 0, "details": ""}) == OK
+    assert classify(_failed(124, "")) == TIMEOUT
+    assert classify(_failed(1, "TIMEOUT")) == TIMEOUT
+    assert classify(_failed(None, "adb not healthy - device disconnected or unresponsive")) == DEVICE
+    assert classify(_failed(None, "circuit open - device failing healthchecks, not sending work")) == DEVICE
+    assert classify(_failed(127, "/system/bin/sh: foo: not found")) == PERMANENT
+    assert classify(_failed(1, "Error: Activity class {x/.Main} does not exist.")) == PERMANENT
+    assert classify(_failed(1, "Error type 2")) == TRANSIENT
+    # A timeout wins over a permanent-looking message in the same output
+    assert classify(_failed(124, "unable to resolve Intent")) == TIMEOUT
+
+def test_budget_grows_with_episodes():
+    b = RetryBudget(ratio=0.5, min_retries=1)
+    assert b.available()
+    b.used = 1
+    assert not b.available()
+    b.started = 2  # 1 + 0.5 x 2 = 2 retries allowed
+    assert b.available()
+    b.used = 2
+    assert not b.available()
+
+def test_policy_stops_retrying_when_budget_exhausted(monkeypatch):
+    monkeypatch.setenv("RETRY_BUDGET_RATIO", "0")
+    monkeypatch.setenv("RETRY_BUDGET_MIN", "2")
+    monkeypatch.delenv("RETRY_TASK_MAX", raising=False)
+    policy = RetryPolicy(max_retries=5)
+    for _ in range(3):
+        policy.start("tap")
+    assert [policy.should_retry("tap", 0, TRANSIENT) for _ in range(3)] == [True, True, False]
+    assert policy.stats()["denied_budget"] == 1
+    # Permanent failures are refused without touching the budget
+    assert not policy.should_retry("tap", 0, PERMANENT)
+    assert (policy.stats()["denied_permanent"], policy.stats()["budget_used"]) == (1, 2)
+
+def test_task_budget_limits_one_task_type(monkeypatch):
+    monkeypatch.setenv("RETRY_BUDGET_RATIO", "1")
+    monkeypatch.setenv("RETRY_BUDGET_MIN", "0")
+    monkeypatch.delenv("RETRY_TASK_MAX", raising=False)
+    policy = RetryPolicy(max_retries=5)
+    policy.start("tap")
+    for _ in range(3):
+        policy.start("swipe")
+    # The run allows 4 retries, but a failing task type only gets its own episodes' share
+    assert [policy.should_retry("tap", i, TIMEOUT) for i in range(2)] == [True, False]
+    assert [policy.should_retry("swipe", i, TIMEOUT) for i in range(3)] == [True, True, True]
+    assert policy.stats()["budget_used"] == 4